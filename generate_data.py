@@ -1,139 +1,428 @@
+import argparse
 import json
 import random
 import os
+import sys
 
-os.makedirs('data', exist_ok=True)
-
-restaurants = [
-  { "id": "r1", "name": "Green Bowl Co.", "neighborhood": "Downtown" },
-  { "id": "r2", "name": "Protein House", "neighborhood": "Midtown" },
-  { "id": "r3", "name": "Burger Barn", "neighborhood": "Uptown" },
-  { "id": "r4", "name": "Sushi Express", "neighborhood": "Downtown" },
-  { "id": "r5", "name": "Taco Fiesta", "neighborhood": "Westside" },
-  { "id": "r6", "name": "Vegan Delights", "neighborhood": "Eastside" },
-  { "id": "r7", "name": "Pizza Planet", "neighborhood": "Midtown" },
-  { "id": "r8", "name": "Salad Station", "neighborhood": "Uptown" }
-]
-
-menu_items_raw = {
-"r1": [
-("m101", "Superfood Bowl", ["veg"], 450, 15),
-("m102", "Quinoa Salad", ["veg"], 350, 12),
-("m103", "Chicken Protein Bowl", ["high_protein"], 600, 45),
-("m104", "Tofu Power Bowl", ["veg", "high_protein"], 500, 25),
-("m105", "Acai Bowl", ["veg", "no_egg"], 300, 5)
-],
-"r2": [
-("m201", "Steak & Eggs", ["high_protein"], 700, 55),
-("m202", "Grilled Chicken Breast", ["high_protein", "no_egg"], 400, 40),
-("m203", "Salmon Filet", ["high_protein", "no_egg"], 500, 35),
-("m204", "Turkey Meatballs", ["high_protein"], 450, 30),
-("m205", "Egg White Omelette", ["veg", "high_protein"], 250, 20)
-],
-"r3": [
-("m301", "Classic Cheeseburger", [], 800, 30),
-("m302", "Double Veggie Burger", ["veg"], 600, 20),
-("m303", "Bacon Double Smash", [], 1000, 45),
-("m304", "Crispy Chicken Sandwich", [], 750, 25),
-("m305", "Black Bean Burger", ["veg", "no_egg"], 550, 18)
-],
-"r4": [
-("m401", "Spicy Tuna Roll", ["no_egg"], 400, 20),
-("m402", "Salmon Avocado Roll", ["no_egg"], 450, 22),
-("m403", "Veggie Roll", ["veg", "no_egg"], 300, 6),
-("m404", "Sashimi Combo", ["high_protein", "no_egg"], 350, 40),
-("m405", "Edamame", ["veg", "no_egg"], 150, 12)
-],
-"r5": [
-("m501", "Chicken Tacos (3)", ["no_egg"], 600, 35),
-("m502", "Beef Burrito", [], 850, 30),
-("m503", "Veggie Fajitas", ["veg", "no_egg"], 500, 15),
-("m504", "Shrimp Tacos (3)", ["no_egg"], 550, 25),
-("m505", "Bean & Cheese Quesadilla", ["veg", "no_egg"], 650, 20)
-],
-"r6": [
-("m601", "Beyond Burger Classic", ["veg", "no_egg"], 600, 20),
-("m602", "Vegan Mac & Cheese", ["veg", "no_egg"], 500, 10),
-("m603", "Tempeh Wrap", ["veg", "high_protein", "no_egg"], 450, 25),
-("m604", "Lentil Soup", ["veg", "no_egg"], 300, 15),
-("m605", "Chickpea Salad", ["veg", "no_egg"], 400, 12)
-],
-"r7": [
-("m701", "Margherita Pizza", ["veg"], 900, 35),
-("m702", "Pepperoni Pizza", [], 1000, 40),
-("m703", "Meat Lovers Pizza", ["high_protein"], 1200, 55),
-("m704", "Vegan Supreme Pizza", ["veg", "no_egg"], 850, 25),
-("m705", "Garlic Knots", ["veg", "no_egg"], 400, 8)
-],
-"r8": [
-("m801", "Cobb Salad", ["high_protein"], 600, 35),
-("m802", "Caesar Salad with Chicken", ["high_protein"], 550, 40),
-("m803", "Greek Salad", ["veg", "no_egg"], 400, 12),
-("m804", "Southwest Salad", ["veg"], 450, 15),
-("m805", "Spinach & Goat Cheese", ["veg", "no_egg"], 350, 10)
-]
-}
-
-menu_items = []
-for r_id, items in menu_items_raw.items():
-    for item_id, name, tags, cals, prot in items:
-        menu_items.append({
-            "item_id": item_id,
-            "restaurant_id": r_id,
-            "name": name,
-            "tags": tags,
-            "calories_est": cals,
-            "protein_est": prot
-        })
 
-platforms = ["UberEats", "DoorDash", "Grubhub"]
-platform_prices = []
+def write_demo_data():
+    """The small hand-curated demo catalog (8 restaurants, 40 items) as indented JSON in data/."""
+    os.makedirs('data', exist_ok=True)
+
+    restaurants = [
+      { "id": "r1", "name": "Green Bowl Co.", "neighborhood": "Downtown" },
+      { "id": "r2", "name": "Protein House", "neighborhood": "Midtown" },
+      { "id": "r3", "name": "Burger Barn", "neighborhood": "Uptown" },
+      { "id": "r4", "name": "Sushi Express", "neighborhood": "Downtown" },
+      { "id": "r5", "name": "Taco Fiesta", "neighborhood": "Westside" },
+      { "id": "r6", "name": "Vegan Delights", "neighborhood": "Eastside" },
+      { "id": "r7", "name": "Pizza Planet", "neighborhood": "Midtown" },
+      { "id": "r8", "name": "Salad Station", "neighborhood": "Uptown" }
+    ]
+
+    menu_items_raw = {
+    "r1": [
+    ("m101", "Superfood Bowl", ["veg"], 450, 15),
+    ("m102", "Quinoa Salad", ["veg"], 350, 12),
+    ("m103", "Chicken Protein Bowl", ["high_protein"], 600, 45),
+    ("m104", "Tofu Power Bowl", ["veg", "high_protein"], 500, 25),
+    ("m105", "Acai Bowl", ["veg", "no_egg"], 300, 5)
+    ],
+    "r2": [
+    ("m201", "Steak & Eggs", ["high_protein"], 700, 55),
+    ("m202", "Grilled Chicken Breast", ["high_protein", "no_egg"], 400, 40),
+    ("m203", "Salmon Filet", ["high_protein", "no_egg"], 500, 35),
+    ("m204", "Turkey Meatballs", ["high_protein"], 450, 30),
+    ("m205", "Egg White Omelette", ["veg", "high_protein"], 250, 20)
+    ],
+    "r3": [
+    ("m301", "Classic Cheeseburger", [], 800, 30),
+    ("m302", "Double Veggie Burger", ["veg"], 600, 20),
+    ("m303", "Bacon Double Smash", [], 1000, 45),
+    ("m304", "Crispy Chicken Sandwich", [], 750, 25),
+    ("m305", "Black Bean Burger", ["veg", "no_egg"], 550, 18)
+    ],
+    "r4": [
+    ("m401", "Spicy Tuna Roll", ["no_egg"], 400, 20),
+    ("m402", "Salmon Avocado Roll", ["no_egg"], 450, 22),
+    ("m403", "Veggie Roll", ["veg", "no_egg"], 300, 6),
+    ("m404", "Sashimi Combo", ["high_protein", "no_egg"], 350, 40),
+    ("m405", "Edamame", ["veg", "no_egg"], 150, 12)
+    ],
+    "r5": [
+    ("m501", "Chicken Tacos (3)", ["no_egg"], 600, 35),
+    ("m502", "Beef Burrito", [], 850, 30),
+    ("m503", "Veggie Fajitas", ["veg", "no_egg"], 500, 15),
+    ("m504", "Shrimp Tacos (3)", ["no_egg"], 550, 25),
+    ("m505", "Bean & Cheese Quesadilla", ["veg", "no_egg"], 650, 20)
+    ],
+    "r6": [
+    ("m601", "Beyond Burger Classic", ["veg", "no_egg"], 600, 20),
+    ("m602", "Vegan Mac & Cheese", ["veg", "no_egg"], 500, 10),
+    ("m603", "Tempeh Wrap", ["veg", "high_protein", "no_egg"], 450, 25),
+    ("m604", "Lentil Soup", ["veg", "no_egg"], 300, 15),
+    ("m605", "Chickpea Salad", ["veg", "no_egg"], 400, 12)
+    ],
+    "r7": [
+    ("m701", "Margherita Pizza", ["veg"], 900, 35),
+    ("m702", "Pepperoni Pizza", [], 1000, 40),
+    ("m703", "Meat Lovers Pizza", ["high_protein"], 1200, 55),
+    ("m704", "Vegan Supreme Pizza", ["veg", "no_egg"], 850, 25),
+    ("m705", "Garlic Knots", ["veg", "no_egg"], 400, 8)
+    ],
+    "r8": [
+    ("m801", "Cobb Salad", ["high_protein"], 600, 35),
+    ("m802", "Caesar Salad with Chicken", ["high_protein"], 550, 40),
+    ("m803", "Greek Salad", ["veg", "no_egg"], 400, 12),
+    ("m804", "Southwest Salad", ["veg"], 450, 15),
+    ("m805", "Spinach & Goat Cheese", ["veg", "no_egg"], 350, 10)
+    ]
+    }
+
+    menu_items = []
+    for r_id, items in menu_items_raw.items():
+        for item_id, name, tags, cals, prot in items:
+            menu_items.append({
+                "item_id": item_id,
+                "restaurant_id": r_id,
+                "name": name,
+                "tags": tags,
+                "calories_est": cals,
+                "protein_est": prot
+            })
+
+    platforms = ["UberEats", "DoorDash", "Grubhub"]
+    platform_prices = []
 
-random.seed(42)
+    random.seed(42)
 
-for item in menu_items:
-    base_price = round(random.uniform(9.0, 18.0), 2)
-    for plat in platforms:
-        plat_price = round(base_price + random.uniform(-1.0, 1.0), 2)
-        delivery_fee = round(random.uniform(0.99, 5.99), 2)
-        platform_prices.append({
+    for item in menu_items:
+        base_price = round(random.uniform(9.0, 18.0), 2)
+        for plat in platforms:
+            plat_price = round(base_price + random.uniform(-1.0, 1.0), 2)
+            delivery_fee = round(random.uniform(0.99, 5.99), 2)
+            platform_prices.append({
+                "item_id": item["item_id"],
+                "platform_name": plat,
+                "base_price": plat_price,
+                "delivery_fee": delivery_fee
+            })
+
+    coupons = [
+        { "code": "UBER10", "platform": "UberEats", "discount_value": 10.0, "min_spend": 30.0 },
+        { "code": "DASH5", "platform": "DoorDash", "discount_value": 5.0, "min_spend": 15.0 },
+        { "code": "GRUBFREE", "platform": "Grubhub", "discount_value": 3.99, "min_spend": 20.0 },
+        { "code": "TREAT15", "platform": "UberEats", "discount_value": 15.0, "min_spend": 40.0 },
+        { "code": "DOOR20", "platform": "DoorDash", "discount_value": 0.20, "min_spend": 25.0 }
+    ]
+
+    social_ratings = []
+    for item in menu_items:
+        rating = round(random.uniform(3.5, 5.0), 1)
+        reviews = random.randint(10, 500)
+        social_ratings.append({
             "item_id": item["item_id"],
-            "platform_name": plat,
-            "base_price": plat_price,
-            "delivery_fee": delivery_fee
+            "rating": rating,
+            "review_count": reviews
         })
 
-coupons = [
-    { "code": "UBER10", "platform": "UberEats", "discount_value": 10.0, "min_spend": 30.0 },
-    { "code": "DASH5", "platform": "DoorDash", "discount_value": 5.0, "min_spend": 15.0 },
-    { "code": "GRUBFREE", "platform": "Grubhub", "discount_value": 3.99, "min_spend": 20.0 },
-    { "code": "TREAT15", "platform": "UberEats", "discount_value": 15.0, "min_spend": 40.0 },
-    { "code": "DOOR20", "platform": "DoorDash", "discount_value": 0.20, "min_spend": 25.0 }
-]
+    with open("data/restaurants.json", "w") as f:
+        json.dump(restaurants, f, indent=2)
+
+    with open("data/menu_items.json", "w") as f:
+        json.dump(menu_items, f, indent=2)
+
+    with open("data/platform_prices.json", "w") as f:
+        json.dump(platform_prices, f, indent=2)
+
+    with open("data/coupons.json", "w") as f:
+        json.dump(coupons, f, indent=2)
+
+    with open("data/social_ratings.json", "w") as f:
+        json.dump(social_ratings, f, indent=2)
+
+    print("Finished generating synthetic data files in data/")
+
+
+# --- Scaled generator ---------------------------------------------------------
+#
+# Produces arbitrarily large catalogs deterministically from a seed, streaming rows to
+# disk as they are generated so memory stays flat regardless of size.
+#
+# Output formats:
+#   jsonl     one <table>.jsonl file per table, one JSON object per line
+#   columnar  a directory of raw little-endian column files plus manifest.json:
+#             numeric columns are <table>.<column>.bin; string columns are
+#             <table>.<column>.offsets (int64, rows + 1) and <table>.<column>.blob (utf-8);
+#             menu_items.tags is CSR-encoded as tags.offsets (int64) + tags.codes (uint16 into
+#             manifest["tag_vocab"]); foreign keys are stored as row numbers (*_row columns).
+
+BASE_PLATFORMS = ["UberEats", "DoorDash", "Grubhub"]
+BASE_TAGS = ["veg", "high_protein", "no_egg", "gluten_free", "dairy_free", "low_carb",
+             "keto", "spicy", "halal", "nut_free", "low_sodium", "paleo"]
+NEIGHBORHOODS = ["Downtown", "Midtown", "Uptown", "Westside", "Eastside", "Harbor", "Old Town", "University"]
+NAME_PREFIXES = ["Green", "Golden", "Urban", "Happy", "Spicy", "Fresh", "Rustic", "Lucky", "Blue", "Sunny"]
+NAME_SUFFIXES = ["Bowl Co.", "Kitchen", "House", "Express", "Grill", "Deli", "Cantina", "Bistro", "Station", "Table"]
+DISH_ADJECTIVES = ["Grilled", "Crispy", "Smoky", "Classic", "Loaded", "Roasted", "Zesty", "Garden", "Double", "Spicy"]
+DISHES = ["Chicken Bowl", "Tofu Wrap", "Burger", "Salad", "Tacos", "Burrito", "Pizza", "Noodles", "Sushi Roll", "Omelette"]
+
+# array typecode -> manifest dtype (NumPy notation)
+DTYPES = {"d": "<f8", "f": "<f4", "i": "<i4", "q": "<i8", "H": "<u2", "B": "<u1"}
+FLUSH_ROWS = 65536
+
+
+def platform_names(n):
+    return BASE_PLATFORMS[:n] + [f"Platform{i}" for i in range(len(BASE_PLATFORMS), n)]
+
+
+def tag_vocab(n):
+    return BASE_TAGS[:n] + [f"tag_{i}" for i in range(len(BASE_TAGS), n)]
+
+
+def generate_rows(cfg):
+    """
+    Yields (table, row) pairs in a fixed order for the given config. Each table draws from its own
+    seeded stream, so output is identical for the same seed whatever format it is written in.
+    """
+    rng_rest = random.Random(f"{cfg.seed}:restaurants")
+    rng_item = random.Random(f"{cfg.seed}:menu_items")
+    rng_price = random.Random(f"{cfg.seed}:platform_prices")
+    rng_rating = random.Random(f"{cfg.seed}:social_ratings")
+    rng_coupon = random.Random(f"{cfg.seed}:coupons")
+    platforms = platform_names(cfg.platforms)
+    tags = tag_vocab(cfg.tags)
+
+    for c in range(cfg.coupons):
+        plat = rng_coupon.choice(platforms)
+        percent = rng_coupon.random() < 0.3
+        yield "coupons", {
+            "code": f"{plat[:4].upper()}{c}",
+            "platform": plat,
+            "discount_value": round(rng_coupon.uniform(0.05, 0.25), 2) if percent else float(rng_coupon.randint(2, 15)),
+            "min_spend": float(rng_coupon.choice([0, 10, 15, 20, 25, 30, 40])),
+        }
+
+    item_no = 0
+    for r in range(cfg.restaurants):
+        rest_id = f"r{r + 1}"
+        yield "restaurants", {
+            "id": rest_id,
+            "name": f"{rng_rest.choice(NAME_PREFIXES)} {rng_rest.choice(NAME_SUFFIXES)} #{r + 1}",
+            "neighborhood": rng_rest.choice(NEIGHBORHOODS),
+        }
+        for _ in range(cfg.items_per_restaurant):
+            item_no += 1
+            item_id = f"m{item_no}"
+            # Earlier tags in the vocabulary are more common, roughly like real menus
+            item_tags = [t for i, t in enumerate(tags) if rng_item.random() < 0.45 / (1 + i * 0.5)]
+            protein = rng_item.randint(5, 55)
+            yield "menu_items", {
+                "item_id": item_id,
+                "restaurant_id": rest_id,
+                "name": f"{rng_item.choice(DISH_ADJECTIVES)} {rng_item.choice(DISHES)}",
+                "tags": item_tags,
+                "calories_est": rng_item.randint(150, 1200),
+                "protein_est": protein,
+            }
+            base_price = round(rng_price.uniform(9.0, 18.0), 2)
+            for plat in platforms:
+                yield "platform_prices", {
+                    "item_id": item_id,
+                    "platform_name": plat,
+                    "base_price": round(base_price + rng_price.uniform(-1.0, 1.0), 2),
+                    "delivery_fee": round(rng_price.uniform(0.99, 5.99), 2),
+                }
+            yield "social_ratings", {
+                "item_id": item_id,
+                "rating": round(rng_rating.uniform(3.5, 5.0), 1),
+                "review_count": rng_rating.randint(10, 500),
+            }
+
+
+class JsonLinesWriter:
+    def __init__(self, out_dir, cfg):
+        self.out_dir = out_dir
+        self.files = {}
+
+    def write(self, table, row):
+        f = self.files.get(table)
+        if f is None:
+            f = self.files[table] = open(os.path.join(self.out_dir, f"{table}.jsonl"), "w")
+        f.write(json.dumps(row, separators=(",", ":")))
+        f.write("\n")
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class ColumnarWriter:
+    """Streams rows into per-column files, flushing every FLUSH_ROWS rows."""
+
+    # table -> [(column, typecode or "str"/"tags", row -> value)]
+    LAYOUT = {
+        "restaurants": [
+            ("id", "str", lambda r, w: r["id"]),
+            ("name", "str", lambda r, w: r["name"]),
+            ("neighborhood", "str", lambda r, w: r["neighborhood"]),
+        ],
+        "menu_items": [
+            ("item_id", "str", lambda r, w: r["item_id"]),
+            ("restaurant_row", "i", lambda r, w: w.rows["restaurants"] - 1),
+            ("name", "str", lambda r, w: r["name"]),
+            ("tags", "tags", lambda r, w: [w.tag_codes[t] for t in r["tags"]]),
+            ("calories_est", "f", lambda r, w: r["calories_est"]),
+            ("protein_est", "f", lambda r, w: r["protein_est"]),
+        ],
+        "platform_prices": [
+            ("item_row", "i", lambda r, w: w.rows["menu_items"] - 1),
+            ("platform", "B", lambda r, w: w.platform_codes[r["platform_name"]]),
+            ("base_price", "d", lambda r, w: r["base_price"]),
+            ("delivery_fee", "d", lambda r, w: r["delivery_fee"]),
+        ],
+        "social_ratings": [
+            ("item_row", "i", lambda r, w: w.rows["menu_items"] - 1),
+            ("rating", "f", lambda r, w: r["rating"]),
+            ("review_count", "i", lambda r, w: r["review_count"]),
+        ],
+    }
+
+    def __init__(self, out_dir, cfg):
+        from array import array
+        self.array = array
+        self.out_dir = out_dir
+        self.cfg = cfg
+        self.tag_vocab = tag_vocab(cfg.tags)
+        self.tag_codes = {t: i for i, t in enumerate(self.tag_vocab)}
+        self.platforms = platform_names(cfg.platforms)
+        self.platform_codes = {p: i for i, p in enumerate(self.platforms)}
+        self.coupons = []
+        self.rows = {table: 0 for table in self.LAYOUT}
+        self.files = {}
+        self.buffers = {}
+        self.offsets = {}
+        for table, columns in self.LAYOUT.items():
+            for column, kind, _ in columns:
+                if kind in ("str", "tags"):
+                    # offsets start with a 0 so row i spans [offsets[i], offsets[i + 1])
+                    data_ext, data_code = ("blob", None) if kind == "str" else ("codes", "H")
+                    self._open(table, column, "offsets", "q")
+                    self._open(table, column, data_ext, data_code)
+                    self.buffers[(table, column, "offsets")].append(0)
+                    self.offsets[(table, column)] = 0
+                else:
+                    self._open(table, column, "bin", kind)
+
+    def _open(self, table, column, ext, typecode):
+        key = (table, column, ext)
+        self.files[key] = open(os.path.join(self.out_dir, f"{table}.{column}.{ext}"), "wb")
+        self.buffers[key] = bytearray() if typecode is None else self.array(typecode)
+
+    def write(self, table, row):
+        if table == "coupons":
+            # Coupons are few and looked up by platform name, so they live in the manifest
+            self.coupons.append(row)
+            return
+        self.rows[table] += 1
+        for column, kind, get in self.LAYOUT[table]:
+            value = get(row, self)
+            if kind == "str":
+                data = value.encode("utf-8")
+                self.buffers[(table, column, "blob")] += data
+                self.offsets[(table, column)] += len(data)
+                self.buffers[(table, column, "offsets")].append(self.offsets[(table, column)])
+            elif kind == "tags":
+                self.buffers[(table, column, "codes")].extend(value)
+                self.offsets[(table, column)] += len(value)
+                self.buffers[(table, column, "offsets")].append(self.offsets[(table, column)])
+            else:
+                self.buffers[(table, column, "bin")].append(value)
+        if self.rows[table] % FLUSH_ROWS == 0:
+            self._flush(table)
+
+    def _flush(self, table):
+        for (t, column, ext), buf in self.buffers.items():
+            if t != table or not buf:
+                continue
+            if isinstance(buf, bytearray):
+                self.files[(t, column, ext)].write(buf)
+                buf.clear()
+            else:
+                buf.tofile(self.files[(t, column, ext)])
+                del buf[:]
+
+    def close(self):
+        for table in self.LAYOUT:
+            self._flush(table)
+        for f in self.files.values():
+            f.close()
+
+        tables = {}
+        for table, columns in self.LAYOUT.items():
+            cols = {}
+            for column, kind, _ in columns:
+                if kind == "str":
+                    cols[column] = {"kind": "str", "offsets": "<i8"}
+                elif kind == "tags":
+                    cols[column] = {"kind": "csr", "offsets": "<i8", "codes": DTYPES["H"]}
+                else:
+                    cols[column] = {"kind": "fixed", "dtype": DTYPES[kind]}
+            tables[table] = {"rows": self.rows[table], "columns": cols}
+
+        manifest = {
+            "format": "foodpo-columnar",
+            "version": 1,
+            "byteorder": sys.byteorder,
+            "seed": self.cfg.seed,
+            "tag_vocab": self.tag_vocab,
+            "platforms": self.platforms,
+            "coupons": self.coupons,
+            "tables": tables,
+        }
+        with open(os.path.join(self.out_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+WRITERS = {"jsonl": JsonLinesWriter, "columnar": ColumnarWriter}
 
-social_ratings = []
-for item in menu_items:
-    rating = round(random.uniform(3.5, 5.0), 1)
-    reviews = random.randint(10, 500)
-    social_ratings.append({
-        "item_id": item["item_id"],
-        "rating": rating,
-        "review_count": reviews
-    })
 
-with open("data/restaurants.json", "w") as f:
-    json.dump(restaurants, f, indent=2)
+def write_scaled_data(cfg):
+    os.makedirs(cfg.out, exist_ok=True)
+    writer = WRITERS[cfg.format](cfg.out, cfg)
+    counts = {}
+    try:
+        for table, row in generate_rows(cfg):
+            writer.write(table, row)
+            counts[table] = counts.get(table, 0) + 1
+    finally:
+        writer.close()
+    summary = ", ".join(f"{n} {table}" for table, n in counts.items())
+    print(f"Finished generating {cfg.format} catalog in {cfg.out}/: {summary}")
 
-with open("data/menu_items.json", "w") as f:
-    json.dump(menu_items, f, indent=2)
 
-with open("data/platform_prices.json", "w") as f:
-    json.dump(platform_prices, f, indent=2)
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate the demo catalog in data/, or with --scale a large synthetic one.")
+    parser.add_argument("--scale", action="store_true", help="generate a parameterized catalog instead of the demo data")
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--items-per-restaurant", type=int, default=20)
+    parser.add_argument("--platforms", type=int, default=3)
+    parser.add_argument("--coupons", type=int, default=10)
+    parser.add_argument("--tags", type=int, default=len(BASE_TAGS), help="size of the tag vocabulary")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl")
+    parser.add_argument("--out", default=os.path.join("data", "generated"))
+    cfg = parser.parse_args()
 
-with open("data/coupons.json", "w") as f:
-    json.dump(coupons, f, indent=2)
+    if not cfg.scale:
+        write_demo_data()
+        return
+    if not 1 <= cfg.platforms <= 256:
+        parser.error("--platforms must be between 1 and 256")
+    if not 1 <= cfg.tags <= 65536:
+        parser.error("--tags must be between 1 and 65536")
+    write_scaled_data(cfg)
 
-with open("data/social_ratings.json", "w") as f:
-    json.dump(social_ratings, f, indent=2)
 
-print("Finished generating synthetic data files in data/")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Multi-worker production server: gunicorn supervising uvicorn workers.
+
+    gunicorn services.api.main:app
+    FOODPO_WORKERS=4 FOODPO_BIND=0.0.0.0:8000 gunicorn services.api.main:app
+
+gunicorn reads this file from the working directory (the repo root). The master loads the
+catalog, price index and scoring engine once (main.preload_catalog) and then forks, so all
+workers share those pages copy-on-write. Each worker opens its own SQLite pool (WAL, so they
+share database.db), event log slot (services/api/events/worker-<n>) and caches; weight, TTS
+and price changes reach the other workers over the invalidation bus in FOODPO_BUS_DIR.
+The master never applies price batches: each worker replays the saved ones (PRICE_DELTA_DIR,
+*.applied) after the fork, so one respawned later serves the same prices as its peers.
+Staged coach jobs (/coach/jobs/...) live in the worker that created them.
+"""
+import os
+import shutil
+import tempfile
+
+bind = os.getenv("FOODPO_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("FOODPO_WORKERS", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("FOODPO_WORKER_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Set before the app is imported, so the master and every forked worker see the same directory
+_own_bus_dir = not os.getenv("FOODPO_BUS_DIR")
+if _own_bus_dir:
+    os.environ["FOODPO_BUS_DIR"] = tempfile.mkdtemp(prefix="foodpo-bus-")
+
+
+def on_starting(server):
+    # Runs in the master before any worker is forked
+    from services.api import main
+    main.preload_catalog()
+
+
+def on_exit(server):
+    if _own_bus_dir:
+        shutil.rmtree(os.environ["FOODPO_BUS_DIR"], ignore_errors=True)
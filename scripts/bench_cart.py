@@ -0,0 +1,96 @@
+"""
+Benchmark for the cart optimizer (/cart/optimize) on growing carts over a synthetic
+catalog: latency, how often the plan is proven optimal within the time budget, and what
+it saves over pricing every item as its own order.
+
+    python scripts/bench_cart.py --units 5 10 25 50 100 200 --output bench_results/cart.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from bench_micro import synthetic_catalog  # noqa: E402
+from services.api.cart import CART_TIME_BUDGET, CartOptimizer  # noqa: E402
+from services.api.catalog import Catalog  # noqa: E402
+from services.api.pricing import PriceIndex  # noqa: E402
+
+
+def random_cart(rng: random.Random, n_items: int, n_rest: int, units: int, restaurants: int):
+    """A cart of `units` units from `restaurants` restaurants, with some repeated items."""
+    chosen = rng.sample(range(n_rest), min(restaurants, n_rest))
+    lines = {}
+    for _ in range(units):
+        r = rng.choice(chosen)
+        # synthetic_catalog puts item i at restaurant i % n_rest
+        item = r + n_rest * rng.randrange(n_items // n_rest)
+        lines[f"m{item}"] = lines.get(f"m{item}", 0) + 1
+    return list(lines.items())
+
+
+def bench_units(price_index, n_items: int, units: int, restaurants: int, carts: int, budget: float, seed: int):
+    n_rest = max(1, n_items // 5)
+    rng = random.Random(seed + units)
+    latencies, proven, savings, cold = [], 0, [], []
+    for _ in range(carts):
+        lines = random_cart(rng, n_items, n_rest, units, restaurants)
+        # Fresh optimizer for the cold solve, then the same cart again through its memo
+        optimizer = CartOptimizer()
+        t0 = time.perf_counter()
+        plan = optimizer.optimize(price_index, lines, budget)
+        cold.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        optimizer.optimize(price_index, lines, budget)
+        latencies.append(time.perf_counter() - t0)
+        proven += plan["optimal"]
+        savings.append(plan["savings"] / plan["per_item_total"] if plan["per_item_total"] else 0.0)
+    cold.sort()
+    return {
+        "units": units,
+        "restaurants": restaurants,
+        "carts": carts,
+        "cold_p50_ms": statistics.median(cold) * 1e3,
+        "cold_max_ms": cold[-1] * 1e3,
+        "memo_p50_ms": statistics.median(latencies) * 1e3,
+        "proven_optimal": proven / carts,
+        "mean_savings_vs_per_item": statistics.mean(savings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=5000, help="synthetic catalog size")
+    parser.add_argument("--units", type=int, nargs="+", default=[5, 10, 25, 50, 100, 200])
+    parser.add_argument("--restaurants", type=int, default=4, help="restaurants per cart")
+    parser.add_argument("--carts", type=int, default=20, help="random carts per size")
+    parser.add_argument("--budget-ms", type=float, default=CART_TIME_BUDGET * 1e3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    price_index = PriceIndex(Catalog.from_dicts(synthetic_catalog(args.items)))
+    rows = []
+    for units in args.units:
+        r = bench_units(price_index, args.items, units, args.restaurants, args.carts, args.budget_ms / 1e3, args.seed)
+        rows.append(r)
+        print(f"{units:4d} units / {r['restaurants']} restaurants: cold p50 {r['cold_p50_ms']:.1f}ms "
+              f"max {r['cold_max_ms']:.1f}ms, memoized p50 {r['memo_p50_ms']:.1f}ms, "
+              f"proven optimal {r['proven_optimal']:.0%}, saves {r['mean_savings_vs_per_item']:.1%} vs per-item")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"kind": "cart", "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "budget_ms": args.budget_ms, "sizes": rows}, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
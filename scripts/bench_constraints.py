@@ -0,0 +1,103 @@
+"""
+Microbenchmarks: compiled single-pass constraint parser vs the original parse_constraints.
+
+    python scripts/bench_constraints.py [--number 20000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.api import constraints  # noqa: E402
+
+MESSAGES = [
+    "I want high protein lunch under 20 bucks",
+    "veg no egg please",
+    "Vegan bowl under $15.50",
+    "eggless dinner for 12 dollars",
+    "something with protein < 9",
+    "cheap veggie bowl 10 bucks",
+    "surprise me",
+    "under 600 calories with 30g protein under $25",
+]
+
+
+def legacy_parse_constraints(message: str):
+    # Verbatim copy of the parser this module replaced, kept as the baseline
+    msg_lower = message.lower()
+    constraints = {"tags": [], "budget": None}
+
+    if "veg" in msg_lower or "vegan" in msg_lower:
+        constraints["tags"].append("veg")
+    if "protein" in msg_lower:
+        constraints["tags"].append("high_protein")
+    if "no egg" in msg_lower or "eggless" in msg_lower:
+        constraints["tags"].append("no_egg")
+
+    # Extract budget e.g., "under 15" or "$15"
+    budget_match = re.search(r'(?:under|<|\$)\s*(\d+(?:\.\d{2})?)', msg_lower)
+    if budget_match:
+        constraints["budget"] = float(budget_match.group(1))
+    else:
+        # Fallback parsing like "15 bucks"
+        bucks_match = re.search(r'(\d+(?:\.\d{2})?)\s*(?:bucks|dollars)', msg_lower)
+        if bucks_match:
+            constraints["budget"] = float(bucks_match.group(1))
+
+    return constraints
+
+
+def per_call_us(fn, messages, number):
+    total = timeit.timeit(lambda: [fn(m) for m in messages], number=number)
+    return total / (number * len(messages)) * 1e6
+
+
+def uncached(message):
+    return constraints._parse_normalized.__wrapped__(constraints.normalize(message))
+
+
+def bench_vocab_scaling(number):
+    """Per-call cost as the tag vocabulary grows: one substring check per phrase vs one combined regex."""
+    rng = random.Random(7)
+    print("\nTag vocabulary scaling (us/call, no cache)")
+    print(f"{'phrases':>8} {'substring loop':>15} {'combined regex':>15}")
+    for n in (3, 30, 300):
+        phrases = [f"diet{i}x" for i in range(n)]
+        combined = re.compile("|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True)))
+        msgs = [f"{m} {rng.choice(phrases)}".lower() for m in MESSAGES]
+
+        def substring_loop(msg):
+            return [p for p in phrases if p in msg]
+
+        def regex_pass(msg):
+            return {m.group(0) for m in combined.finditer(msg)}
+
+        print(f"{n:>8} {per_call_us(substring_loop, msgs, number // 10):>15.2f} "
+              f"{per_call_us(regex_pass, msgs, number // 10):>15.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000, help="repetitions of the message corpus")
+    args = parser.parse_args()
+
+    for m in MESSAGES:
+        old, new = legacy_parse_constraints(m), constraints.parse_constraints(m)
+        if (old["tags"], old["budget"]) != (new["tags"], new["budget"]):
+            print(f"note: parsers disagree on {m!r}: legacy={old} compiled={new}")
+
+    print(f"parse_constraints over {len(MESSAGES)} messages x {args.number} (us/call)")
+    print(f"  legacy                {per_call_us(legacy_parse_constraints, MESSAGES, args.number):8.2f}")
+    print(f"  compiled, uncached    {per_call_us(uncached, MESSAGES, args.number):8.2f}")
+    print(f"  compiled, cached      {per_call_us(constraints.parse_constraints, MESSAGES, args.number):8.2f}")
+    print(f"  cache: {constraints.cache_info()}")
+
+    bench_vocab_scaling(args.number)
+
+
+if __name__ == "__main__":
+    main()
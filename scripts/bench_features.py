@@ -0,0 +1,111 @@
+"""
+Benchmark for ranking-feature cost: /message ranking time as score features are added,
+with the features precomputed into the engine's FeatureTable versus combined per request
+from separate columns (the per-request join the table replaces).
+
+    python scripts/bench_features.py --items 100000 --features 0 2 8 32 --output bench_results/features.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from bench_micro import WEIGHTS, synthetic_catalog, time_per_call  # noqa: E402
+from services.api.catalog import Catalog  # noqa: E402
+from services.api.constraints import parse_constraints  # noqa: E402
+from services.api.pricing import PriceIndex  # noqa: E402
+from services.api.scoring import ScoringEngine, select_top_k  # noqa: E402
+
+MESSAGES = ["I want high protein lunch under 20 bucks", "veg no egg please", "surprise me"]
+
+
+def with_ratings(raw: dict, seed: int = 7) -> dict:
+    """synthetic_catalog with a social rating for most items."""
+    rng = random.Random(seed)
+    raw["social_ratings"] = [
+        {"item_id": item["item_id"], "rating": round(rng.uniform(3.0, 5.0), 1), "review_count": rng.randint(0, 400)}
+        for item in raw["menu_items"] if rng.random() < 0.8
+    ]
+    return raw
+
+
+def add_feature(table, name: str, column: np.ndarray, weight: float):
+    """Add a synthetic static feature to the engine's table, folded into base like the built-in ones."""
+    # New containers rather than in-place edits: copies from with_prices share them
+    table.columns = {**table.columns, name: np.asarray(column, dtype=np.float64)}
+    table.weights = {**table.weights, name: weight}
+    table._refresh()
+
+
+def joined_top_k(engine: ScoringEngine, weights, c: dict, k: int = 3):
+    # Every weighted feature gathered and summed per request, as a per-request join would
+    rows = engine.candidate_rows(c["tags"], c["budget"], c["max_calories"], c["min_protein"])
+    if rows.size == 0:
+        return []
+    table = engine.features
+    scores = table.weights["price"] * engine.eff_price[rows]
+    for name, column in table.columns.items():
+        w = table.weights.get(name, 0.0)
+        if w:
+            scores = scores + w * column[rows]
+    return select_top_k(rows, scores + engine.tag_matrix[rows] @ engine.weight_vector(weights), k)
+
+
+def bench_features(catalog, index, n_extra: int, seed: int):
+    engine = ScoringEngine(catalog, index)
+    rng = np.random.default_rng(seed)
+    t0 = time.perf_counter()
+    for i in range(n_extra):
+        add_feature(engine.features, f"extra_{i}", rng.standard_normal(len(engine)), 0.01)
+    results = {"features": len(engine.features.columns) + 1, "build_ms": (time.perf_counter() - t0) * 1e3}
+    table_ms, joined_ms = [], []
+    for message in MESSAGES:
+        c = parse_constraints(message)
+        # Both paths must agree (up to summation order) before their timings mean anything
+        table_top = engine.top_k(WEIGHTS, c["tags"], c["budget"], 3, c["max_calories"], c["min_protein"])
+        assert np.allclose([s for _, s in table_top], [s for _, s in joined_top_k(engine, WEIGHTS, c)])
+        table_ms.append(time_per_call(lambda: engine.top_k(
+            WEIGHTS, c["tags"], c["budget"], 3, c["max_calories"], c["min_protein"])) * 1e3)
+        joined_ms.append(time_per_call(lambda: joined_top_k(engine, WEIGHTS, c)) * 1e3)
+    results["table_ms"] = sum(table_ms) / len(table_ms)
+    results["joined_ms"] = sum(joined_ms) / len(joined_ms)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--features", type=int, nargs="+", default=[0, 2, 8, 32],
+                        help="extra synthetic features added on top of the built-in ones")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    catalog = Catalog.from_dicts(with_ratings(synthetic_catalog(args.items, args.seed)))
+    index = PriceIndex(catalog)
+    print(f"{args.items} items, mean ranking time per /message (3 messages)")
+    runs = []
+    for n_extra in args.features:
+        r = bench_features(catalog, index, n_extra, args.seed)
+        runs.append(r)
+        print(f"  {r['features']:3d} features: table {r['table_ms']:.3f}ms, joined {r['joined_ms']:.3f}ms "
+              f"(table rebuild {r['build_ms']:.1f}ms)")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"kind": "features", "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "items": args.items, "runs": runs}, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
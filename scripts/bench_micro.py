@@ -0,0 +1,177 @@
+"""
+In-process microbenchmarks for the /message hot path across catalog sizes:
+calculate_best_price, parse_constraints and the ranking loop, each next to the
+original implementation it replaced.
+
+    python scripts/bench_micro.py --sizes 1000 10000 100000 --output bench_results/micro.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from bench_constraints import MESSAGES, legacy_parse_constraints  # noqa: E402
+from services.api.catalog import Catalog  # noqa: E402
+from services.api.constraints import parse_constraints  # noqa: E402
+from services.api.pricing import NO_PRICE, PriceIndex  # noqa: E402
+from services.api.scoring import ScoringEngine  # noqa: E402
+
+PLATFORMS = ["UberEats", "DoorDash", "Grubhub"]
+TAGS = ["veg", "high_protein", "no_egg"]
+COUPONS = [
+    {"code": "UBER10", "platform": "UberEats", "discount_value": 10.0, "min_spend": 30.0},
+    {"code": "DASH5", "platform": "DoorDash", "discount_value": 5.0, "min_spend": 15.0},
+    {"code": "GRUBFREE", "platform": "Grubhub", "discount_value": 3.99, "min_spend": 20.0},
+    {"code": "TREAT15", "platform": "UberEats", "discount_value": 15.0, "min_spend": 40.0},
+    {"code": "DOOR20", "platform": "DoorDash", "discount_value": 0.20, "min_spend": 25.0},
+]
+WEIGHTS = {"veg": 1.5, "high_protein": 2.0, "no_egg": -0.5, "coach_style": 1.0}
+
+
+def synthetic_catalog(n_items: int, seed: int = 42) -> dict:
+    """Raw catalog dicts shaped like data/*.json, scaled to n_items."""
+    rng = random.Random(seed)
+    n_rest = max(1, n_items // 5)
+    restaurants = [{"id": f"r{i}", "name": f"Restaurant {i}", "neighborhood": "Downtown"} for i in range(n_rest)]
+    menu_items, prices = [], []
+    for i in range(n_items):
+        item_id = f"m{i}"
+        menu_items.append({
+            "item_id": item_id,
+            "restaurant_id": f"r{i % n_rest}",
+            "name": f"Item {i}",
+            "tags": [t for t in TAGS if rng.random() < 0.4],
+            "calories_est": rng.randint(150, 1200),
+            "protein_est": rng.randint(5, 55),
+        })
+        base = rng.uniform(9.0, 18.0)
+        for plat in PLATFORMS:
+            prices.append({
+                "item_id": item_id,
+                "platform_name": plat,
+                "base_price": round(base + rng.uniform(-1.0, 1.0), 2),
+                "delivery_fee": round(rng.uniform(0.99, 5.99), 2),
+            })
+    return {"restaurants": restaurants, "menu_items": menu_items,
+            "platform_prices": prices, "coupons": COUPONS, "social_ratings": []}
+
+
+def legacy_calculate_best_price(raw: dict, item_id: str):
+    # The original per-call scan over every price row and coupon
+    prices = [p for p in raw["platform_prices"] if p["item_id"] == item_id]
+    best_eff_price, best_platform = NO_PRICE, None
+    for p in prices:
+        base, fee, platform = p["base_price"], p["delivery_fee"], p["platform_name"]
+        applicable = [c for c in raw["coupons"] if c["platform"] == platform and base >= c["min_spend"]]
+        discount = 0.0
+        for c in applicable:
+            val = c["discount_value"]
+            cand = base * val if val < 1.0 else val
+            discount = max(discount, cand)
+        eff = base - discount + fee
+        if eff < best_eff_price:
+            best_eff_price, best_platform = eff, platform
+    return best_eff_price, best_platform
+
+
+def legacy_rank(raw: dict, index: PriceIndex, constraints: dict, weights: dict):
+    # The original dict-per-item loop and full sort (prices from the index, so only ranking is measured)
+    budget, required = constraints["budget"], set(constraints["tags"])
+    scored = []
+    for item in raw["menu_items"]:
+        item_tags = set(item.get("tags", []))
+        if required and not required.issubset(item_tags):
+            continue
+        eff, info = index.best_price(item["item_id"])
+        if (budget and eff > budget) or eff == NO_PRICE:
+            continue
+        score = -eff + item.get("protein_est", 0) / 10.0 + sum(weights.get(t, 0.0) for t in item_tags)
+        restaurant = next((r for r in raw["restaurants"] if r["id"] == item["restaurant_id"]), None)
+        scored.append({"item_id": item["item_id"], "restaurant": restaurant["name"] if restaurant else "Unknown",
+                       "best_platform": info, "score": score})
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored[:3]
+
+
+def time_per_call(fn, min_seconds=0.2):
+    """Seconds per call, repeating until at least min_seconds of work has been measured."""
+    number, elapsed = 1, 0.0
+    while True:
+        elapsed = timeit.timeit(fn, number=number)
+        if elapsed >= min_seconds or number >= 1_000_000:
+            return elapsed / number
+        number *= 2 if elapsed == 0 else max(2, int(min_seconds / elapsed * 1.2))
+
+
+def bench_size(n_items: int, legacy_limit: int):
+    raw = synthetic_catalog(n_items)
+    results = {"items": n_items}
+
+    t0 = time.perf_counter()
+    catalog = Catalog.from_dicts(raw)
+    index = PriceIndex(catalog)
+    engine = ScoringEngine(catalog, index)
+    results["build_seconds"] = time.perf_counter() - t0
+
+    probe = [f"m{i}" for i in range(0, n_items, max(1, n_items // 100))]
+    results["best_price_index_us"] = time_per_call(lambda: [index.best_price(i) for i in probe]) / len(probe) * 1e6
+    if n_items <= legacy_limit:
+        sample = probe[:5]
+        results["best_price_legacy_us"] = time_per_call(
+            lambda: [legacy_calculate_best_price(raw, i) for i in sample]) / len(sample) * 1e6
+
+    rankings = {}
+    for message in ("I want high protein lunch under 20 bucks", "veg no egg please", "surprise me"):
+        c = parse_constraints(message)
+        entry = {"engine_ms": time_per_call(lambda: engine.top_k(
+            WEIGHTS, c["tags"], c["budget"], 3, c["max_calories"], c["min_protein"])) * 1e3}
+        if n_items <= legacy_limit:
+            entry["legacy_ms"] = time_per_call(lambda: legacy_rank(raw, index, c, WEIGHTS)) * 1e3
+        rankings[message] = entry
+    results["ranking"] = rankings
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-limit", type=int, default=10000,
+                        help="largest catalog the legacy implementations are timed on (they scale quadratically)")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    parse = {
+        "legacy_us": time_per_call(lambda: [legacy_parse_constraints(m) for m in MESSAGES]) / len(MESSAGES) * 1e6,
+        "compiled_cached_us": time_per_call(lambda: [parse_constraints(m) for m in MESSAGES]) / len(MESSAGES) * 1e6,
+    }
+    print(f"parse_constraints: legacy {parse['legacy_us']:.2f}us, compiled+cached {parse['compiled_cached_us']:.2f}us")
+
+    sizes = []
+    for n in args.sizes:
+        r = bench_size(n, args.legacy_limit)
+        sizes.append(r)
+        legacy_bp = r.get("best_price_legacy_us")
+        print(f"\n{n} items (build {r['build_seconds']:.2f}s)")
+        print(f"  calculate_best_price: index {r['best_price_index_us']:.2f}us"
+              + (f", legacy {legacy_bp:.1f}us" if legacy_bp else ""))
+        for message, e in r["ranking"].items():
+            legacy = f", legacy {e['legacy_ms']:.2f}ms" if "legacy_ms" in e else ""
+            print(f"  rank {message!r}: engine {e['engine_ms']:.3f}ms{legacy}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"kind": "micro", "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "parse_constraints": parse, "sizes": sizes}, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Startup time and resident memory of the catalog loaders: the legacy json.load of lists of
+dicts, streamed JSON Lines into columns, and a memory-mapped snapshot. Each measurement
+runs in a fresh interpreter so RSS is not shared between runs.
+
+    python generate_data.py --scale --restaurants 10000 --format jsonl --out data/generated/jsonl
+    python -m services.api.columns build-snapshot --src data/generated/jsonl --out data/generated/snapshot
+    python scripts/bench_startup.py --jsonl data/generated/jsonl --snapshot data/generated/snapshot
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+from services.api.main import resident_memory_mb
+mode, path = sys.argv[1], sys.argv[2]
+import numpy  # imported up front so its own footprint is not counted as catalog memory
+rss_before = resident_memory_mb()
+start = time.perf_counter()
+if mode == "legacy":
+    data = {{}}
+    for name in ["restaurants", "menu_items", "platform_prices", "coupons", "social_ratings"]:
+        with open(os.path.join(path, name + ".jsonl")) as f:
+            data[name] = [json.loads(line) for line in f]
+    items = len(data["menu_items"])
+else:
+    from services.api.catalog import Catalog
+    from services.api.pricing import PriceIndex
+    from services.api.scoring import ScoringEngine
+    catalog = Catalog.load(path)
+    engine = ScoringEngine(catalog, PriceIndex(catalog))
+    items = len(catalog)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"items": items, "seconds": elapsed, "rss_mb": resident_memory_mb() - rss_before}}))
+"""
+
+
+def measure(mode, path):
+    out = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT), mode, path],
+                         capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jsonl", required=True, help="directory of <table>.jsonl files")
+    parser.add_argument("--snapshot", help="snapshot directory built from the same catalog")
+    parser.add_argument("--skip-legacy", action="store_true", help="skip the lists-of-dicts baseline")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    runs = [] if args.skip_legacy else [("legacy lists of dicts", "legacy", args.jsonl)]
+    # The jsonl and snapshot runs also build the price index and scoring engine
+    runs.append(("jsonl -> columns", "columns", args.jsonl))
+    if args.snapshot:
+        runs.append(("snapshot (mmap)", "columns", args.snapshot))
+
+    results = {}
+    for label, mode, path in runs:
+        r = measure(mode, path)
+        results[label] = r
+        print(f"{label:<24} {r['items']:>9} items  {r['seconds']:7.2f}s  +{r['rss_mb']:8.1f} MB RSS")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"kind": "startup", "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": results}, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Throughput scaling of the multi-worker server (gunicorn.conf.py) with its worker count.
+For each count it starts gunicorn on a fresh database (in a temp directory) against the
+upstream stub, drives it with the load_test session mix and records requests per second
+and latency percentiles.
+
+    python scripts/bench_workers.py --workers 1 2 4 8 --users 2000 --output bench_results/workers.json
+
+Client and server share the machine, so leave cores for the client: scaling flattens at
+roughly the physical core count minus what the load generator uses.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from load_test import ROOT, run_load, wait_for  # noqa: E402
+
+
+def start_server(args, workers: int, stub_url: str, workdir: str):
+    env = dict(os.environ,
+               AIRIA_API_KEY="stub", AIRIA_BASE_URL=stub_url,
+               OPENAI_API_KEY="stub", OPENAI_BASE_URL=f"{stub_url}/v1",
+               FOODPO_WORKERS=str(workers), FOODPO_BIND=f"127.0.0.1:{args.api_port}",
+               FOODPO_DB_PATH=os.path.join(workdir, "database.db"),
+               EVENT_LOG_DIR=os.path.join(workdir, "events"), PRICE_DELTA_DIR="")
+    if args.catalog:
+        env["CATALOG_DIR"] = args.catalog
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "services.api.main:app", "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="users in flight at once")
+    parser.add_argument("--sessions", type=int, default=1, help="demo sessions per user")
+    parser.add_argument("--feedback-ratio", type=float, default=0.5, help="share of sessions that send feedback")
+    parser.add_argument("--catalog", help="CATALOG_DIR for the server (default: the demo data)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--api-port", type=int, default=8800)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="seconds per stubbed upstream call")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+    # Fields run_load / run_user read from the load_test argument set
+    args.staged = False
+    args.fetch_audio = False
+    args.base_url = f"http://127.0.0.1:{args.api_port}"
+
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "scripts", "stub_upstreams.py"),
+         "--port", str(args.stub_port), "--latency", str(args.stub_latency)],
+        cwd=ROOT,
+    )
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    runs = []
+    try:
+        wait_for(stub_url + "/docs")
+        for workers in args.workers:
+            workdir = tempfile.mkdtemp(prefix="foodpo-bench-")
+            server = start_server(args, workers, stub_url, workdir)
+            try:
+                wait_for(args.base_url + "/docs", timeout=120.0)
+                report, wall = asyncio.run(run_load(args))
+            finally:
+                server.terminate()
+                server.wait()
+                shutil.rmtree(workdir, ignore_errors=True)
+            total = sum(r["requests"] for r in report.values())
+            errors = sum(r["errors"] for r in report.values())
+            runs.append({"workers": workers, "wall_seconds": wall, "requests": total, "errors": errors,
+                         "throughput_rps": total / wall if wall else 0.0, "endpoints": report})
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    base = runs[0]["throughput_rps"] if runs else 0.0
+    print(f"{args.users} users, concurrency {args.concurrency}, os.cpu_count() = {os.cpu_count()}")
+    print(f"{'workers':>7} {'rps':>9} {'speedup':>8} {'err':>5} {'msg p50':>8} {'msg p99':>8}")
+    for r in runs:
+        msg = r["endpoints"].get("POST /message", {})
+        fmt = lambda v: f"{v:8.1f}" if v is not None else f"{'-':>8}"
+        print(f"{r['workers']:>7} {r['throughput_rps']:>9.1f} {r['throughput_rps'] / base if base else 0:>7.2f}x "
+              f"{r['errors']:>5} {fmt(msg.get('p50_ms'))} {fmt(msg.get('p99_ms'))}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"kind": "workers", "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "config": {k: v for k, v in vars(args).items() if k != "output"},
+                       "cpu_count": os.cpu_count(), "runs": runs}, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
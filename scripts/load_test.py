@@ -0,0 +1,206 @@
+"""
+Load test built on the demo_replay flow (message -> feedback -> message), run by many
+concurrent synthetic users.
+
+By default it starts scripts/stub_upstreams.py and the API itself, both on local ports,
+with Airia and TTS pointed at the stub, so no external service is hit:
+
+    python scripts/load_test.py --users 2000 --concurrency 200 --output bench_results/load.json
+
+Use --base-url to drive a server you started yourself instead.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = [
+    "I want high protein lunch under 20 bucks",
+    "veg no egg please",
+    "vegan bowl under $15",
+    "something cheap under 12",
+    "high protein under 600 calories",
+    "surprise me",
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    idx = max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[idx]
+
+
+def summarize(samples, errors, wall):
+    report = {}
+    for endpoint in sorted(set(samples) | set(errors)):
+        lat = sorted(samples.get(endpoint, []))
+        report[endpoint] = {
+            "requests": len(lat),
+            "errors": errors.get(endpoint, 0),
+            "throughput_rps": len(lat) / wall if wall else 0.0,
+            "mean_ms": sum(lat) / len(lat) * 1000 if lat else None,
+            "p50_ms": percentile(lat, 50) * 1000 if lat else None,
+            "p95_ms": percentile(lat, 95) * 1000 if lat else None,
+            "p99_ms": percentile(lat, 99) * 1000 if lat else None,
+            "max_ms": lat[-1] * 1000 if lat else None,
+        }
+    return report
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, endpoint, coro):
+        start = time.perf_counter()
+        try:
+            res = await coro
+            res.raise_for_status()
+        except Exception:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        self.samples.setdefault(endpoint, []).append(time.perf_counter() - start)
+        return res
+
+
+async def run_user(client, rec, user_id, args, rng):
+    """One synthetic user: the demo_replay session, repeated --sessions times."""
+    for _ in range(args.sessions):
+        payload = {"user_id": user_id, "message": rng.choice(MESSAGES), "staged": args.staged}
+        res = await rec.call("POST /message", client.post("/message", json=payload))
+        if res is None:
+            continue
+        body = res.json()
+        top = body.get("top_results", [])
+
+        if args.fetch_audio and body.get("coach_audio_url", "").startswith("/"):
+            await rec.call("GET /audio/stream", client.get(body["coach_audio_url"]))
+        if args.staged and body.get("coach_job_url"):
+            await rec.call("GET /coach/jobs (wait)", client.get(body["coach_job_url"], params={"wait": 30}))
+
+        if len(top) >= 2 and rng.random() < args.feedback_ratio:
+            chosen = top[1]
+            fb = {
+                "user_id": user_id,
+                "chosen_item_id": chosen["item_id"],
+                "not_chosen_item_ids": [r["item_id"] for r in top if r["item_id"] != chosen["item_id"]],
+                "rating": rng.randint(1, 10),
+            }
+            await rec.call("POST /feedback", client.post("/feedback", json=fb))
+            await rec.call("POST /message", client.post("/message", json=payload))
+
+
+async def run_load(args):
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    sem = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        async def bounded(i):
+            async with sem:
+                await run_user(client, rec, f"load_user_{i}", args, random.Random(rng.random()))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(args.users)))
+        wall = time.perf_counter() - start
+
+    return summarize(rec.samples, rec.errors, wall), wall
+
+
+def wait_for(url, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args):
+    """Start the upstream stub and the API as subprocesses; returns them for teardown."""
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "scripts", "stub_upstreams.py"),
+         "--port", str(args.stub_port), "--latency", str(args.stub_latency)],
+        cwd=ROOT,
+    )
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    env = dict(os.environ,
+               AIRIA_API_KEY="stub", AIRIA_BASE_URL=stub_url,
+               OPENAI_API_KEY="stub", OPENAI_BASE_URL=f"{stub_url}/v1")
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "services.api.main:app",
+         "--port", str(args.api_port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    wait_for(stub_url + "/docs")
+    wait_for(f"http://127.0.0.1:{args.api_port}/docs")
+    return [api, stub]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="drive an already running API instead of starting one")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="users in flight at once")
+    parser.add_argument("--sessions", type=int, default=1, help="demo sessions per user")
+    parser.add_argument("--feedback-ratio", type=float, default=0.5, help="share of sessions that send feedback")
+    parser.add_argument("--staged", action="store_true", help="use staged /message and wait on the coach job")
+    parser.add_argument("--fetch-audio", action="store_true", help="download streamed coach audio")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--api-port", type=int, default=8800)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="seconds per stubbed upstream call")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    procs = []
+    if not args.base_url:
+        procs = start_servers(args)
+        args.base_url = f"http://127.0.0.1:{args.api_port}"
+    try:
+        report, wall = asyncio.run(run_load(args))
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+
+    result = {
+        "kind": "load_test",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "wall_seconds": wall,
+        "endpoints": report,
+    }
+
+    print(f"{args.users} users, concurrency {args.concurrency}, {wall:.2f}s wall")
+    print(f"{'endpoint':<24} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, r in report.items():
+        fmt = lambda v: f"{v:8.1f}" if v is not None else f"{'-':>8}"
+        print(f"{endpoint:<24} {r['requests']:>7} {r['errors']:>5} {r['throughput_rps']:>8.1f} "
+              f"{fmt(r['p50_ms'])} {fmt(r['p95_ms'])} {fmt(r['p99_ms'])}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Local stand-in for the Airia pipeline and the OpenAI TTS endpoint.
+
+Run it, then point the API at it:
+    python scripts/stub_upstreams.py --port 9100 --latency 0.2
+    AIRIA_API_KEY=stub AIRIA_BASE_URL=http://localhost:9100 \\
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://localhost:9100/v1 \\
+    python -m uvicorn services.api.main:app
+"""
+import argparse
+import asyncio
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI()
+
+LATENCY = float(os.getenv("STUB_LATENCY", "0.1"))
+AUDIO_CHUNKS = int(os.getenv("STUB_AUDIO_CHUNKS", "8"))
+AUDIO_CHUNK_SIZE = 4096
+
+
+@app.post("/v2/PipelineExecution/{pipeline_id}")
+async def airia_pipeline(pipeline_id: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY)
+    return {"output": f"Stub coach reply for {len(body.get('userInput', ''))} chars of context."}
+
+
+@app.post("/v1/audio/speech")
+async def tts_speech(request: Request):
+    await request.json()
+
+    async def chunks():
+        # Spread the latency over the clip so streaming clients see bytes arrive gradually
+        for _ in range(AUDIO_CHUNKS):
+            await asyncio.sleep(LATENCY / AUDIO_CHUNKS)
+            yield b"\x00" * AUDIO_CHUNK_SIZE
+
+    return StreamingResponse(chunks(), media_type="audio/mpeg")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub Airia/OpenAI upstreams")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=LATENCY)
+    args = parser.parse_args()
+    LATENCY = args.latency
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
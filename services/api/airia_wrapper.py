@@ -0,0 +1,82 @@
+import asyncio
+import os
+from typing import Optional
+
+import httpx
+
+from services.api.metrics import upstream_call
+
+# Base URL is overridable so the pipeline can be pointed at a local stub server
+AIRIA_BASE_URL = os.getenv("AIRIA_BASE_URL", "https://api.airia.ai")
+AIRIA_PIPELINE_PATH = "/v2/PipelineExecution/89ba5741-ca1a-49a9-a618-e231d5c67a30"
+AIRIA_TIMEOUT = float(os.getenv("AIRIA_TIMEOUT", "12"))
+AIRIA_MAX_CONCURRENCY = int(os.getenv("AIRIA_MAX_CONCURRENCY", "16"))
+
+_client: Optional[httpx.AsyncClient] = None
+_limit: Optional[asyncio.Semaphore] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared keep-alive client so every coach call reuses pooled connections."""
+    global _client, _limit
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=AIRIA_BASE_URL,
+            timeout=AIRIA_TIMEOUT,
+            limits=httpx.Limits(max_connections=AIRIA_MAX_CONCURRENCY,
+                                max_keepalive_connections=AIRIA_MAX_CONCURRENCY),
+        )
+        _limit = asyncio.Semaphore(AIRIA_MAX_CONCURRENCY)
+    return _client
+
+
+async def close_client():
+    global _client, _limit
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _limit = None
+
+
+def extract_output(res: httpx.Response) -> str:
+    try:
+        res_data = res.json()
+        if isinstance(res_data, dict):
+            return res_data.get("output", res_data.get("result", res_data.get("response", res_data.get("text", str(res_data)))))
+        return str(res_data)
+    except ValueError:
+        # Fallback to plain text if not JSON
+        return res.text
+
+
+async def run_pipeline(api_key: str, user_input: str, deadline: float = AIRIA_TIMEOUT) -> str:
+    """
+    Runs the Airia coach pipeline and returns its text output ("" on any failure).
+    At most AIRIA_MAX_CONCURRENCY calls are in flight; waiting for a slot counts against the deadline.
+    """
+    client = get_client()
+    headers = {
+        "X-API-KEY": api_key,
+        "Content-Type": "application/json"
+    }
+
+    async def _post():
+        async with _limit:
+            return await client.post(
+                AIRIA_PIPELINE_PATH,
+                headers=headers,
+                json={"userInput": user_input, "asyncOutput": False},
+            )
+
+    try:
+        with upstream_call("airia") as outcome:
+            res = await asyncio.wait_for(_post(), deadline)
+            if res.status_code != 200:
+                outcome["value"] = "error"
+        if res.status_code == 200:
+            return extract_output(res)
+    except asyncio.TimeoutError:
+        print(f"Airia API timed out after {deadline}s")
+    except Exception as e:
+        print(f"Airia API failed: {e}")
+    return ""
@@ -0,0 +1,389 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+CART_TIME_BUDGET = float(os.getenv("CART_TIME_BUDGET", "0.25"))  # seconds per cart before settling
+# Coupons considered per cart, most valuable first; combining restaurants is exponential in this
+CART_MAX_COUPONS = 12
+CART_CACHE_SIZE = int(os.getenv("CART_CACHE_SIZE", "4096"))  # memoized per-restaurant solutions
+# Deadline checks inside a DP layer, every this many expanded states
+_CHECK_EVERY = 4096
+
+INFEASIBLE = float("inf")
+
+
+class OutOfTime(Exception):
+    pass
+
+
+def _cents(value: float) -> int:
+    return int(round(value * 100))
+
+
+class CartOptimizer:
+    """
+    Cheapest way to order a whole cart across delivery platforms. Items from one restaurant
+    on one platform make one order: base prices add up, the delivery fee is charged once
+    (the highest fee among its items), and at most one coupon applies when the order
+    subtotal reaches its min_spend (values < 1.0 are percentages, as in PriceIndex). Each
+    coupon code is used at most once per cart.
+
+    Restaurants only interact through coupons, so each restaurant is solved on its own for
+    every set of coupons it could use (at most one per platform), and a DP over restaurants
+    and used-coupon bitmasks picks the cheapest combination. A restaurant solve is a DP over
+    its item units whose state is, per platform, the highest fee so far and the subtotal
+    capped at that platform's coupon threshold, so equivalent partial assignments merge.
+    States that can no longer reach a threshold, that another state dominates, or that cannot
+    beat the heuristic plan are pruned, and coupon sets whose bound cannot beat a subset of
+    their coupons are skipped. Solves are memoized by their inputs (offers and coupons), so
+    they survive across calls and price reloads.
+    Each restaurant starts from heuristic plans (everything on one platform, or each item
+    on its cheapest platform); exact solves replace them until the time budget runs out,
+    so there is always a valid answer and "optimal" says whether it is proven.
+    """
+
+    def __init__(self, max_entries: int = CART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def optimize(self, price_index, lines: List[Tuple[str, int]], time_budget: float = CART_TIME_BUDGET) -> dict:
+        """lines are (item_id, quantity); returns the orders, totals and whether the plan is proven optimal."""
+        start = time.perf_counter()
+        deadline = start + time_budget
+        catalog = price_index.catalog
+
+        # Units (one per quantity) grouped by restaurant, as (item_id, {platform: (base, fee)})
+        units_by_restaurant: Dict[str, list] = {}
+        unavailable = []
+        per_item_total = 0.0
+        for item_id, quantity in lines:
+            item = catalog.item(item_id) if catalog is not None else None
+            rows = price_index.price_rows(item_id)
+            if item is None or not rows:
+                unavailable.append(item_id)
+                continue
+            offers = {p["platform_name"]: (p["base_price"], p["delivery_fee"]) for p in rows}
+            units_by_restaurant.setdefault(item.restaurant_id, []).extend([(item_id, offers)] * quantity)
+            per_item_total += price_index.best_price(item_id)[0] * quantity
+
+        coupons = self._cart_coupons(price_index, units_by_restaurant)
+
+        proven = True
+        tables = []
+        for restaurant_id, units in units_by_restaurant.items():
+            # Identical items next to each other, priciest first
+            units.sort(key=lambda u: (-max(b for b, _ in u[1].values()), u[0]))
+            platforms = sorted({p for _, offers in units for p in offers})
+            # A combo picks, per platform, no coupon or the index of one in coupons
+            options = [[None] + [k for k, c in enumerate(coupons) if c["platform"] == p] for p in platforms]
+            table = {}
+            for combo in itertools.product(*options):
+                table[combo] = self._heuristic(units, platforms, self._coupons(coupons, combo))
+            tables.append((restaurant_id, units, platforms, table))
+
+        # Exact solves, coupon-free first so every restaurant gets its baseline proven early
+        pending = [(sum(c is not None for c in combo), i, combo)
+                   for i, (_, _, _, table) in enumerate(tables) for combo in table]
+        pending.sort(key=lambda p: (p[0], p[1]))
+        solved = [set() for _ in tables]
+        for _, i, combo in pending:
+            _, units, platforms, table = tables[i]
+            empty = (None,) * len(platforms)
+            if combo != empty and empty in solved[i]:
+                # Bound: no plan under combo beats the coupon-free optimum minus combo's largest
+                # possible discount. If a subset of its coupons already reaches that, drop it.
+                bound = table[empty][0] - self._max_discount(units, platforms, self._coupons(coupons, combo))
+                if any(table[sub][0] <= bound for sub in self._subsets(combo)):
+                    table[combo] = (INFEASIBLE, None)
+                    continue
+            try:
+                exact = self._solve(units, platforms, self._coupons(coupons, combo), table[combo][0], deadline)
+            except OutOfTime:
+                proven = False
+                break
+            solved[i].add(combo)
+            if exact[0] <= table[combo][0]:
+                table[combo] = exact
+
+        # Combine restaurants: used-coupon bitmask -> (cost, chosen (combo, assignment) per restaurant)
+        best = {0: (0.0, [])}
+        for _, units, platforms, table in tables:
+            choices = self._undominated(table)
+            nxt = {}
+            for mask, (cost, picks) in best.items():
+                for amask, acost, combo, assignment in choices:
+                    if mask & amask:
+                        continue
+                    key, total = mask | amask, cost + acost
+                    if key not in nxt or total < nxt[key][0]:
+                        nxt[key] = (total, picks + [(combo, assignment)])
+            best = nxt
+        _, picks = min(best.values(), key=lambda v: v[0])
+
+        orders = []
+        for (restaurant_id, units, platforms, _), (combo, assignment) in zip(tables, picks):
+            orders.extend(self._orders(restaurant_id, units, platforms, self._coupons(coupons, combo), assignment))
+        total = sum(o["total"] for o in orders)
+        return {
+            "orders": orders,
+            "total": round(total, 2),
+            "per_item_total": round(per_item_total, 2),
+            "savings": round(per_item_total - total, 2),
+            "unavailable": unavailable,
+            "optimal": proven,
+            "elapsed_ms": round((time.perf_counter() - start) * 1e3, 3),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
+
+    @staticmethod
+    def _coupons(coupons, combo) -> tuple:
+        return tuple(None if k is None else coupons[k] for k in combo)
+
+    @staticmethod
+    def _subsets(combo):
+        """Combos using a proper subset of combo's coupons."""
+        for sub in itertools.product(*[(None,) if k is None else (None, k) for k in combo]):
+            if sub != combo:
+                yield sub
+
+    @staticmethod
+    def _max_discount(units, platforms, combo) -> float:
+        discount = 0.0
+        for p, coupon in zip(platforms, combo):
+            if coupon is None:
+                continue
+            val = coupon["discount_value"]
+            discount += val * sum(offers[p][0] for _, offers in units if p in offers) if val < 1.0 else val
+        return discount
+
+    @staticmethod
+    def _cart_coupons(price_index, units_by_restaurant) -> list:
+        # Upper bound on each platform's spend in this cart, to rank percentage coupons
+        spend = {}
+        for units in units_by_restaurant.values():
+            for _, offers in units:
+                for p, (base, _) in offers.items():
+                    spend[p] = spend.get(p, 0.0) + base
+        coupons = [c for p in spend for c in price_index.coupons_by_platform.get(p, [])
+                   if _cents(c["min_spend"]) <= _cents(spend[p])]
+        value = lambda c: spend[c["platform"]] * c["discount_value"] if c["discount_value"] < 1.0 else c["discount_value"]
+        coupons.sort(key=lambda c: (-value(c), c["code"]))
+        return coupons[:CART_MAX_COUPONS]
+
+    @staticmethod
+    def _evaluate(units, platforms, combo, assignment) -> float:
+        """Cost of one assignment (platform index per unit) under combo, or INFEASIBLE."""
+        subtotal = [0.0] * len(platforms)
+        cents = [0] * len(platforms)
+        fee = [None] * len(platforms)
+        for (_, offers), j in zip(units, assignment):
+            base, f = offers[platforms[j]]
+            subtotal[j] += base
+            cents[j] += _cents(base)
+            fee[j] = f if fee[j] is None else max(fee[j], f)
+        cost = 0.0
+        for j, coupon in enumerate(combo):
+            if fee[j] is None:
+                if coupon is not None:
+                    return INFEASIBLE
+                continue
+            cost += subtotal[j] + fee[j]
+            if coupon is not None:
+                if cents[j] < _cents(coupon["min_spend"]):
+                    return INFEASIBLE
+                val = coupon["discount_value"]
+                cost -= subtotal[j] * val if val < 1.0 else val
+        return cost
+
+    def _heuristic(self, units, platforms, combo):
+        plans = []
+        for j, p in enumerate(platforms):
+            if all(p in offers for _, offers in units):
+                plans.append([j] * len(units))
+        plans.append([
+            min((j for j, p in enumerate(platforms) if p in offers), key=lambda j: sum(offers[platforms[j]]))
+            for _, offers in units
+        ])
+        best = (INFEASIBLE, None)
+        for plan in plans:
+            cost = self._evaluate(units, platforms, combo, plan)
+            if cost < best[0]:
+                best = (cost, plan)
+        return best
+
+    def _solve(self, units, platforms, combo, incumbent, deadline):
+        """
+        Exact (cost, assignment) for one restaurant under combo; raises OutOfTime past deadline.
+        incumbent is the cost of the heuristic plan for the same inputs, used as the bound.
+        """
+        key = (tuple(tuple(sorted(offers.items())) for _, offers in units), tuple(platforms),
+               tuple(None if c is None else (c["code"], c["discount_value"], c["min_spend"]) for c in combo))
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return hit
+            self.misses += 1
+        result = self._dp(units, platforms, combo, incumbent, deadline)
+        if self.max_entries > 0:
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _dp(units, platforms, combo, incumbent, deadline):
+        n, m = len(units), len(platforms)
+        pct = [c["discount_value"] if c is not None and c["discount_value"] < 1.0 else 0.0 for c in combo]
+        flat = sum(c["discount_value"] for c in combo if c is not None and c["discount_value"] >= 1.0)
+        need = [_cents(c["min_spend"]) if c is not None else -1 for c in combo]
+        coupon_slots = [j for j in range(m) if need[j] >= 0]
+
+        # Per unit and platform: (cost with percentage coupon folded in, base cents, fee cents)
+        moves = []
+        for _, offers in units:
+            moves.append([(j, offers[p][0] * (1.0 - pct[j]), _cents(offers[p][0]), _cents(offers[p][1]))
+                          for j, p in enumerate(platforms) if p in offers])
+        # reach[u][j]: most base cents units u.. could still add to platform j;
+        # floor[u]: least units u.. can add to the cost (cheapest platform each, fees aside)
+        reach = [[0] * m for _ in range(n + 1)]
+        floor = [0.0] * (n + 1)
+        for u in range(n - 1, -1, -1):
+            reach[u] = list(reach[u + 1])
+            for j, _, base, _ in moves[u]:
+                reach[u][j] += base
+            floor[u] = floor[u + 1] + min(price for _, price, _, _ in moves[u])
+        # Branch and bound: states that cannot finish below a known plan are dropped
+        ceiling = incumbent + flat + 1e-9
+
+        # State: (fee cents or -1 if unused, capped subtotal cents) per platform, flattened
+        layer = {tuple([-1, 0] * m): (0.0, None)}
+        layers = []
+        expanded = 0
+        for u in range(n):
+            # A coupon platform whose subtotal is below slack needs this unit to stay reachable
+            slack = [need[k] - reach[u + 1][k] for k in range(m)]
+            nxt = {}
+            for state, (cost, _) in layer.items():
+                expanded += 1
+                if expanded % _CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                    raise OutOfTime()
+                short = [k for k in coupon_slots if state[2 * k + 1] < slack[k]]
+                if len(short) > 1:
+                    continue
+                for j, price, base, fee in moves[u]:
+                    if short and j != short[0]:
+                        continue
+                    sub = state[2 * j + 1]
+                    if need[j] >= 0:
+                        sub = min(need[j], sub + base)
+                        if sub < slack[j]:
+                            continue
+                    old_fee = state[2 * j]
+                    new_fee = fee if fee > old_fee else old_fee
+                    new = state[:2 * j] + (new_fee, sub) + state[2 * j + 2:]
+                    total = cost + price + (new_fee - max(old_fee, 0)) / 100.0
+                    if total + floor[u + 1] > ceiling:
+                        continue
+                    seen = nxt.get(new)
+                    if seen is None or total < seen[0]:
+                        nxt[new] = (total, (state, j))
+            for k in coupon_slots:
+                nxt = CartOptimizer._prune_subtotal(nxt, 2 * k + 1)
+            layers.append(nxt)
+            layer = nxt
+            if time.perf_counter() > deadline:
+                raise OutOfTime()
+
+        best_state, best_cost = None, INFEASIBLE
+        for state, (cost, _) in layer.items():
+            if all(state[2 * k] >= 0 and state[2 * k + 1] >= need[k] for k in coupon_slots) and cost < best_cost:
+                best_state, best_cost = state, cost
+        if best_state is None:
+            return (INFEASIBLE, None)
+        assignment = [0] * n
+        state = best_state
+        for u in range(n - 1, -1, -1):
+            prev, j = layers[u][state][1]
+            assignment[u] = j
+            state = prev
+        return (best_cost - flat, assignment)
+
+    @staticmethod
+    def _groups(states: dict, pos: int) -> list:
+        """States bucketed by every component except pos, as [(state[pos], cost, state)]."""
+        groups = {}
+        for state, entry in states.items():
+            groups.setdefault(state[:pos] + state[pos + 1:], []).append((state[pos], entry[0], state))
+        return list(groups.values())
+
+    @staticmethod
+    def _prune_subtotal(states: dict, pos: int) -> dict:
+        """
+        Among states equal except for one platform's capped subtotal, keep only those cheaper
+        than every state with a higher subtotal: more spend toward the threshold for no more
+        cost can only help.
+        """
+        kept = {}
+        for members in CartOptimizer._groups(states, pos):
+            members.sort(key=lambda m: (-m[0], m[1]))
+            cheapest = INFEASIBLE
+            for _, cost, state in members:
+                if cost < cheapest:
+                    kept[state] = states[state]
+                    cheapest = cost
+        return kept
+
+    @staticmethod
+    def _undominated(table):
+        """Feasible (mask, cost, combo, assignment), dropping options beaten by a cheaper one using a subset of coupons."""
+        options = sorted(
+            ((sum(1 << k for k in combo if k is not None), cost, combo, assignment)
+             for combo, (cost, assignment) in table.items() if cost < INFEASIBLE),
+            key=lambda o: o[1])
+        kept = []
+        for option in options:
+            if not any(k[0] & option[0] == k[0] for k in kept):
+                kept.append(option)
+        return kept
+
+    @staticmethod
+    def _orders(restaurant_id, units, platforms, combo, assignment) -> list:
+        orders = []
+        for j, platform in enumerate(platforms):
+            picked = [offers[platform] + (item_id,) for (item_id, offers), a in zip(units, assignment) if a == j]
+            if not picked:
+                continue
+            items: Dict[str, dict] = {}
+            for base, _, item_id in picked:
+                line = items.setdefault(item_id, {"item_id": item_id, "quantity": 0, "base_price": base})
+                line["quantity"] += 1
+            subtotal = sum(base for base, _, _ in picked)
+            fee = max(f for _, f, _ in picked)
+            coupon: Optional[dict] = combo[j]
+            discount = 0.0
+            if coupon is not None:
+                val = coupon["discount_value"]
+                discount = subtotal * val if val < 1.0 else val
+            orders.append({
+                "restaurant_id": restaurant_id,
+                "platform": platform,
+                "items": list(items.values()),
+                "subtotal": round(subtotal, 2),
+                "delivery_fee": fee,
+                "coupon": coupon["code"] if coupon is not None else None,
+                "discount": round(discount, 2),
+                "total": round(subtotal + fee - discount, 2),
+            })
+        return orders
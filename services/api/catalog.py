@@ -0,0 +1,134 @@
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from services.api.columns import CatalogColumns
+
+
+class Restaurant:
+    __slots__ = ("id", "name", "neighborhood")
+
+    def __init__(self, id: str, name: str, neighborhood: str = ""):
+        self.id = id
+        self.name = name
+        self.neighborhood = neighborhood
+
+
+class MenuItem:
+    __slots__ = ("item_id", "restaurant_id", "name", "tags", "calories_est", "protein_est")
+
+    def __init__(self, item_id: str, restaurant_id: str, name: str, tags: Iterable[str] = (),
+                 calories_est: float = 0, protein_est: float = 0):
+        self.item_id = item_id
+        self.restaurant_id = restaurant_id
+        self.name = name
+        # Tags are de-duplicated once here instead of via set() on every request
+        self.tags = tuple(dict.fromkeys(tags))
+        self.calories_est = calories_est
+        self.protein_est = protein_est
+
+
+class ItemTable(Mapping):
+    """Read-only id -> MenuItem view over the item columns; records are built on access."""
+
+    def __init__(self, catalog: "Catalog"):
+        self._catalog = catalog
+
+    def __getitem__(self, item_id: str) -> MenuItem:
+        row = self._catalog.row_of(item_id)
+        if row is None:
+            raise KeyError(item_id)
+        return self._catalog.item_at(row)
+
+    def __len__(self):
+        return self._catalog.columns.n_items
+
+    def __iter__(self):
+        return iter(self._catalog.columns.item_id)
+
+
+class Catalog:
+    """
+    In-memory catalog replacing the old global `data` dict.
+    Rows live in CatalogColumns (typed arrays, possibly memory-mapped from a snapshot);
+    Restaurant and MenuItem records are only built for the rows a request touches.
+    Ids resolve to rows through lazily built indexes, and per-tag row postings let
+    required-tag filters intersect sorted arrays instead of checking every item.
+    """
+
+    def __init__(self, columns: Optional[CatalogColumns] = None):
+        self.columns = columns if columns is not None else CatalogColumns()
+        self.menu_items = ItemTable(self)
+        self.coupons: List[dict] = self.columns.coupons
+        self._postings = None
+
+    @classmethod
+    def from_dicts(cls, raw: dict) -> "Catalog":
+        return cls(CatalogColumns.from_dicts(raw))
+
+    @classmethod
+    def load(cls, path: str) -> "Catalog":
+        """Catalog from a snapshot directory, *.jsonl files or the demo *.json files (see CatalogColumns.load)."""
+        return cls(CatalogColumns.load(path))
+
+    def __len__(self):
+        return self.columns.n_items
+
+    # --- rows ------------------------------------------------------------
+
+    def row_of(self, item_id: str) -> Optional[int]:
+        return self.columns.item_id.index().get(item_id)
+
+    def item_at(self, row: int) -> MenuItem:
+        cols = self.columns
+        rest_row = int(cols.item_restaurant_row[row])
+        return MenuItem(
+            cols.item_id[row],
+            cols.restaurant_id[rest_row] if rest_row >= 0 else "",
+            cols.item_name[row],
+            self._tags_at(row),
+            _number(cols.item_calories[row]),
+            _number(cols.item_protein[row]),
+        )
+
+    def _tags_at(self, row: int):
+        cols = self.columns
+        codes = cols.item_tag_codes[cols.item_tag_offsets[row]:cols.item_tag_offsets[row + 1]]
+        return tuple(cols.tag_vocab[c] for c in codes)
+
+    # --- lookups ---------------------------------------------------------
+
+    def item(self, item_id: str) -> Optional[MenuItem]:
+        row = self.row_of(item_id)
+        return self.item_at(row) if row is not None else None
+
+    def restaurant(self, restaurant_id: str) -> Optional[Restaurant]:
+        row = self.columns.restaurant_id.index().get(restaurant_id)
+        if row is None:
+            return None
+        cols = self.columns
+        return Restaurant(cols.restaurant_id[row], cols.restaurant_name[row], cols.restaurant_neighborhood[row])
+
+    def tags_for(self, item_id: str):
+        row = self.row_of(item_id)
+        return self._tags_at(row) if row is not None else ()
+
+    def postings(self) -> Dict[str, np.ndarray]:
+        """tag -> sorted int64 array of the rows carrying it, in tag_vocab order."""
+        if self._postings is None:
+            cols = self.columns
+            counts = np.diff(cols.item_tag_offsets)
+            rows = np.repeat(np.arange(cols.n_items, dtype=np.int64), counts)
+            # Stable sort by tag keeps each tag's rows ascending
+            order = np.argsort(cols.item_tag_codes, kind="stable")
+            per_tag = np.bincount(cols.item_tag_codes, minlength=len(cols.tag_vocab))
+            splits = np.split(rows[order], np.cumsum(per_tag)[:-1]) if len(cols.tag_vocab) else []
+            self._postings = {t: r for t, r in zip(cols.tag_vocab, splits) if r.size}
+        return self._postings
+
+
+def _number(value):
+    # float32 columns: shortest repr that round-trips (15.0 -> 15, 4.7 -> 4.7 rather than 4.69999...)
+    value = float(str(value))
+    return int(value) if value.is_integer() else value
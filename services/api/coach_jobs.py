@@ -0,0 +1,143 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+COACH_WORKERS = int(os.getenv("COACH_WORKERS", "8"))
+COACH_QUEUE_SIZE = int(os.getenv("COACH_QUEUE_SIZE", "256"))
+COACH_JOB_TTL = float(os.getenv("COACH_JOB_TTL", "300"))  # seconds a finished job stays pollable
+
+
+class QueueFull(Exception):
+    pass
+
+
+class CoachJob:
+    __slots__ = ("id", "status", "result", "error", "created", "finished", "_factory", "_task", "_done")
+
+    def __init__(self, factory):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._factory = factory
+        self._task: Optional[asyncio.Task] = None
+        self._done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        out = {"job_id": self.id, "status": self.status}
+        if self.result is not None:
+            out.update(self.result)
+        if self.error:
+            out["error"] = self.error
+        return out
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _finish(self, status: str, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self._done.set()
+
+
+class CoachJobQueue:
+    """
+    Bounded background queue for coach text + audio generation.
+    A fixed number of worker tasks drain it, submit() refuses work when the queue is full
+    (callers surface that as 503), and jobs can be cancelled whether queued or running.
+    Finished jobs are kept for COACH_JOB_TTL so clients can poll them.
+    """
+
+    def __init__(self, workers: int = COACH_WORKERS, maxsize: int = COACH_QUEUE_SIZE, ttl: float = COACH_JOB_TTL):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.jobs = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [asyncio.create_task(self._run(), name=f"coach-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        self._stopping = True
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job in self.jobs.values():
+            if job.status in ("queued", "running"):
+                job._finish("cancelled")
+
+    def submit(self, factory) -> CoachJob:
+        """Queue factory (a zero-arg coroutine function returning a result dict)."""
+        self._purge()
+        job = CoachJob(factory)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"coach queue is full ({self.maxsize} jobs)")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[CoachJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return False
+        if job._task is not None:
+            job._task.cancel()
+        job._finish("cancelled")
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != "queued":
+                    continue  # cancelled while waiting
+                job.status = "running"
+                job._task = asyncio.create_task(job._factory())
+                try:
+                    result = await job._task
+                    job._finish("done", result)
+                except asyncio.CancelledError:
+                    if job.status == "running":
+                        job._finish("cancelled")
+                    # A cancelled job must not take its worker down with it
+                    if self._stopping:
+                        raise
+                except Exception as e:
+                    job._finish("failed", error=str(e))
+                finally:
+                    job._task = None
+                    job._factory = None
+            finally:
+                self._queue.task_done()
+
+    def _purge(self):
+        now = time.time()
+        while self.jobs:
+            job = next(iter(self.jobs.values()))
+            if job.finished is None or now - job.finished <= self.ttl:
+                break
+            self.jobs.pop(job.id)
@@ -0,0 +1,387 @@
+"""
+Column storage for the catalog, plus the loaders that fill it.
+
+Three sources produce the same CatalogColumns:
+  - the demo JSON files in data/ (from_dicts),
+  - JSON Lines files, streamed line by line into typed arrays (from_jsonl),
+  - a columnar snapshot directory, memory-mapped read-only (from_snapshot) so several
+    uvicorn workers share one copy of the pages through the OS page cache.
+
+The snapshot layout is the one written by `generate_data.py --scale --format columnar`
+(manifest.json + one raw little-endian file per column); write_snapshot produces it from
+any loaded catalog:
+
+    python -m services.api.columns build-snapshot --src data --out data/generated/snapshot
+"""
+import argparse
+import json
+import os
+import sys
+from array import array
+
+import numpy as np
+
+SNAPSHOT_FORMAT = "foodpo-columnar"
+SNAPSHOT_VERSION = 1
+TABLES = ["restaurants", "menu_items", "platform_prices", "coupons", "social_ratings"]
+
+# (attribute, table, column, kind, dtype) for every file in a snapshot; csr columns name
+# their (offsets, codes) attribute pair. Must match ColumnarWriter in generate_data.py.
+SNAPSHOT_LAYOUT = [
+    ("restaurant_id", "restaurants", "id", "str", None),
+    ("restaurant_name", "restaurants", "name", "str", None),
+    ("restaurant_neighborhood", "restaurants", "neighborhood", "str", None),
+    ("item_id", "menu_items", "item_id", "str", None),
+    ("item_restaurant_row", "menu_items", "restaurant_row", "fixed", "<i4"),
+    ("item_name", "menu_items", "name", "str", None),
+    (("item_tag_offsets", "item_tag_codes"), "menu_items", "tags", "csr", "<u2"),
+    ("item_calories", "menu_items", "calories_est", "fixed", "<f4"),
+    ("item_protein", "menu_items", "protein_est", "fixed", "<f4"),
+    ("price_item_row", "platform_prices", "item_row", "fixed", "<i4"),
+    ("price_platform", "platform_prices", "platform", "fixed", "<u1"),
+    ("price_base", "platform_prices", "base_price", "fixed", "<f8"),
+    ("price_fee", "platform_prices", "delivery_fee", "fixed", "<f8"),
+    ("rating_item_row", "social_ratings", "item_row", "fixed", "<i4"),
+    ("rating_value", "social_ratings", "rating", "fixed", "<f4"),
+    ("rating_count", "social_ratings", "review_count", "fixed", "<i4"),
+]
+
+
+class StringColumn:
+    """Strings stored as one utf-8 blob plus int64 offsets; row i is blob[offsets[i]:offsets[i + 1]]."""
+
+    __slots__ = ("offsets", "blob", "_index")
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+        self._index = None
+
+    @classmethod
+    def from_strings(cls, values):
+        builder = StringBuilder()
+        for v in values:
+            builder.append(v)
+        return builder.finish()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def index(self) -> dict:
+        """value -> first row, built on first use."""
+        if self._index is None:
+            index = {}
+            for i, v in enumerate(self):
+                index.setdefault(v, i)
+            self._index = index
+        return self._index
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.blob.nbytes
+
+
+class StringBuilder:
+    def __init__(self):
+        self.offsets = array("q", [0])
+        self.blob = bytearray()
+
+    def append(self, value: str):
+        self.blob += value.encode("utf-8")
+        self.offsets.append(len(self.blob))
+
+    def finish(self) -> StringColumn:
+        return StringColumn(np.frombuffer(self.offsets, dtype=np.int64),
+                            np.frombuffer(bytes(self.blob), dtype=np.uint8))
+
+
+class CatalogColumns:
+    """
+    The whole catalog as flat arrays. Foreign keys are row numbers (-1 when the referenced
+    row is missing), tags are CSR-encoded codes into tag_vocab, and price platforms are
+    codes into platforms. Coupons stay a small list of dicts.
+    """
+
+    def __init__(self):
+        self.restaurant_id = StringColumn.from_strings([])
+        self.restaurant_name = StringColumn.from_strings([])
+        self.restaurant_neighborhood = StringColumn.from_strings([])
+
+        self.item_id = StringColumn.from_strings([])
+        self.item_name = StringColumn.from_strings([])
+        self.item_restaurant_row = np.zeros(0, dtype=np.int32)
+        self.item_tag_offsets = np.zeros(1, dtype=np.int64)
+        self.item_tag_codes = np.zeros(0, dtype=np.uint16)
+        self.item_calories = np.zeros(0, dtype=np.float32)
+        self.item_protein = np.zeros(0, dtype=np.float32)
+
+        self.price_item_row = np.zeros(0, dtype=np.int32)
+        self.price_platform = np.zeros(0, dtype=np.uint8)
+        self.price_base = np.zeros(0, dtype=np.float64)
+        self.price_fee = np.zeros(0, dtype=np.float64)
+
+        self.rating_item_row = np.zeros(0, dtype=np.int32)
+        self.rating_value = np.zeros(0, dtype=np.float32)
+        self.rating_count = np.zeros(0, dtype=np.int32)
+
+        self.tag_vocab = []
+        self.platforms = []
+        self.coupons = []
+        self.source = "empty"
+
+    @property
+    def n_items(self) -> int:
+        return len(self.item_id)
+
+    def nbytes(self) -> int:
+        total = 0
+        for v in vars(self).values():
+            if isinstance(v, (np.ndarray, StringColumn)):
+                total += v.nbytes
+        return total
+
+    # --- loaders ---------------------------------------------------------
+
+    @classmethod
+    def from_dicts(cls, raw: dict) -> "CatalogColumns":
+        """Columns from already-parsed table lists (the data/*.json layout)."""
+        builder = _Builder()
+        for table in TABLES:
+            add = builder.adder(table)
+            for row in raw.get(table, []):
+                add(row)
+        cols = builder.finish()
+        cols.source = "json"
+        return cols
+
+    @classmethod
+    def from_json_dir(cls, base_dir: str) -> "CatalogColumns":
+        raw = {}
+        for table in TABLES:
+            path = os.path.join(base_dir, f"{table}.json")
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    raw[table] = json.load(f)
+        return cls.from_dicts(raw)
+
+    @classmethod
+    def from_jsonl(cls, base_dir: str) -> "CatalogColumns":
+        """Streams <table>.jsonl files one line at a time; no table is ever held as a list of dicts."""
+        builder = _Builder()
+        # raw_decode skips json.loads' wrapper and whitespace checks; it shows up at millions of lines
+        decode = json.JSONDecoder().raw_decode
+        for table in TABLES:
+            path = os.path.join(base_dir, f"{table}.jsonl")
+            if not os.path.exists(path):
+                continue
+            add = builder.adder(table)
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        add(decode(line)[0])
+        cols = builder.finish()
+        cols.source = "jsonl"
+        return cols
+
+    @classmethod
+    def from_snapshot(cls, snap_dir: str, mmap: bool = True) -> "CatalogColumns":
+        with open(os.path.join(snap_dir, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{snap_dir} is not a {SNAPSHOT_FORMAT} v{SNAPSHOT_VERSION} snapshot")
+        if manifest.get("byteorder", "little") != "little":
+            raise ValueError(f"{snap_dir} was written big-endian; rebuild it on this machine")
+
+        def load(name, dtype):
+            path = os.path.join(snap_dir, name)
+            if os.path.getsize(path) == 0:
+                return np.zeros(0, dtype=dtype)
+            if mmap:
+                # Read-only pages straight from the page cache, shared by every process mapping them
+                return np.memmap(path, dtype=dtype, mode="r")
+            return np.fromfile(path, dtype=dtype)
+
+        cols = cls()
+        for attr, table, column, kind, dtype in SNAPSHOT_LAYOUT:
+            if kind == "str":
+                value = StringColumn(load(f"{table}.{column}.offsets", "<i8"), load(f"{table}.{column}.blob", np.uint8))
+            elif kind == "csr":
+                setattr(cols, attr[0], load(f"{table}.{column}.offsets", "<i8"))
+                attr, value = attr[1], load(f"{table}.{column}.codes", dtype)
+            else:
+                value = load(f"{table}.{column}.bin", dtype)
+            setattr(cols, attr, value)
+        cols.tag_vocab = manifest["tag_vocab"]
+        cols.platforms = manifest["platforms"]
+        cols.coupons = manifest["coupons"]
+        cols.source = "snapshot (mmap)" if mmap else "snapshot"
+        return cols
+
+    @classmethod
+    def load(cls, path: str) -> "CatalogColumns":
+        """Picks the loader from what is in path: manifest.json, *.jsonl, or the demo *.json files."""
+        if os.path.exists(os.path.join(path, "manifest.json")):
+            return cls.from_snapshot(path)
+        if any(os.path.exists(os.path.join(path, f"{t}.jsonl")) for t in TABLES):
+            return cls.from_jsonl(path)
+        return cls.from_json_dir(path)
+
+    # --- snapshot writer -------------------------------------------------
+
+    def write_snapshot(self, snap_dir: str):
+        os.makedirs(snap_dir, exist_ok=True)
+
+        def put(name, values, dtype):
+            np.asarray(values).astype(dtype, copy=False).tofile(os.path.join(snap_dir, name))
+
+        tables = {}
+        for attr, table, column, kind, dtype in SNAPSHOT_LAYOUT:
+            if kind == "str":
+                col = getattr(self, attr)
+                put(f"{table}.{column}.offsets", col.offsets, "<i8")
+                put(f"{table}.{column}.blob", col.blob, np.uint8)
+                rows, spec = len(col), {"kind": "str", "offsets": "<i8"}
+            elif kind == "csr":
+                offsets = getattr(self, attr[0])
+                put(f"{table}.{column}.offsets", offsets, "<i8")
+                put(f"{table}.{column}.codes", getattr(self, attr[1]), dtype)
+                rows, spec = len(offsets) - 1, {"kind": "csr", "offsets": "<i8", "codes": dtype}
+            else:
+                values = getattr(self, attr)
+                put(f"{table}.{column}.bin", values, dtype)
+                rows, spec = len(values), {"kind": "fixed", "dtype": dtype}
+            entry = tables.setdefault(table, {"rows": rows, "columns": {}})
+            entry["columns"][column] = spec
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "byteorder": "little",
+            "tag_vocab": self.tag_vocab,
+            "platforms": self.platforms,
+            "coupons": self.coupons,
+            "tables": tables,
+        }
+        with open(os.path.join(snap_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+class _Builder:
+    """Appends rows one at a time into typed arrays; finish() turns them into CatalogColumns."""
+
+    def __init__(self):
+        self.rest_id = StringBuilder()
+        self.rest_name = StringBuilder()
+        self.rest_hood = StringBuilder()
+        self.rest_row = {}
+
+        self.item_id = StringBuilder()
+        self.item_name = StringBuilder()
+        self.item_row = {}
+        self.item_rest_id = []  # resolved to rows in finish(); restaurants may come later
+        self.tag_offsets = array("q", [0])
+        self.tag_codes = array("H")
+        self.calories = array("f")
+        self.protein = array("f")
+
+        self.price_item_id = []
+        self.price_platform = array("B")
+        self.price_base = array("d")
+        self.price_fee = array("d")
+
+        self.rating_item_id = []
+        self.rating_value = array("f")
+        self.rating_count = array("i")
+
+        self.tag_codes_map = {}
+        self.platform_codes = {}
+        self.coupons = []
+
+    def adder(self, table: str):
+        return getattr(self, f"add_{table}")
+
+    def add_restaurants(self, row: dict):
+        self.rest_row.setdefault(row["id"], len(self.rest_row))
+        self.rest_id.append(row["id"])
+        self.rest_name.append(row["name"])
+        self.rest_hood.append(row.get("neighborhood", ""))
+
+    def add_menu_items(self, row: dict):
+        self.item_row.setdefault(row["item_id"], len(self.item_row))
+        self.item_id.append(row["item_id"])
+        self.item_name.append(row["name"])
+        self.item_rest_id.append(row["restaurant_id"])
+        # Tags are de-duplicated once here instead of via set() on every request
+        for t in dict.fromkeys(row.get("tags", [])):
+            self.tag_codes.append(self.tag_codes_map.setdefault(t, len(self.tag_codes_map)))
+        self.tag_offsets.append(len(self.tag_codes))
+        self.calories.append(row.get("calories_est", 0))
+        self.protein.append(row.get("protein_est", 0))
+
+    def add_platform_prices(self, row: dict):
+        self.price_item_id.append(row["item_id"])
+        self.price_platform.append(self.platform_codes.setdefault(row["platform_name"], len(self.platform_codes)))
+        self.price_base.append(row["base_price"])
+        self.price_fee.append(row["delivery_fee"])
+
+    def add_social_ratings(self, row: dict):
+        self.rating_item_id.append(row["item_id"])
+        self.rating_value.append(row.get("rating", 0.0))
+        self.rating_count.append(row.get("review_count", 0))
+
+    def add_coupons(self, row: dict):
+        self.coupons.append(row)
+
+    def finish(self) -> CatalogColumns:
+        cols = CatalogColumns()
+        cols.restaurant_id = self.rest_id.finish()
+        cols.restaurant_name = self.rest_name.finish()
+        cols.restaurant_neighborhood = self.rest_hood.finish()
+        cols.restaurant_id._index = self.rest_row
+
+        cols.item_id = self.item_id.finish()
+        cols.item_id._index = self.item_row
+        cols.item_name = self.item_name.finish()
+        cols.item_restaurant_row = np.array([self.rest_row.get(r, -1) for r in self.item_rest_id], dtype=np.int32)
+        cols.item_tag_offsets = np.frombuffer(self.tag_offsets, dtype=np.int64)
+        cols.item_tag_codes = np.frombuffer(self.tag_codes, dtype=np.uint16)
+        cols.item_calories = np.frombuffer(self.calories, dtype=np.float32)
+        cols.item_protein = np.frombuffer(self.protein, dtype=np.float32)
+
+        cols.price_item_row = np.array([self.item_row.get(i, -1) for i in self.price_item_id], dtype=np.int32)
+        cols.price_platform = np.frombuffer(self.price_platform, dtype=np.uint8)
+        cols.price_base = np.frombuffer(self.price_base, dtype=np.float64)
+        cols.price_fee = np.frombuffer(self.price_fee, dtype=np.float64)
+
+        cols.rating_item_row = np.array([self.item_row.get(i, -1) for i in self.rating_item_id], dtype=np.int32)
+        cols.rating_value = np.frombuffer(self.rating_value, dtype=np.float32)
+        cols.rating_count = np.frombuffer(self.rating_count, dtype=np.int32)
+
+        cols.tag_vocab = list(self.tag_codes_map)
+        cols.platforms = list(self.platform_codes)
+        cols.coupons = self.coupons
+        return cols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog column tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build-snapshot", help="write a memory-mappable snapshot of a catalog")
+    build.add_argument("--src", default="data", help="directory with *.json, *.jsonl or a snapshot")
+    build.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    cols = CatalogColumns.load(args.src)
+    cols.write_snapshot(args.out)
+    print(f"Wrote snapshot of {cols.n_items} menu items ({cols.nbytes() / 1e6:.1f} MB) to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import re
+from functools import lru_cache
+
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "4096"))
+
+# Declarative tag table: tag -> phrases that switch it on. Matching is substring-based
+# (e.g. "veg" also fires inside "veggie"), and tags are reported in this table's order.
+TAG_SYNONYMS = {
+    "veg": ["veg", "vegan", "vegetarian", "plant based", "plant-based"],
+    "high_protein": ["protein"],
+    "no_egg": ["no egg", "eggless", "egg free", "egg-free", "without egg"],
+}
+
+_NUM = r"(\d+(?:\.\d{2})?)"
+_INT = r"(\d+)"
+
+# Bounds are listed before tags and budget so that, at the same position,
+# "under 600 calories" is read as a calorie cap rather than a $600 budget.
+_BOUND_PATTERNS = [
+    ("max_calories", rf"(?:under|below|less than|at most|max|<)\s*{_INT}\s*(?:kcals?|cals?|calories)\b"),
+    ("max_calories", rf"{_INT}\s*(?:kcals?|cals?|calories)\s*(?:or less|max)"),
+    ("min_protein", rf"(?:at least|over|more than|min(?:imum)?|>)\s*{_INT}\s*g(?:rams)?\s*(?:of\s+)?protein"),
+    ("min_protein", rf"protein\s*(?:over|above|of at least|at least|>)\s*{_INT}\s*g?"),
+    ("min_protein", rf"{_INT}\s*g(?:rams)?\s*(?:of\s+)?protein"),
+    # Budget e.g. "under 15" or "$15", then the fallback "15 bucks"
+    ("budget", rf"(?:under|<|\$)\s*{_NUM}"),
+    ("budget_fallback", rf"{_NUM}\s*(?:bucks|dollars)"),
+]
+# Characters a bound pattern can start with (digits, < > $, and the leading keywords above)
+_BOUND_LEADS = set("0123456789<>$") | set("ublamop")
+
+
+def _compile():
+    parts = []
+    group_kinds = {}
+    for i, (kind, pattern) in enumerate(_BOUND_PATTERNS):
+        name = f"b{i}"
+        group_kinds[name] = kind
+        # Each number is the single capture group inside its named alternative
+        parts.append(f"(?P<{name}>{pattern})")
+    phrase_tags = {}
+    for tag, phrases in TAG_SYNONYMS.items():
+        for phrase in phrases:
+            phrase_tags[phrase] = tag
+    # Longest phrase first so "vegan" wins over "veg" at the same position
+    phrases = sorted(phrase_tags, key=len, reverse=True)
+    parts.append("(?P<tag>" + "|".join(re.escape(p) for p in phrases) + ")")
+    # Cheap lookahead lets the scanner skip positions where no alternative can start
+    leads = "".join(sorted(_BOUND_LEADS | {p[0] for p in phrases}))
+    return re.compile(f"(?=[{re.escape(leads)}])(?:" + "|".join(parts) + ")"), group_kinds, phrase_tags
+
+
+CONSTRAINT_RE, _GROUP_KINDS, _PHRASE_TAGS = _compile()
+_TAG_ORDER = list(TAG_SYNONYMS)
+
+
+def normalize(message: str) -> str:
+    return " ".join(message.lower().split())
+
+
+def parse_constraints(message: str) -> dict:
+    """
+    Extracts dietary tags, budget, calorie cap and protein floor from a message.
+    One regex pass over the normalized text; results are memoized per normalized message.
+    """
+    tags, budget, max_calories, min_protein = _parse_normalized(normalize(message))
+    return {"tags": list(tags), "budget": budget, "max_calories": max_calories, "min_protein": min_protein}
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_normalized(text: str):
+    found = set()
+    first = {}
+    for m in CONSTRAINT_RE.finditer(text):
+        if m.lastgroup == "tag":
+            found.add(_PHRASE_TAGS[m.group("tag")])
+            continue
+        kind = _GROUP_KINDS[m.lastgroup]
+        if kind == "min_protein":
+            # The old parser tagged any mention of protein; keep that when a floor is given
+            found.add("high_protein")
+        if kind not in first:
+            # The number is the capture group right after the named alternative
+            first[kind] = float(m.group(m.re.groupindex[m.lastgroup] + 1))
+
+    tags = tuple(t for t in _TAG_ORDER if t in found)
+    budget = first.get("budget", first.get("budget_fallback"))
+    return tags, budget, first.get("max_calories"), first.get("min_protein")
+
+
+def cache_info():
+    return _parse_normalized.cache_info()
@@ -0,0 +1,412 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no worker slots, the log always uses EVENT_LOG_DIR itself
+    fcntl = None
+
+from services.api.persistence import EVENT_BATCH_SIZE, EVENT_FLUSH_INTERVAL, connect
+
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", os.path.join("services", "api", "events"))
+EVENT_SEGMENT_BYTES = int(os.getenv("EVENT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+EVENT_SEGMENT_SECONDS = float(os.getenv("EVENT_SEGMENT_SECONDS", "3600"))  # rotate at least hourly
+# Closed segments older than this are rolled into per-user totals and deleted
+EVENT_RETENTION_SECONDS = float(os.getenv("EVENT_RETENTION_SECONDS", str(7 * 24 * 3600)))
+EVENT_COMPACT_INTERVAL = float(os.getenv("EVENT_COMPACT_INTERVAL", "600"))  # seconds; 0 disables
+
+INDEX_SCHEMA = [
+    '''
+        CREATE TABLE IF NOT EXISTS segments (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            opened_at REAL,
+            closed_at REAL,
+            events INTEGER DEFAULT 0,
+            bytes INTEGER DEFAULT 0,
+            compacted_at REAL
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS event_index (
+            user_id TEXT,
+            ts REAL,
+            action TEXT,
+            item_id TEXT,
+            seq INTEGER,
+            offset INTEGER
+        )
+    ''',
+    "CREATE INDEX IF NOT EXISTS event_index_user_ts ON event_index (user_id, ts)",
+    "CREATE INDEX IF NOT EXISTS event_index_seq ON event_index (seq)",
+    '''
+        CREATE TABLE IF NOT EXISTS user_event_totals (
+            user_id TEXT,
+            action TEXT,
+            events INTEGER,
+            first_ts REAL,
+            last_ts REAL,
+            PRIMARY KEY (user_id, action)
+        )
+    ''',
+]
+
+SQL_OPEN_SEGMENT = "INSERT INTO segments (opened_at) VALUES (?)"
+SQL_UPDATE_SEGMENT = "UPDATE segments SET bytes = ?, events = ? WHERE seq = ?"
+SQL_CLOSE_SEGMENT = "UPDATE segments SET closed_at = ?, bytes = ?, events = ? WHERE seq = ?"
+SQL_OPEN_SEGMENTS = "SELECT seq, bytes, events FROM segments WHERE closed_at IS NULL ORDER BY seq"
+SQL_INSERT_INDEX = "INSERT INTO event_index (user_id, ts, action, item_id, seq, offset) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_COMPACTABLE = ("SELECT seq FROM segments WHERE closed_at IS NOT NULL AND closed_at <= ? "
+                   "AND compacted_at IS NULL ORDER BY seq")
+SQL_ROLL_UP = '''
+    INSERT INTO user_event_totals (user_id, action, events, first_ts, last_ts)
+    SELECT user_id, action, COUNT(*), MIN(ts), MAX(ts) FROM event_index WHERE seq = ? GROUP BY user_id, action
+    ON CONFLICT (user_id, action) DO UPDATE SET
+        events = events + excluded.events,
+        first_ts = MIN(first_ts, excluded.first_ts),
+        last_ts = MAX(last_ts, excluded.last_ts)
+'''
+SQL_DROP_INDEX = "DELETE FROM event_index WHERE seq = ?"
+SQL_MARK_COMPACTED = "UPDATE segments SET compacted_at = ? WHERE seq = ?"
+SQL_REPLAY = ("SELECT seq, offset FROM event_index WHERE user_id = ? AND ts >= ? AND ts < ? "
+              "ORDER BY ts, seq, offset LIMIT ?")
+SQL_LIVE_TOTALS = ("SELECT action, COUNT(*), MIN(ts), MAX(ts) FROM event_index WHERE user_id = ? "
+                   "GROUP BY action")
+SQL_ROLLED_TOTALS = "SELECT action, events, first_ts, last_ts FROM user_event_totals WHERE user_id = ?"
+
+
+class _Segment:
+    __slots__ = ("seq", "file", "opened_at", "bytes", "events")
+
+    def __init__(self, seq: int, file, opened_at: float):
+        self.seq = seq
+        self.file = file
+        self.opened_at = opened_at
+        self.bytes = 0
+        self.events = 0
+
+
+def claim_worker_directory(base: str = EVENT_LOG_DIR):
+    """
+    (directory, lock file) for one worker of a multi-worker server: the lowest worker-<n>
+    slot under base not held by a live process. The slot stays held, through an exclusive
+    flock on its LOCK file, until the returned file is closed or the process exits, so a
+    restarted worker takes over (and recovers) the slot its predecessor left.
+    """
+    n = 0
+    while True:
+        directory = os.path.join(base, f"worker-{n}")
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, "LOCK"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return directory, lock
+        except BlockingIOError:
+            lock.close()
+            n += 1
+
+
+class EventIndexReader:
+    """Read side of one event log directory: replay and per-user totals from its index.db."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._reader = connect(os.path.join(directory, "index.db"))
+        self._read_lock = threading.Lock()
+
+    def close(self):
+        self._reader.close()
+
+    def replay(self, user_id: str, since: float = 0.0, until: Optional[float] = None,
+               limit: int = 1000) -> List[dict]:
+        """The user's events in [since, until) still held in segments, oldest first."""
+        with self._read_lock:
+            rows = self._reader.execute(
+                SQL_REPLAY, (user_id, since, until if until is not None else float("inf"), limit)).fetchall()
+        events = []
+        handles = {}
+        try:
+            for seq, offset in rows:
+                f = handles.get(seq)
+                if f is None:
+                    try:
+                        f = handles[seq] = open(self._path(seq), "rb")
+                    except FileNotFoundError:
+                        # Compacted since the index was read
+                        continue
+                f.seek(offset)
+                events.append(json.loads(f.readline()))
+        finally:
+            for f in handles.values():
+                f.close()
+        return events
+
+    def user_totals(self, user_id: str, into: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+        """
+        Per-action {events, first_ts, last_ts} over the user's whole history (compacted and live),
+        added to `into` when given (to combine several logs).
+        """
+        with self._read_lock:
+            # One read transaction, so a compaction in between cannot count a segment twice
+            with self._reader:
+                self._reader.execute("BEGIN")
+                rolled = self._reader.execute(SQL_ROLLED_TOTALS, (user_id,)).fetchall()
+                live = self._reader.execute(SQL_LIVE_TOTALS, (user_id,)).fetchall()
+        return _merge_totals({} if into is None else into, rolled + live)
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"events-{seq:08d}.jsonl")
+
+
+def _merge_totals(totals: Dict[str, dict], rows) -> Dict[str, dict]:
+    """Fold (action, events, first_ts, last_ts) rows into totals and return it."""
+    for action, events, first_ts, last_ts in rows:
+        t = totals.get(action)
+        if t is None:
+            totals[action] = {"events": events, "first_ts": first_ts, "last_ts": last_ts}
+        else:
+            t["events"] += events
+            t["first_ts"] = min(t["first_ts"], first_ts)
+            t["last_ts"] = max(t["last_ts"], last_ts)
+    return totals
+
+
+class EventLog(EventIndexReader):
+    """
+    Append-only log of user events (messages, feedback). Request handlers enqueue and return;
+    a background thread appends each batch to the current JSON Lines segment with one write
+    and indexes it by (user_id, timestamp) in a sidecar SQLite DB (index.db), which is what
+    replay and per-user totals query. Segments rotate by size and age. Closed segments past
+    the retention window are compacted: their index rows are rolled into user_event_totals
+    and the segment file is deleted, so storage stays bounded while totals stay exact.
+    On startup, lines appended after the last index commit (a crash) are re-indexed.
+    A log has a single writer process: multi-worker servers give each worker its own
+    directory (for_worker) and read the others' through siblings().
+    """
+
+    def __init__(self, directory: str = EVENT_LOG_DIR, segment_bytes: int = EVENT_SEGMENT_BYTES,
+                 segment_seconds: float = EVENT_SEGMENT_SECONDS, retention: float = EVENT_RETENTION_SECONDS,
+                 compact_interval: float = EVENT_COMPACT_INTERVAL, batch_size: int = EVENT_BATCH_SIZE,
+                 flush_interval: float = EVENT_FLUSH_INTERVAL):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.compact_interval = compact_interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self.compacted_segments = 0
+
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, "index.db")
+        # One connection for the writer thread (and compaction), one for readers
+        self._conn = connect(index_path)
+        for stmt in INDEX_SCHEMA:
+            self._conn.execute(stmt)
+        self._conn.commit()
+        super().__init__(directory)
+        self._write_lock = threading.Lock()
+        self._slot_lock = None
+        self._segment: Optional[_Segment] = None
+        self._recover()
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_worker(cls, base: str = EVENT_LOG_DIR, **kwargs) -> "EventLog":
+        """The log of one worker of a multi-worker server, in a slot under base it holds exclusively."""
+        if fcntl is None:
+            return cls(base, **kwargs)
+        directory, lock = claim_worker_directory(base)
+        log = cls(directory, **kwargs)
+        log._slot_lock = lock
+        return log
+
+    def siblings(self) -> List[EventIndexReader]:
+        """
+        Readers for the other worker slots beside this log (and a single-process log in their
+        parent directory, if one exists); the caller closes them.
+        """
+        if self._slot_lock is None:
+            return []
+        base = os.path.dirname(self.directory)
+        dirs = [base] + [os.path.join(base, n) for n in sorted(os.listdir(base)) if n.startswith("worker-")]
+        return [EventIndexReader(d) for d in dirs
+                if d != self.directory and os.path.exists(os.path.join(d, "index.db"))]
+
+    def log_event(self, user_id: str, action: str, item_id: Optional[str] = None, details: Optional[str] = None):
+        self._queue.put((time.time(), user_id, action, item_id, details))
+
+    def append(self, events):
+        """
+        Write already-timestamped (ts, user_id, action, item_id, details) events, such as
+        imported ones, and wait for them; raises OSError if any could not be written.
+        """
+        failed = self.failed
+        for ts, user_id, action, item_id, details in events:
+            self._queue.put((ts, user_id, action, item_id, details))
+        self.flush()
+        if self.failed > failed:
+            raise OSError(f"Event log could not write {self.failed - failed} events")
+
+    def flush(self):
+        """Block until everything queued so far has been written and indexed."""
+        self._queue.join()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+        with self._write_lock:
+            self._rotate()
+        self._conn.close()
+        super().close()
+        if self._slot_lock is not None:
+            self._slot_lock.close()
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Roll closed segments past retention into user_event_totals; returns how many."""
+        now = time.time() if now is None else now
+        with self._write_lock:
+            seqs = [seq for (seq,) in self._conn.execute(SQL_COMPACTABLE, (now - self.retention,))]
+            for seq in seqs:
+                with self._conn:
+                    self._conn.execute(SQL_ROLL_UP, (seq,))
+                    self._conn.execute(SQL_DROP_INDEX, (seq,))
+                    self._conn.execute(SQL_MARK_COMPACTED, (now, seq))
+                try:
+                    os.remove(self._path(seq))
+                except FileNotFoundError:
+                    pass
+                self.compacted_segments += 1
+        return len(seqs)
+
+    def stats(self) -> dict:
+        segment = self._segment
+        return {"pending": self._queue.qsize(), "written": self.written, "failed": self.failed,
+                "segment": segment.seq if segment is not None else 0,
+                "compacted_segments": self.compacted_segments}
+
+    def _run(self):
+        next_compact = time.monotonic() + self.compact_interval
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                first = None
+            if first is not None:
+                self._write([first] + self._take(self.batch_size - 1))
+            with self._write_lock:
+                segment = self._segment
+                if segment is not None and time.time() - segment.opened_at >= self.segment_seconds:
+                    self._rotate()
+            if self.compact_interval > 0 and time.monotonic() >= next_compact:
+                next_compact = time.monotonic() + self.compact_interval
+                try:
+                    self.compact()
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Event log compaction failed: {e}")
+
+    def _take(self, limit: int):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            with self._write_lock:
+                segment = self._segment
+                if segment is None:
+                    segment = self._open_segment()
+                lines = []
+                index = []
+                offset = segment.bytes
+                for ts, user_id, action, item_id, details in batch:
+                    line = json.dumps({"ts": ts, "user_id": user_id, "action": action, "item_id": item_id,
+                                       "details": details}, separators=(",", ":")).encode() + b"\n"
+                    index.append((user_id, ts, action, item_id, segment.seq, offset))
+                    lines.append(line)
+                    offset += len(line)
+                # Data first, index second: a crash in between leaves lines that _recover re-indexes
+                segment.file.write(b"".join(lines))
+                segment.file.flush()
+                segment.bytes = offset
+                segment.events += len(batch)
+                with self._conn:
+                    self._conn.executemany(SQL_INSERT_INDEX, index)
+                    self._conn.execute(SQL_UPDATE_SEGMENT, (segment.bytes, segment.events, segment.seq))
+                if segment.bytes >= self.segment_bytes:
+                    self._rotate()
+            self.written += len(batch)
+        except (OSError, sqlite3.Error) as e:
+            self.failed += len(batch)
+            print(f"Event log write failed for {len(batch)} events: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _open_segment(self) -> _Segment:
+        # Caller holds _write_lock
+        now = time.time()
+        with self._conn:
+            seq = self._conn.execute(SQL_OPEN_SEGMENT, (now,)).lastrowid
+        self._segment = _Segment(seq, open(self._path(seq), "ab"), now)
+        return self._segment
+
+    def _rotate(self):
+        # Caller holds _write_lock; the next write opens a fresh segment
+        segment, self._segment = self._segment, None
+        if segment is None:
+            return
+        segment.file.close()
+        with self._conn:
+            self._conn.execute(SQL_CLOSE_SEGMENT, (time.time(), segment.bytes, segment.events, segment.seq))
+
+    def _recover(self):
+        """Index lines past each open segment's recorded size, drop a torn last line, close it."""
+        for seq, indexed_bytes, events in self._conn.execute(SQL_OPEN_SEGMENTS).fetchall():
+            index = []
+            size = indexed_bytes
+            try:
+                with open(self._path(seq), "rb+") as f:
+                    f.seek(indexed_bytes)
+                    tail = f.read()
+                    end = tail.rfind(b"\n") + 1
+                    if end < len(tail):
+                        f.truncate(indexed_bytes + end)
+                    offset = indexed_bytes
+                    for line in tail[:end].splitlines(keepends=True):
+                        try:
+                            e = json.loads(line)
+                            index.append((e["user_id"], e["ts"], e["action"], e.get("item_id"), seq, offset))
+                        except (ValueError, KeyError, TypeError):
+                            pass
+                        offset += len(line)
+                    size = offset
+            except FileNotFoundError:
+                size = 0
+            with self._conn:
+                self._conn.executemany(SQL_INSERT_INDEX, index)
+                self._conn.execute(SQL_CLOSE_SEGMENT, (time.time(), size, events + len(index), seq))
+            if index:
+                print(f"Event log segment {seq}: re-indexed {len(index)} events written before a crash.")
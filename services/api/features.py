@@ -0,0 +1,91 @@
+import copy
+import os
+from typing import Dict
+
+import numpy as np
+
+from services.api.pricing import NO_PRICE
+
+# Score = sum(weight * feature) + user tag weights; "price" is the effective price
+DEFAULT_SCORE_WEIGHTS = {
+    "price": -1.0,
+    "protein": 0.1,  # per gram of protein_est
+    "rating": 1.0,  # per star of Bayesian-average rating above the catalog mean
+    "protein_density": 0.0,  # per gram of protein per 100 kcal
+}
+RATING_PRIOR_COUNT = float(os.getenv("RATING_PRIOR_COUNT", "50"))  # pseudo-reviews at the catalog mean
+
+
+def parse_score_weights(spec: str) -> Dict[str, float]:
+    """DEFAULT_SCORE_WEIGHTS overridden by a "name=value,..." spec, e.g. "rating=0.5,price=-1.2"."""
+    weights = dict(DEFAULT_SCORE_WEIGHTS)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, sep, value = part.partition("=")
+        name = name.strip()
+        if not sep or name not in weights:
+            raise ValueError(f"bad score weight {part!r}; expected name=value with name in {sorted(weights)}")
+        weights[name] = float(value)
+    return weights
+
+
+SCORE_WEIGHTS = parse_score_weights(os.getenv("SCORE_WEIGHTS", ""))
+
+
+def bayesian_rating(cols, prior_count: float = RATING_PRIOR_COUNT) -> np.ndarray:
+    """
+    Per-item Bayesian-average rating minus the catalog mean: items with few reviews are
+    pulled towards the review-weighted mean, and unrated items score 0.
+    """
+    n = cols.n_items
+    rated = cols.rating_item_row >= 0
+    item_rows = cols.rating_item_row[rated]
+    counts = cols.rating_count[rated].astype(np.float64)
+    # An item may have several rating rows (one per source); pool their reviews
+    stars = np.bincount(item_rows, weights=cols.rating_value[rated] * counts, minlength=n)
+    reviews = np.bincount(item_rows, weights=counts, minlength=n)
+    total = reviews.sum()
+    if total == 0:
+        return np.zeros(n, dtype=np.float64)
+    mean = stars.sum() / total
+    return (prior_count * mean + stars) / (prior_count + reviews) - mean
+
+
+class FeatureTable:
+    """
+    Ranking features for one catalog snapshot, one float64 column per feature aligned with
+    catalog rows. Static features are computed once at load; with_prices() adds the effective
+    price of a price snapshot and folds every weighted feature into one `base` column, so a
+    request pays a single gather however many features are configured.
+    """
+
+    def __init__(self, catalog, weights: Dict[str, float] = None):
+        cols = catalog.columns
+        self.weights = dict(SCORE_WEIGHTS if weights is None else weights)
+        protein = cols.item_protein.astype(np.float64)
+        calories = cols.item_calories.astype(np.float64)
+        density = np.zeros(cols.n_items, dtype=np.float64)
+        np.divide(protein * 100.0, calories, out=density, where=calories > 0)
+        self.columns: Dict[str, np.ndarray] = {
+            "protein": protein,
+            "rating": bayesian_rating(cols),
+            "protein_density": density,
+        }
+        self.eff_price = np.full(cols.n_items, NO_PRICE, dtype=np.float64)
+        self._refresh()
+
+    def with_prices(self, eff_price: np.ndarray) -> "FeatureTable":
+        """Copy sharing the static columns, with base recomputed for these effective prices."""
+        table = copy.copy(self)
+        table.eff_price = eff_price
+        table.base = table._static + table.weights.get("price", 0.0) * eff_price
+        return table
+
+    def _refresh(self):
+        static = np.zeros(len(self.eff_price), dtype=np.float64)
+        for name, column in self.columns.items():
+            w = self.weights.get(name, 0.0)
+            if w:
+                static += w * column
+        self._static = static
+        # Unpriced rows are filtered out before scoring, so their base value never matters
+        self.base = static + self.weights.get("price", 0.0) * self.eff_price
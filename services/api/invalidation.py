@@ -0,0 +1,146 @@
+import json
+import os
+import queue
+import socket
+import threading
+import uuid
+from typing import Callable, Dict, List
+
+# Directory holding one socket per worker; gunicorn.conf.py sets it for multi-worker runs.
+# Empty means a single process, and nothing is published.
+BUS_DIR = os.getenv("FOODPO_BUS_DIR", "")
+BUS_SEND_TIMEOUT = 1.0  # seconds per peer before a send is counted as failed
+
+
+class InvalidationBus:
+    """
+    Fan-out of cache invalidations between the worker processes of one server.
+    Each worker listens on <directory>/worker-<pid>.sock (a Unix stream socket); publish()
+    queues a message that a sender thread delivers to every other socket in the directory,
+    and the receiver's listener thread passes it to the handlers subscribed to its topic.
+    Messages from one worker arrive in the order they were published; there is no order
+    across workers. Sockets left by workers that died refuse connections and are removed
+    by the next sender, so the directory only ever lists live workers.
+    """
+
+    def __init__(self, directory: str = BUS_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, f"worker-{os.getpid()}.sock")
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = {}
+        self._outbox = queue.Queue()
+        self._server = None
+        self._threads = []
+        self._stopping = False
+        self.published = 0
+        self.delivered = 0
+        self.received = 0
+        self.failed = 0
+
+    def subscribe(self, topic: str, handler: Callable[[dict], None]):
+        """Call handler(data) for every message on topic from another worker."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Listen under a temporary name first: a peer that found the socket before listen()
+        # would be refused and take it for a dead worker's
+        temp = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        server.bind(temp)
+        server.listen(64)
+        os.replace(temp, self.path)
+        self._server = server
+        self._threads = [
+            threading.Thread(target=self._listen, name="bus-listener", daemon=True),
+            threading.Thread(target=self._send, name="bus-sender", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def publish(self, topic: str, **data):
+        """Queue data for every other worker; returns without waiting for delivery."""
+        if self._server is not None:
+            self._outbox.put(json.dumps({"topic": topic, "data": data}).encode("utf-8"))
+
+    def close(self):
+        if self._server is None:
+            return
+        self._stopping = True
+        self._outbox.put(None)
+        # accept() does not wake up when the socket is closed from another thread; connect instead
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(self.path)
+        except OSError:
+            pass
+        for t in self._threads:
+            t.join(timeout=5.0)
+        self._server.close()
+        self._server = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {"published": self.published, "delivered": self.delivered, "received": self.received,
+                "failed": self.failed, "pending": self._outbox.qsize()}
+
+    def _peers(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, n) for n in names
+                if n.endswith(".sock") and os.path.join(self.directory, n) != self.path]
+
+    def _send(self):
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            self.published += 1
+            for path in self._peers():
+                try:
+                    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                        s.settimeout(BUS_SEND_TIMEOUT)
+                        s.connect(path)
+                        s.sendall(message)
+                    self.delivered += 1
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Nobody listens there any more
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                except OSError as e:
+                    self.failed += 1
+                    print(f"Invalidation to {os.path.basename(path)} failed: {e}")
+
+    def _listen(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            if self._stopping:
+                conn.close()
+                return
+            try:
+                with conn:
+                    conn.settimeout(BUS_SEND_TIMEOUT)
+                    chunks = []
+                    while chunk := conn.recv(65536):
+                        chunks.append(chunk)
+                message = json.loads(b"".join(chunks))
+                topic, data = message["topic"], message["data"]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.failed += 1
+                print(f"Invalidation message dropped: {e!r}")
+                continue
+            self.received += 1
+            for handler in self._handlers.get(topic, []):
+                try:
+                    handler(data)
+                except Exception as e:
+                    print(f"Invalidation handler for {topic!r} failed: {e!r}")
@@ -1,13 +1,41 @@
+import asyncio
+import gc
 import json
 import os
-import re
-import sqlite3
+import sys
+import threading
+import time
 import urllib.parse
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from services.api import metrics
+from services.api.airia_wrapper import run_pipeline, close_client
+from services.api.cart import CART_TIME_BUDGET, CartOptimizer
+from services.api.catalog import Catalog
+from services.api.coach_jobs import CoachJobQueue, QueueFull
+from services.api.constraints import cache_info as parse_cache_info, parse_constraints
+from services.api.event_log import EventLog
+from services.api.invalidation import BUS_DIR, InvalidationBus
+from services.api.metrics import StageTimer
+from services.api.modulate_wrapper import (
+    VoiceStreamError, audio_cache, close_async_client, cache_stats, has_voice_stream, open_voice_stream,
+    prepare_voice_stream
+)
+from services.api.persistence import Database
+from services.api.preferences import UserPreferences
+from services.api.price_updates import DeltaWatcher
+from services.api.pricing import PriceIndex
+from services.api.profiler import SamplingProfiler
+from services.api.rank_cache import ANONYMOUS, RankCache
+from services.api.scoring import ScoringEngine
+from services.api.sharding import SCORING_WORKERS, SHARD_MIN_ITEMS, ShardedScorer
+from services.api.weight_cache import UserWeightCache
 
 app = FastAPI()
 
@@ -19,63 +47,211 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global data stores
-data = {
-    "restaurants": [],
-    "menu_items": [],
-    "platform_prices": [],
-    "coupons": [],
-    "social_ratings": []
-}
+# Global catalog store (restaurants, menu items, prices, coupons, ratings), rebuilt in load_data
+catalog = Catalog()
+
+# Best-price index over the catalog's price columns and coupons, rebuilt in load_data
+price_index = PriceIndex()
+# Columnar scoring view of the catalog's menu items, rebuilt in load_data
+scoring_engine = ScoringEngine()
+
+DB_PATH = os.getenv("FOODPO_DB_PATH", "services/api/database.db")
+CATALOG_DIR = os.getenv("CATALOG_DIR", "data")
+# Shared secret for /admin/* (sent as X-Admin-Token); admin endpoints are off when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Pooled SQLite store with write-behind events, opened in load_data
+db: Optional[Database] = None
+
+# In-process LRU/TTL cache of user_weights in front of db, created with it
+weight_cache: Optional[UserWeightCache] = None
+
+# Append-only JSON Lines event log with its (user_id, ts) index, opened with db
+event_log: Optional[EventLog] = None
 
-DB_PATH = "services/api/database.db"
+# Cache invalidations shared with the other workers of a multi-worker server (FOODPO_BUS_DIR)
+bus: Optional[InvalidationBus] = None
 
 def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            action TEXT,
-            item_id TEXT,
-            details TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS user_profiles (
-            user_id TEXT PRIMARY KEY,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS user_weights (
-            user_id TEXT,
-            tag TEXT,
-            weight REAL,
-            PRIMARY KEY (user_id, tag)
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    global db, weight_cache, event_log
+    if db is None:
+        db = Database(DB_PATH)
+        weight_cache = UserWeightCache(db)
+        # A log has one writer, so each worker of a multi-worker server gets its own slot
+        event_log = EventLog.for_worker() if BUS_DIR else EventLog()
+        # Databases from before the EventLog still hold their events in a table
+        db.import_old_events(event_log.append)
+
+def publish(topic: str, **data):
+    """Tell the other workers (if any) that something they may have cached has changed."""
+    if bus is not None:
+        bus.publish(topic, **data)
+
+def _peer_audio_change(data: dict):
+    if data["event"] == "commit":
+        audio_cache.adopt(data["key"], data["size"])
+    else:
+        audio_cache.forget(data["key"])
+
+def start_bus():
+    global bus
+    if not BUS_DIR or bus is not None:
+        return
+    bus = InvalidationBus(BUS_DIR)
+    bus.subscribe("weights", lambda d: weight_cache.invalidate(d["user_id"]))
+    bus.subscribe("prices", lambda d: apply_price_batch(d["batch"], share=False))
+    bus.subscribe("tts", _peer_audio_change)
+    bus.subscribe("tts.stream", lambda d: prepare_voice_stream(d["text"], d["style"]))
+    bus.subscribe("events.compact", lambda d: event_log.compact())
+    audio_cache.on_change = lambda event, key, size: publish("tts", event=event, key=key, size=size)
+    bus.start()
+
+def resident_memory_mb() -> float:
+    """Current RSS of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+# Set by preload_catalog when a prefork server loaded the catalog before starting workers
+_preloaded = False
+
+def preload_catalog():
+    """
+    Load the catalog, price index and scoring engine in the server's master process, before it
+    forks workers (gunicorn.conf.py). Workers then share those pages copy-on-write instead of
+    each building their own copy; load_data only opens the per-worker resources.
+    """
+    global _preloaded
+    _load_catalog()
+    # Build the lazy id indexes now so they are shared too
+    catalog.columns.item_id.index()
+    catalog.columns.restaurant_id.index()
+    # Keep the cyclic GC from touching (and so copying) every preloaded object in each worker
+    gc.freeze()
+    _preloaded = True
+
+def _load_catalog():
+    # A snapshot directory (manifest.json), *.jsonl files, or the demo *.json files
+    start = time.perf_counter()
+    rss_before = resident_memory_mb()
+    global catalog, price_index, scoring_engine
+    catalog = Catalog.load(CATALOG_DIR)
+    price_index = PriceIndex(catalog)
+    scoring_engine = ScoringEngine(catalog, price_index)
+    # The new index counts price versions from 0 again, so older rankings could match its keys
+    rank_cache.clear()
+    elapsed = time.perf_counter() - start
+    rss = resident_memory_mb()
+    print(f"Loaded {len(catalog)} menu items from {CATALOG_DIR} ({catalog.columns.source}) in {elapsed:.2f}s; "
+          f"columns {catalog.columns.nbytes() / 1e6:.1f} MB, RSS {rss:.1f} MB (+{rss - rss_before:.1f} MB).")
 
 @app.on_event("startup")
 def load_data():
-    base_dir = "data"
-    files = ["restaurants", "menu_items", "platform_prices", "coupons", "social_ratings"]
-    for fname in files:
-        path = os.path.join(base_dir, f"{fname}.json")
-        if os.path.exists(path):
-            with open(path, "r") as f:
-                data[fname] = json.load(f)
-    print(f"Loaded {len(data['menu_items'])} menu items.")
+    if not _preloaded:
+        _load_catalog()
+    if SCORING_WORKERS > 0 and len(scoring_engine) >= SHARD_MIN_ITEMS:
+        # Price reloads copy the engine with with_prices, which keeps sharing this scorer
+        scoring_engine.sharded = ShardedScorer(scoring_engine, SCORING_WORKERS)
+        print(f"Sharded scoring over {SCORING_WORKERS} worker processes.")
     init_db()
+    # Listen before replaying, so a batch applied meanwhile by another worker is not missed
+    start_bus()
+    replay_price_batches()
+
+@app.on_event("shutdown")
+def close_db():
+    global db, event_log, bus
+    if bus is not None:
+        bus.close()
+        bus = None
+    if db is not None:
+        db.close()
+        db = None
+    if event_log is not None:
+        event_log.close()
+        event_log = None
+
+# Background coach text/audio jobs for staged /message responses
+coach_queue = CoachJobQueue()
+SSE_HEARTBEAT = 15.0  # seconds between keep-alive comments on idle event streams
+SSE_POLL_INTERVAL = 1.0  # how often an open event stream checks for client disconnect
+
+# Applies delta files dropped into PRICE_DELTA_DIR (data/deltas by default)
+delta_watcher = DeltaWatcher(lambda batch: apply_price_batch(batch))
+
+@app.on_event("startup")
+async def start_coach_queue():
+    coach_queue.start()
+    delta_watcher.start()
+
+@app.on_event("shutdown")
+async def close_upstreams():
+    profiler.stop()
+    await delta_watcher.stop()
+    await coach_queue.stop()
+    await close_client()
+    await close_async_client()
+    if scoring_engine.sharded is not None:
+        scoring_engine.sharded.close()
 
 class MessageRequest(BaseModel):
     user_id: str
     message: str
+    # Return the ranking right away and produce coach text/audio as a background job
+    staged: bool = False
+
+class BatchMessageItem(BaseModel):
+    user_id: str
+    message: str
+
+class BatchMessageRequest(BaseModel):
+    requests: List[BatchMessageItem]
+    k: int = 3
+    # Coach text/audio per pair is opt-in: it costs one Airia call (and maybe a TTS clip) each
+    include_coach: bool = False
+
+# Largest accepted /message/batch payload
+MESSAGE_BATCH_MAX = int(os.getenv("MESSAGE_BATCH_MAX", "1000"))
+
+class CartLine(BaseModel):
+    item_id: str
+    quantity: int = 1
+
+class CartRequest(BaseModel):
+    items: List[CartLine]
+    # Search budget; the best plan found so far is returned when it runs out
+    time_budget_ms: Optional[float] = None
+
+# Largest accepted cart, counted in units (sum of quantities)
+CART_MAX_UNITS = int(os.getenv("CART_MAX_UNITS", "200"))
+
+class PriceRow(BaseModel):
+    item_id: str
+    platform_name: str
+    base_price: float
+    delivery_fee: float
+
+class PriceKey(BaseModel):
+    item_id: str
+    platform_name: str
+
+class CouponRow(BaseModel):
+    code: str
+    platform: str
+    discount_value: float
+    min_spend: float
+
+class PriceBatch(BaseModel):
+    # Removals are applied before upserts
+    prices: List[PriceRow] = []
+    remove_prices: List[PriceKey] = []
+    coupons: List[CouponRow] = []
+    remove_coupons: List[str] = []
 
 class FeedbackRequest(BaseModel):
     user_id: str
@@ -83,250 +259,486 @@ class FeedbackRequest(BaseModel):
     not_chosen_item_ids: List[str]
     rating: int
 
-def get_all_user_weights(user_id: str) -> dict:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT tag, weight FROM user_weights WHERE user_id = ?", (user_id,))
-    rows = c.fetchall()
-    conn.close()
-    return {row[0]: row[1] for row in rows}
-
-def set_user_weight(user_id: str, tag: str, weight: float):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO user_weights (user_id, tag, weight) VALUES (?, ?, ?)", (user_id, tag, weight))
-    conn.commit()
-    conn.close()
-
-def parse_constraints(message: str):
-    msg_lower = message.lower()
-    constraints = {"tags": [], "budget": None}
-    
-    if "veg" in msg_lower or "vegan" in msg_lower:
-        constraints["tags"].append("veg")
-    if "protein" in msg_lower:
-        constraints["tags"].append("high_protein")
-    if "no egg" in msg_lower or "eggless" in msg_lower:
-        constraints["tags"].append("no_egg")
-        
-    # Extract budget e.g., "under 15" or "$15"
-    budget_match = re.search(r'(?:under|<|\$)\s*(\d+(?:\.\d{2})?)', msg_lower)
-    if budget_match:
-        constraints["budget"] = float(budget_match.group(1))
-    else:
-        # Fallback parsing like "15 bucks"
-        bucks_match = re.search(r'(\d+(?:\.\d{2})?)\s*(?:bucks|dollars)', msg_lower)
-        if bucks_match:
-            constraints["budget"] = float(bucks_match.group(1))
-            
-    return constraints
+def get_all_user_weights(user_id: str) -> UserPreferences:
+    # Served from the weight cache; only misses and expired entries reach SQLite
+    return weight_cache.get(user_id)
+
+def update_user_weights(user_id: str, deltas: dict):
+    # Decays, applies and clips the whole vector, written back as one blob, then refreshes the cache
+    weight_cache.update(user_id, deltas)
+    publish("weights", user_id=user_id)
+
+# Finished /message rankings keyed by constraints + weight/price versions
+rank_cache = RankCache()
+
+# Serializes price reloads; readers never take it
+_reload_lock = threading.Lock()
+
+def apply_price_batch(batch: dict, share: bool = True) -> dict:
+    """
+    Applies a delta batch of price/coupon changes to a copy of the price index and
+    scoring engine, then swaps them in. In-flight requests keep the snapshot they started with.
+    With share, the batch is also sent to the other workers, which apply it with share=False.
+    """
+    global price_index, scoring_engine
+    with _reload_lock:
+        new_index = price_index.updated(batch)
+        new_engine = scoring_engine.with_prices(new_index)
+        scoring_engine = new_engine
+        price_index = new_index
+    if share:
+        publish("prices", batch=batch)
+    return {
+        "version": new_index.version,
+        "prices": len(batch.get("prices", [])) + len(batch.get("remove_prices", [])),
+        "coupons": len(batch.get("coupons", [])) + len(batch.get("remove_coupons", [])),
+    }
+
+def replay_price_batches() -> int:
+    """
+    Re-apply the batches saved in PRICE_DELTA_DIR (delta files and admin batches) to the
+    freshly loaded prices, in the order they were applied. Every process replays them itself
+    after loading (or after the fork, with a preloaded catalog), so a worker started later
+    serves the same prices as its peers; nothing is shared. Returns the number replayed.
+    """
+    global price_index, scoring_engine
+    # A long history is merged first (whichever worker gets there); the result is the same
+    delta_watcher.compact()
+    with _reload_lock:
+        new_index, replayed = None, 0
+        for batch in delta_watcher.applied_batches():
+            # One copy of the index for the whole replay; it is private until swapped in
+            if new_index is None:
+                new_index = price_index.updated(batch)
+            else:
+                new_index.apply_batch(batch)
+            replayed += 1
+        if new_index is not None:
+            scoring_engine = scoring_engine.with_prices(new_index)
+            price_index = new_index
+    if replayed:
+        print(f"Replayed {replayed} price batches from {delta_watcher.directory}.")
+    return replayed
+
+def check_admin(token: str):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
 
 def calculate_best_price(item_id: str):
-    # Get all prices for item
-    prices = [p for p in data["platform_prices"] if p["item_id"] == item_id]
-    best_eff_price = 9999.0
-    best_platform = None
-    
-    for p in prices:
-        base = p["base_price"]
-        fee = p["delivery_fee"]
-        platform = p["platform_name"]
-        
-        # Apply best coupon for this platform
-        applicable_coupons = [c for c in data["coupons"] if c["platform"] == platform and base >= c["min_spend"]]
-        discount = 0.0
-        for c in applicable_coupons:
-            val = c["discount_value"]
-            # Treat values < 1.0 as percentages
-            cand_discount = base * val if val < 1.0 else val
-            if cand_discount > discount:
-                discount = cand_discount
-                
-        eff = base - discount + fee
-        if eff < best_eff_price:
-            best_eff_price = eff
-            best_platform = {
-                "platform": platform,
-                "base_price": base,
-                "delivery_fee": fee,
-                "discount": discount,
-                "effective_price": eff
-            }
-            
-    return best_eff_price, best_platform
+    # Served from the precomputed index instead of scanning prices and coupons per call
+    return price_index.best_price(item_id)
 
-@app.post("/message")
-def handle_message(req: MessageRequest):
+def rank_message(req: MessageRequest, use_cache: bool = True):
+    """Parses the message, logs it and returns (top_3, user_weights_map, rank cache status)."""
+    # One read of the global: a price reload swapping in a new engine mid-request is not seen
+    engine = scoring_engine
+    timer = StageTimer("message")
     constraints = parse_constraints(req.message)
     budget = constraints["budget"]
     required_tags = set(constraints["tags"])
+    timer.lap("parse")
     
-    # Track profile/event
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO user_profiles (user_id) VALUES (?)", (req.user_id,))
-    c.execute("INSERT INTO events (user_id, action, details) VALUES (?, ?, ?)", 
-              (req.user_id, "message", req.message))
-    conn.commit()
-    conn.close()
+    # Track profile/event (queued; flushed in batches off the request path)
+    db.events.ensure_profile(req.user_id)
+    event_log.log_event(req.user_id, "message", details=req.message)
+    timer.lap("profile_insert")
     
-    user_weights_map = get_all_user_weights(req.user_id)
-    scored_items = []
+    user_weights_map, weights_version = weight_cache.get_versioned(req.user_id)
+    timer.lap("weights")
     
-    for item in data["menu_items"]:
-        item_tags = set(item.get("tags", []))
-        if required_tags and not required_tags.issubset(item_tags):
-            continue
-            
-        eff_price, platform_info = calculate_best_price(item["item_id"])
-        
-        # Budget constraint
-        if budget and eff_price > budget:
-            continue
-            
-        if eff_price == 9999.0:
-            continue
-            
-        tag_weight_sum = sum(user_weights_map.get(t, 0.0) for t in item_tags)
-        
-        # score = -effective_price + (protein_est / 10) + user_pref_weights(tags)
-        protein = item.get("protein_est", 0)
-        score = -eff_price + (protein / 10.0) + tag_weight_sum
-        
-        restaurant = next((r for r in data["restaurants"] if r["id"] == item["restaurant_id"]), None)
-        rest_name = restaurant["name"] if restaurant else "Unknown"
-        
-        scored_items.append({
-            "item_id": item["item_id"],
-            "name": item["name"],
-            "restaurant": rest_name,
-            "tags": list(item_tags),
-            "protein_est": protein,
-            "best_platform": platform_info,
-            "score": score
-        })
-        
-    scored_items.sort(key=lambda x: x["score"], reverse=True)
-    top_3 = scored_items[:3]
+    # Users whose weights touch no catalog tag all get the same ranking, so they share entries
+    user_version = weights_version if engine.weight_vector(user_weights_map).any() else ANONYMOUS
+    price_version = engine.price_index.version if engine.price_index is not None else 0
+    key = RankCache.key(constraints, 3, price_version, user_version)
+    top_3 = rank_cache.get(key) if use_cache else None
+    if top_3 is not None:
+        timer.lap("rank_cache")
+        return top_3, user_weights_map, "hit"
+    
+    # Tag filter, budget filter and scoring run as vectorized passes; only the winners become dicts
+    top_3 = [
+        result_dict(engine, row, score)
+        for row, score in engine.top_k(user_weights_map, required_tags, budget, k=3,
+                                       max_calories=constraints["max_calories"],
+                                       min_protein=constraints["min_protein"])
+    ]
+    timer.lap("scoring")
+    if not use_cache:
+        return top_3, user_weights_map, "bypass"
+    rank_cache.put(key, top_3)
+    return top_3, user_weights_map, "miss"
+
+def result_dict(engine: ScoringEngine, row: int, score: float) -> dict:
+    item = engine.item(row)
+    
+    restaurant = catalog.restaurant(item.restaurant_id)
+    rest_name = restaurant.name if restaurant else "Unknown"
     
+    return {
+        "item_id": item.item_id,
+        "name": item.name,
+        "restaurant": rest_name,
+        "tags": list(item.tags),
+        "protein_est": item.protein_est,
+        "best_platform": engine.platform_info(row),
+        "score": score
+    }
+
+def rank_batch(batch: "BatchMessageRequest"):
+    """
+    Ranks every (user_id, message) pair against one engine snapshot. Weights come from one
+    cache/SQLite round trip, each distinct message is parsed once, and pairs sharing the same
+    constraints are scored together in one matrix pass. Returns [(top_k, user_weights_map)].
+    """
+    engine = scoring_engine
+    timer = StageTimer("message_batch")
+    constraints = {m: parse_constraints(m) for m in {r.message for r in batch.requests}}
+    timer.lap("parse")
+    
+    user_ids = list(dict.fromkeys(r.user_id for r in batch.requests))
+    for user_id in user_ids:
+        db.events.ensure_profile(user_id)
+    for r in batch.requests:
+        event_log.log_event(r.user_id, "batch_message", details=r.message)
+    timer.lap("profile_insert")
+    
+    weights = weight_cache.get_many(user_ids)
+    timer.lap("weights")
+    
+    # Group pairs whose messages parse to the same constraints
+    groups = {}
+    for i, r in enumerate(batch.requests):
+        c = constraints[r.message]
+        key = (tuple(sorted(c["tags"])), c["budget"], c["max_calories"], c["min_protein"])
+        groups.setdefault(key, []).append(i)
+    
+    results = [None] * len(batch.requests)
+    for (tags, budget, max_calories, min_protein), idxs in groups.items():
+        ranked = engine.top_k_batch([weights[batch.requests[i].user_id] for i in idxs], tags, budget,
+                                    k=batch.k, max_calories=max_calories, min_protein=min_protein)
+        for i, top in zip(idxs, ranked):
+            results[i] = ([result_dict(engine, row, score) for row, score in top],
+                          weights[batch.requests[i].user_id])
+    timer.lap("scoring")
+    return results
+
+def coach_style(user_weights_map: UserPreferences):
     coach_scalar = user_weights_map.get("coach_style", 0.0)
     
     if coach_scalar > 1.0:
-        style = "hype"
-        tone_desc = "extremely energetic, hyped, and enthusiastic"
+        return "hype", "extremely energetic, hyped, and enthusiastic"
     elif coach_scalar < -1.0:
-        style = "gentle"
-        tone_desc = "gentle, soft, nurturing, and calm"
+        return "gentle", "gentle, soft, nurturing, and calm"
+    return "neutral", "helpful, friendly, and straightforward"
+
+def build_coach_prompt(message: str, tone_desc: str, top_3: list) -> str:
+    # Provide the user's intent plus the structural context so Airia AI can form a tailored response
+    context_str = f"System: You are an AI Food Coach. The user asked: '{message}'. Tone: {tone_desc}.\nHere are the top 3 food options the system found:\n"
+    for idx, item in enumerate(top_3):
+        price = item['best_platform']['effective_price']
+        context_str += f"{idx+1}. {item['name']} from {item['restaurant']} for ${price:.2f}\n"
+    context_str += "\nRespond conversationally to the user about these options. Keep it under 3 sentences."
+    return context_str
+
+def fallback_coach_text(style: str, top_3: list) -> str:
+    # Standard programmatic formatting used when the Airia API key is missing or the request fails
+    if style == "hype":
+        base_tone = "Yo, let's crush it! Here are the ultimate fuel options to hit your macros today! "
+    elif style == "gentle":
+        base_tone = "Hmm, I've carefully selected these gentle, nourishing options just for you. Take your time deciding. "
     else:
-        style = "neutral"
-        tone_desc = "helpful, friendly, and straightforward"
+        base_tone = "Hey there! Here are the top 3 options based on your exact preferences. "
+        
+    spoken_options = []
+    for idx, item in enumerate(top_3):
+        price = item['best_platform']['effective_price']
+        # Replace decimals with "dollars and cents" to make TTS engine read it properly
+        price_str = f"{int(price)} dollars and {int((price % 1) * 100)} cents" if (price % 1) > 0 else f"{int(price)} dollars"
+        
+        if style == "hype":
+            spoken_options.append(f"Option {idx + 1}, BOOM! We've got the {item['name']} for just {price_str}! ")
+        elif style == "gentle":
+            spoken_options.append(f"For option {idx + 1}, perhaps try the beautiful {item['name']}, coming in at {price_str}. ")
+        else:
+            spoken_options.append(f"Number {idx + 1} is the {item['name']} which will cost {price_str}. ")
+
+    return base_tone + "".join(spoken_options)
 
+async def generate_coach_text(message: str, style: str, tone_desc: str, top_3: list) -> str:
     coach_text = ""
     airia_api_key = os.getenv("AIRIA_API_KEY", "")
     
     if airia_api_key:
-        import requests
-        try:
-            # Provide the user's intent plus the structural context so Airia AI can form a tailored response
-            context_str = f"System: You are an AI Food Coach. The user asked: '{req.message}'. Tone: {tone_desc}.\nHere are the top 3 food options the system found:\n"
-            for idx, item in enumerate(top_3):
-                price = item['best_platform']['effective_price']
-                context_str += f"{idx+1}. {item['name']} from {item['restaurant']} for ${price:.2f}\n"
-            context_str += "\nRespond conversationally to the user about these options. Keep it under 3 sentences."
-
-            headers = {
-                "X-API-KEY": airia_api_key,
-                "Content-Type": "application/json"
-            }
-            res = requests.post(
-                "https://api.airia.ai/v2/PipelineExecution/89ba5741-ca1a-49a9-a618-e231d5c67a30",
-                headers=headers,
-                json={"userInput": context_str, "asyncOutput": False},
-                timeout=12
-            )
-            
-            if res.status_code == 200:
-                try:
-                    res_data = res.json()
-                    if isinstance(res_data, dict):
-                        coach_text = res_data.get("output", res_data.get("result", res_data.get("response", res_data.get("text", str(res_data)))))
-                    else:
-                        coach_text = str(res_data)
-                except ValueError:
-                    # Fallback to plain text if not JSON
-                    coach_text = res.text
-        except Exception as e:
-            print(f"Airia API failed: {e}")
-
-    # Fallback back to standard programmatic formatting if Airia API key is missing or request fails
+        coach_text = await run_pipeline(airia_api_key, build_coach_prompt(message, tone_desc, top_3))
+
     if not coach_text:
-        if style == "hype":
-            base_tone = "Yo, let's crush it! Here are the ultimate fuel options to hit your macros today! "
-        elif style == "gentle":
-            base_tone = "Hmm, I've carefully selected these gentle, nourishing options just for you. Take your time deciding. "
-        else:
-            base_tone = "Hey there! Here are the top 3 options based on your exact preferences. "
-            
-        spoken_options = []
-        for idx, item in enumerate(top_3):
-            price = item['best_platform']['effective_price']
-            # Replace decimals with "dollars and cents" to make TTS engine read it properly
-            price_str = f"{int(price)} dollars and {int((price % 1) * 100)} cents" if (price % 1) > 0 else f"{int(price)} dollars"
-            
-            if style == "hype":
-                spoken_options.append(f"Option {idx + 1}, BOOM! We've got the {item['name']} for just {price_str}! ")
-            elif style == "gentle":
-                spoken_options.append(f"For option {idx + 1}, perhaps try the beautiful {item['name']}, coming in at {price_str}. ")
-            else:
-                spoken_options.append(f"Number {idx + 1} is the {item['name']} which will cost {price_str}. ")
+        coach_text = fallback_coach_text(style, top_3)
+    return coach_text
 
-        coach_text = base_tone + "".join(spoken_options)
+@app.post("/message")
+async def handle_message(req: MessageRequest, response: Response, cache_control: str = Header(default="")):
+    # SQLite and NumPy work stays off the event loop; upstream calls are awaited without holding a thread
+    timer = StageTimer("message")
+    # "Cache-Control: no-cache" skips the ranking cache (read and write), e.g. when debugging scores
+    use_cache = "no-cache" not in cache_control.lower()
+    top_3, user_weights_map, cache_status = await run_in_threadpool(rank_message, req, use_cache)
+    response.headers["X-Rank-Cache"] = cache_status
+    timer.lap("rank")
+    style, tone_desc = coach_style(user_weights_map)
+    
+    if req.staged:
+        try:
+            job = coach_queue.submit(lambda: produce_coach(req.message, style, tone_desc, top_3, "message"))
+        except QueueFull:
+            raise HTTPException(status_code=503, detail="Coach is busy, try again shortly")
+        timer.total()
+        return {
+            "top_results": top_3,
+            "coach_job_id": job.id,
+            "coach_job_url": f"/coach/jobs/{job.id}",
+            "coach_events_url": f"/coach/jobs/{job.id}/events"
+        }
     
-    from services.api.modulate_wrapper import generate_voice
-    audio_url = generate_voice(coach_text, style)
+    coach = await produce_coach(req.message, style, tone_desc, top_3, "message")
+    timer.total()
+    return {"top_results": top_3, **coach}
+
+@app.post("/message/batch")
+async def handle_message_batch(batch: BatchMessageRequest):
+    """Recommendations for many (user_id, message) pairs in one call, e.g. to precompute pushes."""
+    if len(batch.requests) > MESSAGE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {MESSAGE_BATCH_MAX} requests per batch")
+    if not 1 <= batch.k <= 50:
+        raise HTTPException(status_code=422, detail="k must be between 1 and 50")
+    timer = StageTimer("message_batch")
+    ranked = await run_in_threadpool(rank_batch, batch)
+    timer.lap("rank")
     
+    results = [
+        {"user_id": r.user_id, "message": r.message, "top_results": top}
+        for r, (top, _) in zip(batch.requests, ranked)
+    ]
+    if batch.include_coach:
+        async def coach_for(r, top, weights):
+            style, tone_desc = coach_style(weights)
+            return await produce_coach(r.message, style, tone_desc, top, "message_batch")
+        # Upstream wrappers bound their own concurrency, so all pairs can be awaited together
+        coaches = await asyncio.gather(*(coach_for(r, top, w) for r, (top, w) in zip(batch.requests, ranked)))
+        for result, coach in zip(results, coaches):
+            result.update(coach)
+        timer.lap("coach")
+    timer.total()
+    return {"results": results}
+
+# Cart plans memoize per-restaurant solves across requests
+cart_optimizer = CartOptimizer()
+
+@app.post("/cart/optimize")
+async def optimize_cart(cart: CartRequest):
+    """Cheapest split of a multi-item cart into platform orders, with delivery fees and coupon thresholds."""
+    if any(line.quantity < 1 for line in cart.items):
+        raise HTTPException(status_code=422, detail="quantity must be at least 1")
+    if sum(line.quantity for line in cart.items) > CART_MAX_UNITS:
+        raise HTTPException(status_code=413, detail=f"At most {CART_MAX_UNITS} units per cart")
+    budget = CART_TIME_BUDGET if cart.time_budget_ms is None else min(max(cart.time_budget_ms, 0.0), 5000.0) / 1e3
+    timer = StageTimer("cart")
+    # One snapshot of the prices for the whole search, as with rankings
+    plan = await run_in_threadpool(cart_optimizer.optimize, scoring_engine.price_index or price_index,
+                                   [(line.item_id, line.quantity) for line in cart.items], budget)
+    timer.lap("optimize")
+    timer.total()
+    return plan
+
+async def produce_coach(message: str, style: str, tone_desc: str, top_3: list, endpoint: str) -> dict:
+    # Stages are recorded under the endpoint that asked for the coach
+    timer = StageTimer(endpoint)
+    coach_text = await generate_coach_text(message, style, tone_desc, top_3)
+    timer.lap("coach_text")
+    # Cached clip URL, or a stream URL that synthesizes while the client plays it
+    audio_url = prepare_voice_stream(coach_text, style)
+    if audio_url.startswith("/audio/stream/"):
+        # The client may fetch the stream from any worker
+        publish("tts.stream", text=coach_text, style=style)
+    # Synthesis happens when the client fetches the stream, timed there as audio_stream / tts
+    timer.lap("coach_audio_url")
     return {
-        "top_results": top_3,
         "coach_text": coach_text,
         "coach_audio_url": audio_url
     }
 
+@app.get("/coach/jobs/{job_id}")
+async def get_coach_job(job_id: str, wait: float = 0.0):
+    """Poll a staged coach job; wait > 0 long-polls up to that many seconds (capped at 30)."""
+    job = coach_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired coach job")
+    if wait > 0:
+        await job.wait(min(wait, 30.0))
+    return job.to_dict()
+
+@app.delete("/coach/jobs/{job_id}")
+def cancel_coach_job(job_id: str):
+    if coach_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired coach job")
+    return {"job_id": job_id, "cancelled": coach_queue.cancel(job_id)}
+
+@app.get("/coach/jobs/{job_id}/events")
+async def coach_job_events(job_id: str, request: Request):
+    """Server-Sent Events stream that emits one `coach` event when the job finishes.
+    Closing the stream before then cancels the job."""
+    job = coach_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired coach job")
+
+    async def events():
+        idle = 0.0
+        try:
+            while not await job.wait(SSE_POLL_INTERVAL):
+                if await request.is_disconnected():
+                    return
+                idle += SSE_POLL_INTERVAL
+                if idle >= SSE_HEARTBEAT:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+            yield f"event: coach\ndata: {json.dumps(job.to_dict())}\n\n"
+        finally:
+            # Runs on disconnect and when the server cancels the stream; a finished job is left alone
+            coach_queue.cancel(job_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/audio/stream/{key}")
+async def stream_audio(key: str):
+    if not has_voice_stream(key):
+        raise HTTPException(status_code=404, detail="Unknown or expired audio clip")
+    try:
+        chunks = await open_voice_stream(key)
+    except VoiceStreamError:
+        # The synthesis this request waited on failed; its own client got a truncated clip
+        raise HTTPException(status_code=502, detail="Audio synthesis failed")
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired audio clip")
+    return StreamingResponse(chunks, media_type="audio/mpeg")
+
+@app.get("/audio/cache")
+def audio_cache_stats():
+    return cache_stats()
+
+@app.post("/admin/prices")
+def update_prices(batch: PriceBatch, x_admin_token: str = Header(default="")):
+    """Hot-reload a delta batch of prices and coupons without restarting."""
+    check_admin(x_admin_token)
+    # Saved with the applied delta files before it is applied and shared, so restarts and
+    # workers started meanwhile replay it
+    return delta_watcher.submit(batch.model_dump())
+
+# Scrape-time gauges for the in-process caches and queues
+metrics.Gauge("foodpo_catalog_items", "Menu items in the loaded catalog.", lambda: len(catalog))
+metrics.Gauge("foodpo_price_version", "Price batches applied since startup.", lambda: price_index.version)
+metrics.Gauge("foodpo_coach_queue_depth", "Coach jobs waiting for a worker.", lambda: coach_queue.depth())
+metrics.Gauge("foodpo_weight_cache", "User weight cache counters.", lambda: weight_cache.stats(), "kind")
+metrics.Gauge("foodpo_audio_cache", "TTS audio cache counters.", lambda: cache_stats(), "kind")
+metrics.Gauge("foodpo_rank_cache", "Ranking result cache counters.", lambda: rank_cache.stats(), "kind")
+metrics.Gauge("foodpo_parse_cache", "Constraint parse cache counters.",
+              lambda: {"hits": parse_cache_info().hits, "misses": parse_cache_info().misses}, "kind")
+metrics.Gauge("foodpo_cart_cache", "Cart optimizer solve cache counters.", lambda: cart_optimizer.stats(), "kind")
+metrics.Gauge("foodpo_event_log", "Event log writer counters.", lambda: event_log.stats(), "kind")
+metrics.Gauge("foodpo_invalidation_bus", "Cross-worker invalidation counters.",
+              lambda: bus.stats() if bus is not None else {}, "kind")
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of stage latencies, upstream outcomes and cache gauges."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Toggled at runtime through /admin/profiler; idle (no sampling thread) until started
+profiler = SamplingProfiler()
+
+class ProfilerToggle(BaseModel):
+    enabled: bool
+    interval: Optional[float] = None
+    reset: bool = False
+
+@app.post("/admin/profiler")
+def toggle_profiler(toggle: ProfilerToggle, x_admin_token: str = Header(default="")):
+    check_admin(x_admin_token)
+    if toggle.reset:
+        profiler.reset()
+    if toggle.enabled:
+        profiler.start(toggle.interval)
+    else:
+        profiler.stop()
+    return profiler.status()
+
+@app.get("/admin/events/{user_id}")
+def user_events(user_id: str, since: float = 0.0, until: Optional[float] = None, limit: int = 1000,
+                x_admin_token: str = Header(default="")):
+    """Replay a user's events (unix-time window, oldest first) plus all-time per-action totals."""
+    check_admin(x_admin_token)
+    limit = min(max(limit, 1), 10000)
+    # Workers of a multi-worker server log to separate directories; read them all
+    logs = [event_log] + event_log.siblings()
+    try:
+        totals, events = {}, []
+        for log in logs:
+            log.user_totals(user_id, totals)
+            events.extend(log.replay(user_id, since, until, limit))
+    finally:
+        for log in logs[1:]:
+            log.close()
+    events.sort(key=lambda e: e["ts"])
+    return {"user_id": user_id, "totals": totals, "events": events[:limit]}
+
+@app.post("/admin/events/compact")
+def compact_events(x_admin_token: str = Header(default="")):
+    """Roll closed segments past retention into per-user totals now instead of on the timer."""
+    check_admin(x_admin_token)
+    # Other workers compact their own logs when told; the count is this worker's
+    publish("events.compact")
+    return {"compacted_segments": event_log.compact()}
+
+@app.get("/admin/profiler")
+def profiler_report(limit: int = 200, x_admin_token: str = Header(default="")):
+    """Collapsed stacks ("frame;frame count" per line), ready for flamegraph.pl or speedscope."""
+    check_admin(x_admin_token)
+    return PlainTextResponse(profiler.report(limit))
+
 @app.post("/feedback")
 def handle_feedback(req: FeedbackRequest):
-    def get_tags(i_id):
-        itm = next((m for m in data["menu_items"] if m["item_id"] == i_id), None)
-        return itm["tags"] if itm else []
-        
-    chosen_tags = get_tags(req.chosen_item_id)
-    not_chosen_tagsList = [get_tags(i_id) for i_id in req.not_chosen_item_ids]
+    timer = StageTimer("feedback")
+    chosen_tags = catalog.tags_for(req.chosen_item_id)
+    not_chosen_tagsList = [catalog.tags_for(i_id) for i_id in req.not_chosen_item_ids]
     
-    user_weights_map = get_all_user_weights(req.user_id)
+    # The update re-reads the stored vector in one SQLite write transaction, so concurrent feedback
+    # (in this worker or another) never loses updates; the lock queues this worker's calls
+    with weight_cache.lock(req.user_id):
+        timer.lap("lock_wait")
+        deltas = {}
     
-    # Increase weights for chosen item tags
-    for t in chosen_tags:
-        w = user_weights_map.get(t, 0.0)
-        set_user_weight(req.user_id, t, w + 1.0)
+        # Increase weights for chosen item tags
+        for t in chosen_tags:
+            deltas[t] = 1.0
         
-    # Decrease weights for items not chosen
-    for tags in not_chosen_tagsList:
-        for t in tags:
-            # Avoid penalizing tags that were in the chosen item
-            if t not in chosen_tags:
-                w = user_weights_map.get(t, 0.0)
-                set_user_weight(req.user_id, t, w - 0.5)
+        # Decrease weights for items not chosen
+        for tags in not_chosen_tagsList:
+            for t in tags:
+                # Avoid penalizing tags that were in the chosen item
+                if t not in chosen_tags:
+                    deltas[t] = -0.5
                 
-    # Adjust coach style based on rating (scalar)
-    coach_w = user_weights_map.get("coach_style", 0.0)
-    if req.rating >= 8:
-        set_user_weight(req.user_id, "coach_style", coach_w + 1.0)
-    elif req.rating <= 4:
-        set_user_weight(req.user_id, "coach_style", coach_w - 1.0)
+        # Adjust coach style based on rating (scalar)
+        if req.rating >= 8:
+            deltas["coach_style"] = 1.0
+        elif req.rating <= 4:
+            deltas["coach_style"] = -1.0
         
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT INTO events (user_id, action, item_id, details) VALUES (?, ?, ?, ?)", 
-              (req.user_id, "feedback", req.chosen_item_id, f"Rating: {req.rating}"))
-    conn.commit()
-    conn.close()
+        update_user_weights(req.user_id, deltas)
+        timer.lap("weight_update")
+    event_log.log_event(req.user_id, "feedback", req.chosen_item_id, f"Rating: {req.rating}")
+    timer.lap("event_log")
+    timer.total()
     
     return {"status": "success", "message": "Weights updated"}
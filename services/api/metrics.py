@@ -0,0 +1,191 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format (version 0.0.4).
+Counters and histograms are thread-safe and label-aware; gauges read their value from
+a callback at scrape time. Kept dependency-free rather than pulling in prometheus_client.
+"""
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _fmt(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Gauge:
+    """Value read from fn() at scrape time; fn may also return {label_value: value} for one label."""
+
+    def __init__(self, name: str, help: str, fn: Callable, labelname: str = ""):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelname = labelname
+        _registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            value = self.fn()
+        except Exception:
+            # A failing callback (e.g. before startup) drops the sample rather than the scrape
+            return
+        if isinstance(value, dict):
+            for label, v in sorted(value.items()):
+                yield f"{self.name}{_labels((self.labelname,), (label,))} {_fmt(v)}"
+        elif value is not None:
+            yield f"{self.name} {_fmt(value)}"
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- application metrics ---------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "foodpo_stage_seconds", "Time spent in each stage of a request handler.", ["endpoint", "stage"])
+UPSTREAM_SECONDS = Histogram(
+    "foodpo_upstream_seconds", "Latency of upstream calls (Airia pipeline, OpenAI TTS).", ["upstream"])
+UPSTREAM_CALLS = Counter(
+    "foodpo_upstream_calls_total", "Upstream calls by outcome (ok, error, timeout, cancelled).", ["upstream", "outcome"])
+
+
+class StageTimer:
+    """
+    Splits one handler run into consecutive stages without nesting blocks:
+    call lap("stage") at the end of each stage, and total() once at the end.
+    """
+
+    __slots__ = ("endpoint", "start", "last")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self.last, self.endpoint, name)
+        self.last = now
+
+    def total(self):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.endpoint, "total")
+
+
+def stage(endpoint: str, name: str):
+    """with stage("message", "scoring"): ... records the block's duration."""
+    return STAGE_SECONDS.time(endpoint, name)
+
+
+@contextmanager
+def upstream_call(upstream: str):
+    """
+    Times an upstream call and counts its outcome. Timeouts, cancellations and exceptions
+    are counted and re-raised; the caller marks a completed-but-failed call (e.g. a non-200
+    response) with outcome["value"] = "error".
+    """
+    outcome = {"value": "ok"}
+    start = time.perf_counter()
+    try:
+        yield outcome
+    except asyncio.TimeoutError:
+        outcome["value"] = "timeout"
+        raise
+    except (asyncio.CancelledError, GeneratorExit):
+        # The caller went away (client disconnect, job cancel); not the upstream's fault
+        outcome["value"] = "cancelled"
+        raise
+    except BaseException:
+        outcome["value"] = "error"
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream)
+        UPSTREAM_CALLS.inc(upstream, outcome["value"])
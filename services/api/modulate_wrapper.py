@@ -1,47 +1,334 @@
+import asyncio
+import hashlib
 import os
-from openai import OpenAI
+import threading
 import time
+import uuid
+from collections import OrderedDict
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from services.api.metrics import stage, upstream_call
+
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
 
 # Create a static public folder where we can serve the audio clip from
 STATIC_AUDIO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'services', 'web', 'audio')
 os.makedirs(STATIC_AUDIO_DIR, exist_ok=True)
 
-def generate_voice(coach_text: str, style: str) -> str:
+# Map our internal styles to OpenAI's available voices
+VOICE_MAP = {
+    "hype": "onyx",     # Deeper, punchier
+    "gentle": "nova",   # Softer, more pleasant
+    "neutral": "alloy"  # Standard
+}
+
+TTS_MODEL = "tts-1"
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "20"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "8"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+TTS_CACHE_MAX_AGE = float(os.getenv("TTS_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+
+# Shared async client (its httpx pool keeps connections alive between calls).
+# OPENAI_BASE_URL is honoured by the client, which is how tests point it at a local stub.
+_async_client = None
+_async_limit = None
+
+
+def get_async_client():
+    global _async_client, _async_limit
+    if _async_client is None:
+        _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=TTS_TIMEOUT)
+        _async_limit = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client, _async_limit
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+        _async_limit = None
+
+
+class AudioCache:
     """
-    Calls the OpenAI TTS API to generate the coach voice.
-    Saves the .mp3 to the web directory and returns the local URL.
+    Content-addressed cache of synthesized clips under STATIC_AUDIO_DIR.
+    Clips are stored as tts_<sha256(text, voice, model)>.mp3, so identical coach lines are
+    served without an API call. Concurrent misses for the same key share one synthesis,
+    and the directory is kept under max_bytes / max_age by evicting least recently used clips.
+    Only tts_*.mp3 files are managed; anything else in the directory is left alone.
+    Workers sharing the directory keep their indexes in step through on_change and
+    adopt() / forget(), so each sees the others' clips and byte totals.
     """
-    # Map our internal styles to OpenAI's available voices
-    voice_map = {
-        "hype": "onyx",     # Deeper, punchier
-        "gentle": "nova",   # Softer, more pleasant
-        "neutral": "alloy"  # Standard
-    }
-    
-    openai_voice = voice_map.get(style, "alloy")
-    
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+
+    PREFIX = "tts_"
+
+    def __init__(self, directory: str, max_bytes: int = TTS_CACHE_MAX_BYTES, max_age: float = TTS_CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = None  # key -> (size, last_used), least recently used first
+        self._total = 0
+        self._inflight_async = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        # Optional callback(event, key, size) for "commit" and "drop"; called under the lock
+        self.on_change = None
+
+    @staticmethod
+    def key(text: str, voice: str, model: str = TTS_MODEL) -> str:
+        return hashlib.sha256(f"{model}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{self.PREFIX}{key}.mp3")
+
+    def url(self, key: str) -> str:
+        return f"./audio/{self.PREFIX}{key}.mp3"
+
+    def temp_path(self, key: str) -> str:
+        # Unique per writer so concurrent syntheses never clobber each other's partial files
+        return f"{self.path(key)}.{uuid.uuid4().hex}.part"
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total,
+            }
+
+    def get(self, key: str):
+        """Returns the clip URL on a hit (refreshing its LRU position), else None."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is not None and now - entry[1] <= self.max_age and os.path.exists(self.path(key)):
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+                self.hits += 1
+                try:
+                    os.utime(self.path(key))
+                except OSError:
+                    pass
+                return self.url(key)
+            if entry is not None:
+                self._drop(key)
+            return None
+
+    def contains(self, key: str) -> bool:
+        """True when key has a live clip. Unlike get(), counts nothing and leaves the LRU order alone."""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            return (entry is not None and time.time() - entry[1] <= self.max_age
+                    and os.path.exists(self.path(key)))
+
+    def commit(self, key: str, temp_path: str) -> str:
+        """Atomically moves a finished temp file into place and applies eviction."""
+        os.replace(temp_path, self.path(key))
+        size = os.path.getsize(self.path(key))
+        with self._lock:
+            self._load()
+            if key in self._entries:
+                self._total -= self._entries[key][0]
+            self._entries[key] = (size, time.time())
+            self._entries.move_to_end(key)
+            self._total += size
+            if self.on_change is not None:
+                self.on_change("commit", key, size)
+            self._evict()
+        return self.url(key)
+
+    def adopt(self, key: str, size: int):
+        """Index a clip another worker committed to the shared directory."""
+        with self._lock:
+            self._load()
+            if key in self._entries:
+                self._total -= self._entries[key][0]
+            self._entries[key] = (size, time.time())
+            self._entries.move_to_end(key)
+            self._total += size
+            self._evict()
+
+    def forget(self, key: str):
+        """Unindex a clip another worker dropped (its file is already gone)."""
+        with self._lock:
+            if self._entries is not None and key in self._entries:
+                size, _ = self._entries.pop(key)
+                self._total -= size
+
+    def inflight(self, key: str):
+        """Future for a synthesis of key already running on this loop (counted as coalesced), or None."""
+        pending = self._inflight_async.get(key)
+        if pending is not None:
+            with self._lock:
+                self.coalesced += 1
+        return pending
+
+    def claim(self, key: str):
+        """Marks key as being synthesized by the caller; pair with release()."""
+        self._inflight_async[key] = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self.misses += 1
+
+    def release(self, key: str, url: str):
+        pending = self._inflight_async.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(url)
+
+    def _load(self):
+        # Lazily index clips left by earlier runs, oldest use first
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict()
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith(self.PREFIX) and name.endswith(".mp3"):
+                st = os.stat(os.path.join(self.directory, name))
+                found.append((st.st_mtime, name[len(self.PREFIX):-4], st.st_size))
+        for mtime, key, size in sorted(found):
+            self._entries[key] = (size, mtime)
+            self._total += size
+        self._evict()
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            key, (size, last_used) = next(iter(self._entries.items()))
+            if self._total <= self.max_bytes and now - last_used <= self.max_age:
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        size, _ = self._entries.pop(key)
+        self._total -= size
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+        if self.on_change is not None:
+            self.on_change("drop", key, size)
+
+
+audio_cache = AudioCache(STATIC_AUDIO_DIR)
+
+
+def cache_stats() -> dict:
+    return audio_cache.stats()
+
+
+STREAM_CHUNK_SIZE = 16 * 1024
+MAX_PENDING_STREAMS = 1024
+
+# key -> (text, voice) for clips handed out as stream URLs but not yet synthesized. Request
+# handlers and the invalidation bus thread (tts.stream) both update it, under _pending_lock.
+_pending_streams = OrderedDict()
+_pending_lock = threading.Lock()
+
+
+def prepare_voice_stream(coach_text: str, style: str) -> str:
+    """
+    Returns an audio URL without waiting for synthesis: the cached clip on a hit,
+    otherwise /audio/stream/<key>, which synthesizes on request and plays while it downloads.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
         return "" # Fail gracefully if key is missing
-        
+
+    openai_voice = VOICE_MAP.get(style, "alloy")
+    key = AudioCache.key(coach_text, openai_voice)
+    url = audio_cache.get(key)
+    if url:
+        return url
+
+    with _pending_lock:
+        _pending_streams[key] = (coach_text, openai_voice)
+        _pending_streams.move_to_end(key)
+        while len(_pending_streams) > MAX_PENDING_STREAMS:
+            _pending_streams.popitem(last=False)
+    return f"/audio/stream/{key}"
+
+
+def has_voice_stream(key: str) -> bool:
+    with _pending_lock:
+        if key in _pending_streams:
+            return True
+    return audio_cache.contains(key)
+
+
+class VoiceStreamError(Exception):
+    """The synthesis a stream request waited on failed."""
+
+
+async def open_voice_stream(key: str):
+    """
+    Async iterator of mp3 bytes for key, or None for an unknown key. Cache hits are read from
+    disk; otherwise TTS chunks are forwarded as they arrive and teed into a temp file that is
+    committed to the cache once the clip completes. If the same clip is already being
+    synthesized, waits for it before returning and serves the file; raises VoiceStreamError
+    when that synthesis failed, so the caller can answer with an error instead of an empty clip.
+    """
+    if audio_cache.get(key) is None:
+        pending = audio_cache.inflight(key)
+        if pending is not None:
+            if not await asyncio.shield(pending):
+                raise VoiceStreamError(f"synthesis of clip {key} failed")
+        else:
+            with _pending_lock:
+                request = _pending_streams.get(key)
+            if request is None:
+                return None
+            return _synthesize_stream(key, *request)
+    return _read_clip(key)
+
+
+async def _read_clip(key: str):
+    with open(audio_cache.path(key), "rb") as f:
+        while chunk := f.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+async def _synthesize_stream(key: str, coach_text: str, openai_voice: str):
+    client = get_async_client()
+    temp_path = audio_cache.temp_path(key)
+    audio_cache.claim(key)
+    url = ""
     try:
-        client = OpenAI(api_key=api_key)
-        
-        audio_filename = f"response_{int(time.time())}.mp3"
-        audio_path = os.path.join(STATIC_AUDIO_DIR, audio_filename)
-        
-        with client.audio.speech.with_streaming_response.create(
-            model="tts-1",
-            voice=openai_voice,
-            input=coach_text
-        ) as response:
-            response.stream_to_file(audio_path)
-        
-        return f"./audio/{audio_filename}"
-        
+        # The TTS cost of the coach: /message only hands out the URL (its coach_audio_url stage)
+        with stage("audio_stream", "tts"), upstream_call("tts"):
+            async with _async_limit:
+                async with client.audio.speech.with_streaming_response.create(
+                    model=TTS_MODEL,
+                    voice=openai_voice,
+                    input=coach_text
+                ) as response:
+                    with open(temp_path, "wb") as f:
+                        async for chunk in response.iter_bytes():
+                            f.write(chunk)
+                            yield chunk
+        url = audio_cache.commit(key, temp_path)
+        with _pending_lock:
+            _pending_streams.pop(key, None)
     except Exception as e:
-        print(f"OpenAI TTS failed: {e}")
-        return ""
+        print(f"OpenAI TTS stream failed: {e}")
+    finally:
+        # Client disconnects land here too (GeneratorExit); the partial clip is never cached
+        if not url:
+            _discard(temp_path)
+        audio_cache.release(key, url)
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,298 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.api.preferences import BLOB_DTYPE
+
+SCHEMA = [
+    '''
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            user_id TEXT PRIMARY KEY,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS tag_vocab (
+            id INTEGER PRIMARY KEY,
+            tag TEXT UNIQUE NOT NULL
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS user_vectors (
+            user_id TEXT PRIMARY KEY,
+            weights BLOB NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''',
+]
+
+# Statements are kept as constants so sqlite3's per-connection statement cache reuses them
+SQL_SELECT_VECTOR = "SELECT weights, updated_at FROM user_vectors WHERE user_id = ?"
+SQL_SELECT_VECTORS_MANY = "SELECT user_id, weights, updated_at FROM user_vectors WHERE user_id IN ({})"
+SQL_UPSERT_VECTOR = "INSERT OR REPLACE INTO user_vectors (user_id, weights, updated_at) VALUES (?, ?, ?)"
+SQL_SELECT_VOCAB = "SELECT id, tag FROM tag_vocab ORDER BY id"
+SQL_INSERT_TAG = "INSERT OR IGNORE INTO tag_vocab (tag) VALUES (?)"
+SQL_SELECT_TAG_IDS = "SELECT id, tag FROM tag_vocab WHERE tag IN ({})"
+SQL_INSERT_PROFILE = "INSERT OR IGNORE INTO user_profiles (user_id) VALUES (?)"
+SQL_INSERT_VECTOR = "INSERT OR IGNORE INTO user_vectors (user_id, weights, updated_at) VALUES (?, ?, ?)"
+SQL_TABLE_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+# Rows of the events table the EventLog replaced, with their UTC timestamps as unix time
+SQL_SELECT_OLD_EVENTS = ("SELECT COALESCE(CAST(strftime('%s', timestamp) AS REAL), 0), user_id, action, "
+                         "item_id, details FROM events ORDER BY id")
+
+POOL_SIZE = int(os.getenv("FOODPO_DB_POOL_SIZE", "4"))
+EVENT_BATCH_SIZE = 256
+EVENT_FLUSH_INTERVAL = 0.5  # seconds
+# Stay under SQLite's default host-parameter limit (999 on older builds) per IN (...) query
+MAX_SQL_VARIABLES = 900
+OLD_EVENT_CHUNK = 10000
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+    # WAL lets readers run alongside the writer; NORMAL sync skips the fsync on every commit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def init_db(path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = connect(path)
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+    conn.commit()
+    conn.close()
+
+
+class ConnectionPool:
+    """Fixed-size pool of long-lived SQLite connections shared across request threads."""
+
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(connect(path))
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class EventWriter:
+    """
+    Write-behind queue for profile rows. Request handlers enqueue and return; a background
+    thread drains the queue and commits each batch in one transaction. User events go to
+    the append-only EventLog (services.api.event_log) instead of this database.
+    """
+
+    def __init__(self, pool: ConnectionPool, batch_size: int = EVENT_BATCH_SIZE,
+                 flush_interval: float = EVENT_FLUSH_INTERVAL):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+
+    def ensure_profile(self, user_id: str):
+        self._queue.put((SQL_INSERT_PROFILE, (user_id,)))
+
+    def flush(self):
+        """Block until everything queued so far has been committed."""
+        self._queue.join()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._drain()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write([first] + self._take(self.batch_size - 1))
+
+    def _take(self, limit: int):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def _write(self, batch):
+        # Group by statement so each kind of row goes through a single executemany
+        grouped: Dict[str, list] = {}
+        for sql, params in batch:
+            grouped.setdefault(sql, []).append(params)
+        try:
+            with self.pool.connection() as conn:
+                with conn:
+                    for sql, rows in grouped.items():
+                        conn.executemany(sql, rows)
+        except sqlite3.Error as e:
+            print(f"Event write-behind failed for {len(batch)} rows: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+
+class Database:
+    """Pooled access to the user store plus the background profile writer."""
+
+    def __init__(self, path: str, pool_size: int = POOL_SIZE):
+        init_db(path)
+        self.pool = ConnectionPool(path, pool_size)
+        self.events = EventWriter(self.pool)
+        self._migrate_user_weights()
+
+    def get_user_vector(self, user_id: str) -> Optional[Tuple[bytes, float]]:
+        """(weights blob, updated_at) for a user, or None when they have no stored preferences."""
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_SELECT_VECTOR, (user_id,)).fetchone()
+
+    def get_many_user_vectors(self, user_ids) -> Dict[str, Tuple[bytes, float]]:
+        """user_id -> (blob, updated_at) for users that have one, MAX_SQL_VARIABLES ids per query."""
+        user_ids = list(dict.fromkeys(user_ids))
+        out = {}
+        with self.pool.connection() as conn:
+            for i in range(0, len(user_ids), MAX_SQL_VARIABLES):
+                chunk = user_ids[i:i + MAX_SQL_VARIABLES]
+                sql = SQL_SELECT_VECTORS_MANY.format(",".join("?" * len(chunk)))
+                for user_id, blob, updated_at in conn.execute(sql, chunk):
+                    out[user_id] = (blob, updated_at)
+        return out
+
+    def update_user_vector(self, user_id: str, update: Callable[[Optional[tuple]], Tuple[bytes, float]]):
+        """
+        Read-modify-write of one user's vector in a single BEGIN IMMEDIATE transaction:
+        update(stored (blob, updated_at) or None) returns the row to write. Holding SQLite's
+        write lock from the read on serializes updates across processes sharing the file.
+        update must not write through another connection (it would wait on this one).
+        """
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                blob, updated_at = update(conn.execute(SQL_SELECT_VECTOR, (user_id,)).fetchone())
+                conn.execute(SQL_UPSERT_VECTOR, (user_id, blob, updated_at))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def load_vocabulary(self) -> List[Tuple[int, str]]:
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_SELECT_VOCAB).fetchall()
+
+    def add_tags(self, tags) -> List[Tuple[int, str]]:
+        """Insert tags not yet in the vocabulary; returns (id, tag) for every tag given."""
+        tags = list(tags)
+        with self.pool.connection() as conn:
+            with conn:
+                conn.executemany(SQL_INSERT_TAG, [(t,) for t in tags])
+            return conn.execute(SQL_SELECT_TAG_IDS.format(",".join("?" * len(tags))), tags).fetchall()
+
+    def import_old_events(self, append: Callable[[list], None]) -> int:
+        """
+        One-time hand-off of the rows of the events table the EventLog replaced: append gets
+        them oldest first, in chunks of (ts, user_id, action, item_id, details) tuples, and
+        must raise if it cannot store them. The table is dropped in the same BEGIN IMMEDIATE
+        transaction once every chunk is appended, so other processes wait (however long the
+        import takes) and then find nothing to import. Returns how many rows were handed off.
+        """
+        with self.pool.connection() as conn:
+            while True:
+                if conn.execute(SQL_TABLE_EXISTS, ("events",)).fetchone() is None:
+                    return 0
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as e:
+                    # Another process is importing a large table; wait for it past busy_timeout
+                    if "locked" not in str(e):
+                        raise
+            try:
+                imported = 0
+                if conn.execute(SQL_TABLE_EXISTS, ("events",)).fetchone() is not None:
+                    cursor = conn.execute(SQL_SELECT_OLD_EVENTS)
+                    while True:
+                        rows = cursor.fetchmany(OLD_EVENT_CHUNK)
+                        if not rows:
+                            break
+                        append(rows)
+                        imported += len(rows)
+                    conn.execute("DROP TABLE events")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if imported:
+            print(f"Imported {imported} events from the database into the event log.")
+        return imported
+
+    def _migrate_user_weights(self):
+        """
+        One-time move of the per-tag rows of the old user_weights table into user_vectors
+        blobs. The table is dropped in the same transaction, so no later start (or other
+        process) migrates it again; users that already have a vector keep it.
+        """
+        with self.pool.connection() as conn:
+            if conn.execute(SQL_TABLE_EXISTS, ("user_weights",)).fetchone() is None:
+                return
+            rows = conn.execute("SELECT user_id, tag, weight FROM user_weights").fetchall()
+        vectors: Dict[str, np.ndarray] = {}
+        if rows:
+            slots = {tag: row_id - 1 for row_id, tag in self.add_tags(sorted({tag for _, tag, _ in rows}))}
+            size = max(slots.values()) + 1
+            for user_id, tag, weight in rows:
+                vec = vectors.setdefault(user_id, np.zeros(size, dtype=BLOB_DTYPE))
+                vec[slots[tag]] = weight
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute(SQL_TABLE_EXISTS, ("user_weights",)).fetchone() is None:
+                    # Another process migrated it first
+                    conn.execute("ROLLBACK")
+                    return
+                conn.executemany(SQL_INSERT_VECTOR, [(u, v.tobytes(), now) for u, v in vectors.items()])
+                conn.execute("DROP TABLE user_weights")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        print(f"Migrated tag weights of {len(vectors)} users to preference vectors.")
+
+    def close(self):
+        self.events.close()
+        self.pool.close()
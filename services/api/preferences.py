@@ -0,0 +1,135 @@
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+WEIGHT_HALF_LIFE_DAYS = float(os.getenv("WEIGHT_HALF_LIFE_DAYS", "30"))  # 0 disables decay
+WEIGHT_CLIP = float(os.getenv("WEIGHT_CLIP", "5.0"))  # weights stay within [-clip, clip]
+# Reads decay stored weights in whole steps of this many seconds, so reads within a step agree
+WEIGHT_DECAY_STEP = float(os.getenv("WEIGHT_DECAY_STEP", "3600"))
+# Stored vectors are little-endian float32, one slot per vocabulary id
+BLOB_DTYPE = np.dtype("<f4")
+
+
+class TagVocabulary:
+    """
+    Append-only tag -> slot mapping shared by every user's preference vector, persisted in
+    the tag_vocab table. Slots come from SQLite row ids, so processes sharing the database
+    agree on them; a vector longer than the local vocabulary triggers a reload.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.tags: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self):
+        return len(self.tags)
+
+    def slot(self, tag: str) -> Optional[int]:
+        return self._slots.get(tag)
+
+    def slots(self, tags: Iterable[str]) -> List[int]:
+        """Slots for tags, adding unknown tags to the vocabulary."""
+        tags = list(tags)
+        if any(t not in self._slots for t in tags):
+            with self._lock:
+                missing = [t for t in dict.fromkeys(tags) if t not in self._slots]
+                if missing:
+                    self._install(self.db.add_tags(missing))
+        return [self._slots[t] for t in tags]
+
+    def refresh(self):
+        with self._lock:
+            self._install(self.db.load_vocabulary())
+
+    def _install(self, rows):
+        # rows: (id, tag) from tag_vocab; ids start at 1, slots at 0. Caller holds _lock.
+        tags = list(self.tags)
+        for row_id, tag in rows:
+            slot = row_id - 1
+            if slot >= len(tags):
+                tags.extend([None] * (slot + 1 - len(tags)))
+            tags[slot] = tag
+        slots = {t: i for i, t in enumerate(tags) if t is not None}
+        # Readers see either the old or the new pair of lists, never a mix
+        self.tags, self._slots = tags, slots
+
+
+class UserPreferences:
+    """
+    One user's tag weights as a dense float32 vector over the shared TagVocabulary.
+    Immutable: updated() returns a new vector, so cached instances can be shared freely.
+    Feedback decays the existing weights by the time since the last update (half-life
+    WEIGHT_HALF_LIFE_DAYS), adds the new deltas and clips to +-WEIGHT_CLIP, so old tastes
+    fade and no weight grows without bound. Reads decay too (decayed), so the weights of a
+    user who stops giving feedback keep fading. Stored as one blob per user (see to_blob).
+    """
+
+    __slots__ = ("vocab", "values", "updated_at")
+
+    def __init__(self, vocab: TagVocabulary, values: np.ndarray, updated_at: float = 0.0):
+        self.vocab = vocab
+        self.values = values
+        self.updated_at = updated_at
+
+    @classmethod
+    def empty(cls, vocab: TagVocabulary) -> "UserPreferences":
+        return cls(vocab, np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def from_blob(cls, vocab: TagVocabulary, blob: bytes, updated_at: float) -> "UserPreferences":
+        values = np.frombuffer(blob, dtype=BLOB_DTYPE).astype(np.float32)
+        if len(values) > len(vocab):
+            # Written by another process after it added tags
+            vocab.refresh()
+        return cls(vocab, values, updated_at)
+
+    def to_blob(self) -> bytes:
+        return self.values.astype(BLOB_DTYPE, copy=False).tobytes()
+
+    def get(self, tag: str, default: float = 0.0) -> float:
+        slot = self.vocab.slot(tag)
+        if slot is None or slot >= len(self.values):
+            return default
+        return float(self.values[slot])
+
+    def as_dict(self) -> Dict[str, float]:
+        """Non-zero weights by tag."""
+        tags = self.vocab.tags
+        return {tags[i]: float(self.values[i]) for i in np.flatnonzero(self.values)}
+
+    def updated(self, deltas: Dict[str, float], now: float, half_life_days: float = WEIGHT_HALF_LIFE_DAYS,
+                clip: float = WEIGHT_CLIP) -> "UserPreferences":
+        """Decay to now, add deltas ({tag: delta}) and clip; returns the new vector."""
+        slots = self.vocab.slots(deltas)
+        size = max([len(self.values)] + [s + 1 for s in slots])
+        values = np.zeros(size, dtype=np.float32)
+        values[:len(self.values)] = self.values
+        if half_life_days > 0 and self.updated_at and now > self.updated_at:
+            values *= 0.5 ** ((now - self.updated_at) / (half_life_days * 86400.0))
+        values[slots] += np.asarray(list(deltas.values()), dtype=np.float32)
+        np.clip(values, -clip, clip, out=values)
+        return UserPreferences(self.vocab, values, now)
+
+    def decay_steps(self, now: float, half_life_days: float = WEIGHT_HALF_LIFE_DAYS,
+                    step: float = WEIGHT_DECAY_STEP) -> int:
+        """Whole decay steps between the last update and now (0 when decay is off)."""
+        if half_life_days <= 0 or step <= 0 or not self.updated_at or now <= self.updated_at:
+            return 0
+        return int((now - self.updated_at) // step)
+
+    def decayed(self, steps: int, half_life_days: float = WEIGHT_HALF_LIFE_DAYS,
+                step: float = WEIGHT_DECAY_STEP) -> "UserPreferences":
+        """
+        The vector aged by steps decay steps (see decay_steps), stamped with the time it was
+        aged to, so a later updated() decays only the rest; self when there is nothing to age.
+        """
+        if steps <= 0 or half_life_days <= 0 or not self.values.size:
+            return self
+        age = steps * step
+        factor = np.float32(0.5 ** (age / (half_life_days * 86400.0)))
+        return UserPreferences(self.vocab, self.values * factor, self.updated_at + age)
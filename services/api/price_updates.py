@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process, so the history needs no file lock
+    fcntl = None
+
+PRICE_DELTA_DIR = os.getenv("PRICE_DELTA_DIR", os.path.join("data", "deltas"))
+PRICE_DELTA_POLL = float(os.getenv("PRICE_DELTA_POLL", "2.0"))  # seconds between directory scans
+# Applied files kept before the history is merged into one (see DeltaWatcher.compact)
+PRICE_DELTA_COMPACT = int(os.getenv("PRICE_DELTA_COMPACT", "100"))
+
+
+def normalize_batch(raw: dict) -> dict:
+    """
+    Validate a delta batch read from disk (the admin endpoint gets the same checks from
+    its request model) and coerce numbers to float. Raises ValueError on bad input.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("batch must be a JSON object")
+    unknown = set(raw) - {"prices", "remove_prices", "coupons", "remove_coupons"}
+    if unknown:
+        raise ValueError(f"unknown batch keys: {sorted(unknown)}")
+    try:
+        return {
+            "prices": [
+                {"item_id": str(p["item_id"]), "platform_name": str(p["platform_name"]),
+                 "base_price": float(p["base_price"]), "delivery_fee": float(p["delivery_fee"])}
+                for p in raw.get("prices", [])
+            ],
+            "remove_prices": [
+                {"item_id": str(p["item_id"]), "platform_name": str(p["platform_name"])}
+                for p in raw.get("remove_prices", [])
+            ],
+            "coupons": [
+                {"code": str(c["code"]), "platform": str(c["platform"]),
+                 "discount_value": float(c["discount_value"]), "min_spend": float(c["min_spend"])}
+                for c in raw.get("coupons", [])
+            ],
+            "remove_coupons": [str(code) for code in raw.get("remove_coupons", [])],
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"malformed batch entry: {e!r}")
+
+
+def merge_batches(batches: Iterable[dict]) -> dict:
+    """
+    One normalized batch with the same effect as applying batches in order: the last change
+    to each price row (item_id, platform_name) and coupon (code) wins. No key is both removed
+    and upserted in the result, so apply_batch's removals-first order cannot reorder them.
+    """
+    prices, coupons = {}, {}
+    for batch in batches:
+        # Within a batch removals run first, so its upserts win over its own removals
+        for r in batch["remove_prices"]:
+            prices[(r["item_id"], r["platform_name"])] = None
+        for p in batch["prices"]:
+            prices[(p["item_id"], p["platform_name"])] = p
+        for code in batch["remove_coupons"]:
+            coupons[code] = None
+        for c in batch["coupons"]:
+            coupons[c["code"]] = c
+    return {
+        "prices": [p for p in prices.values() if p is not None],
+        "remove_prices": [{"item_id": item_id, "platform_name": platform}
+                          for (item_id, platform), p in prices.items() if p is None],
+        "coupons": [c for c in coupons.values() if c is not None],
+        "remove_coupons": [code for code, c in coupons.items() if c is None],
+    }
+
+
+class DeltaWatcher:
+    """
+    Polls a directory for price/coupon delta files (*.json, one batch each) and applies
+    them in name order. Applied files are renamed to <stamp>-<name>.applied, stamped with
+    the UTC time they were applied, and rejected ones to <name>.failed, so each file is
+    handled once. Writers should create the file under another name and rename it to *.json
+    when complete. A file is claimed by renaming it before it is read, so when several
+    workers watch the same directory exactly one of them applies it (and shares it with the
+    rest). Polling keeps it dependency-free; a missing directory is simply skipped.
+
+    The *.applied files are also the durable price history: a starting process replays them
+    (applied_batches) in name order, which the stamps make apply order, and batches applied
+    another way (submit) are saved the same way. Once there are more than compact_at of
+    them, compact() merges the history into one file, so replays stay short.
+    """
+
+    def __init__(self, apply: Callable[[dict], dict], directory: str = PRICE_DELTA_DIR,
+                 interval: float = PRICE_DELTA_POLL, compact_at: int = PRICE_DELTA_COMPACT):
+        self.apply = apply
+        self.directory = directory
+        self.interval = interval
+        self.compact_at = compact_at
+        # Stamping and applying happen under one lock, so this process's stamps follow its applies
+        self._lock = threading.Lock()
+        self._last_stamp = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.directory and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="price-delta-watcher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def scan(self) -> int:
+        """Apply every pending delta file; returns how many were applied."""
+        if not os.path.isdir(self.directory):
+            return 0
+        applied = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            claimed = f"{path}.{os.getpid()}.claimed"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                # Another worker claimed it first
+                continue
+            try:
+                with open(claimed, "r") as f:
+                    batch = normalize_batch(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Price delta {name} rejected: {e}")
+                os.replace(claimed, path + ".failed")
+                continue
+            result = self._apply_saved(batch, name, lambda target: os.replace(claimed, target))
+            print(f"Price delta {name} applied: {result}")
+            applied += 1
+        if applied:
+            self.compact()
+        return applied
+
+    def submit(self, batch: dict) -> dict:
+        """
+        Apply a normalized batch that did not come from a delta file (the admin endpoint),
+        saved first as an *.applied file like theirs so it is replayed too; returns apply's result.
+        """
+        if not self.directory:
+            return self.apply(batch)
+        os.makedirs(self.directory, exist_ok=True)
+
+        def save(target):
+            temp = target + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(batch, f)
+            os.replace(temp, target)
+
+        return self._apply_saved(batch, f"admin-{os.getpid()}.json", save)
+
+    def applied_batches(self) -> List[dict]:
+        """Every batch applied so far (*.applied files), in apply order; unreadable files are skipped."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        with self._history_lock(exclusive=False):
+            return [batch for _, batch in self._read_history()]
+
+    def compact(self) -> int:
+        """
+        Merge the *.applied history into one file (merge_batches) once it holds more than
+        compact_at files; returns how many were merged. The merged file is named after the
+        newest one it replaces, so files applied later still sort after it. Skipped while
+        another process compacts.
+        """
+        if not self.directory or not os.path.isdir(self.directory) or len(self._history()) <= self.compact_at:
+            return 0
+        with self._history_lock(exclusive=True, wait=False) as held:
+            if not held:
+                return 0
+            names = self._history()
+            if len(names) <= self.compact_at:
+                return 0
+            merged = merge_batches(batch for _, batch in self._read_history(names))
+            target = os.path.join(self.directory, names[-1][:-len(".applied")] + "~compacted.applied")
+            temp = target + ".tmp"
+            with open(temp, "w") as f:
+                json.dump(merged, f)
+            # The merged file sorts right after the newest original, so replaying originals a
+            # crash left behind before it changes nothing
+            os.replace(temp, target)
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        print(f"Compacted {len(names)} applied price deltas into {os.path.basename(target)}.")
+        return len(names)
+
+    def _apply_saved(self, batch: dict, name: str, save: Callable[[str], None]) -> dict:
+        # Saved before it is applied and shared, so a worker starting meanwhile replays it if
+        # the shared copy reached it too late; the history lock keeps compaction out meanwhile
+        with self._history_lock(exclusive=False), self._lock:
+            target = os.path.join(self.directory, f"{self._stamp()}-{name}.applied")
+            save(target)
+            try:
+                return self.apply(batch)
+            except Exception:
+                os.replace(target, os.path.join(self.directory, name + ".failed"))
+                raise
+
+    def _stamp(self) -> str:
+        # Caller holds _lock. Microseconds, never repeating or going back within this process
+        now = max(int(time.time() * 1e6), self._last_stamp + 1)
+        self._last_stamp = now
+        seconds, micros = divmod(now, 1000000)
+        return time.strftime("%Y%m%dT%H%M%S", time.gmtime(seconds)) + f"{micros:06d}"
+
+    def _history(self) -> List[str]:
+        return sorted(n for n in os.listdir(self.directory) if n.endswith(".applied"))
+
+    def _read_history(self, names: Optional[List[str]] = None):
+        for name in self._history() if names is None else names:
+            try:
+                with open(os.path.join(self.directory, name), "r") as f:
+                    yield name, normalize_batch(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Price delta {name} not replayed: {e}")
+
+    @contextmanager
+    def _history_lock(self, exclusive: bool, wait: bool = True):
+        """
+        flock on <directory>/.lock: saving and replaying share it, compaction holds it alone,
+        so no replay sees a half-compacted history. Yields False if wait is off and it is taken.
+        """
+        if fcntl is None or not self.directory:
+            yield True
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            try:
+                fcntl.flock(fd, flags if wait else flags | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # Repricing runs NumPy passes; keep it off the event loop
+                await loop.run_in_executor(None, self.scan)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Price delta watcher error: {e}")
+            await asyncio.sleep(self.interval)
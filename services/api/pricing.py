@@ -0,0 +1,277 @@
+import bisect
+import copy
+
+import numpy as np
+
+from services.api.columns import CatalogColumns
+
+# Sentinel used by calculate_best_price when an item has no platform prices
+NO_PRICE = 9999.0
+
+
+class PriceIndex:
+    """
+    Precomputed best-price lookup over the catalog's price columns.
+    Coupons are grouped by platform (sorted by min_spend), and every item's best effective
+    price is computed in one vectorized pass into best_eff (aligned with catalog rows) plus
+    the winning price row in best_row. Price/coupon changes only recompute the items they
+    touch; an edited item's rows move into prices_by_item and are priced from there.
+    A live index is never mutated: updated() returns a changed copy to swap in.
+    """
+
+    def __init__(self, catalog=None):
+        cols = catalog.columns if catalog is not None else CatalogColumns()
+        self.catalog = catalog
+        self.columns = cols
+        self.platform_code = {p: i for i, p in enumerate(cols.platforms)}
+        self.coupons_by_platform = {}
+        self._coupon_thresholds = {}
+        # Items edited since load: item_id -> price rows, and their best (eff, platform_info)
+        self.prices_by_item = {}
+        self.edited_best = {}
+        self._rows_by_item = None
+        # Bumped by every applied batch
+        self.version = 0
+
+        self.best_eff = np.full(cols.n_items, NO_PRICE, dtype=np.float64)
+        self.best_row = np.full(cols.n_items, -1, dtype=np.int64)
+
+        for c in cols.coupons:
+            self._put_coupon(c)
+        for platform in self.coupons_by_platform:
+            self._sort_coupons(platform)
+        self._refresh_rows(None)
+
+    # --- lookups ---------------------------------------------------------
+
+    def best_price(self, item_id: str):
+        if item_id in self.prices_by_item:
+            return self.edited_best.get(item_id, (NO_PRICE, None))
+        row = self.catalog.row_of(item_id) if self.catalog is not None else None
+        if row is None:
+            return (NO_PRICE, None)
+        return self._best_at(row)
+
+    def platform_info(self, row: int):
+        """best_platform dict for a catalog row, or None when it has no price."""
+        if self.prices_by_item:
+            item_id = self.columns.item_id[row]
+            if item_id in self.prices_by_item:
+                return self.edited_best.get(item_id, (NO_PRICE, None))[1]
+        return self._best_at(row)[1]
+
+    def price_rows(self, item_id: str) -> list:
+        """The item's current price rows as dicts (edits included); [] when it has none."""
+        return list(self._price_rows(item_id))
+
+    def best_discount(self, platform: str, base: float) -> float:
+        coupons = self.coupons_by_platform.get(platform)
+        if not coupons:
+            return 0.0
+        # Coupons are sorted by min_spend, so the applicable ones are a prefix
+        cutoff = bisect.bisect_right(self._coupon_thresholds[platform], base)
+        discount = 0.0
+        for c in coupons[:cutoff]:
+            val = c["discount_value"]
+            # Treat values < 1.0 as percentages
+            cand_discount = base * val if val < 1.0 else val
+            if cand_discount > discount:
+                discount = cand_discount
+        return discount
+
+    # --- incremental updates ---------------------------------------------
+
+    def updated(self, batch: dict) -> "PriceIndex":
+        """
+        A new index with batch applied, leaving this one untouched so readers holding it
+        keep a consistent view. Only the item columns are copied; coupons and edited
+        rows are small.
+        """
+        new = copy.copy(self)
+        new.best_eff = self.best_eff.copy()
+        new.best_row = self.best_row.copy()
+        new.prices_by_item = dict(self.prices_by_item)
+        new.edited_best = dict(self.edited_best)
+        new.coupons_by_platform = {p: list(c) for p, c in self.coupons_by_platform.items()}
+        new._coupon_thresholds = dict(self._coupon_thresholds)
+        new.apply_batch(batch)
+        return new
+
+    def apply_batch(self, batch: dict) -> set:
+        """
+        Apply a delta batch in place and return the item ids whose price rows changed.
+        Batch keys (all optional): remove_coupons [code], coupons [coupon], remove_prices
+        [{item_id, platform_name}], prices [price row]; removals run before upserts.
+        Coupon changes reprice every item on their platforms, in one vectorized pass.
+        """
+        platforms = set()
+        for code in batch.get("remove_coupons") or []:
+            old = self._pop_coupon(code)
+            if old is not None:
+                platforms.add(old["platform"])
+        for coupon in batch.get("coupons") or []:
+            # Coupons are keyed by code, so an upsert may move one between platforms
+            old = self._pop_coupon(coupon["code"])
+            if old is not None:
+                platforms.add(old["platform"])
+            self._put_coupon(coupon)
+            platforms.add(coupon["platform"])
+        for platform in platforms:
+            self._sort_coupons(platform)
+
+        items = set()
+        for r in batch.get("remove_prices") or []:
+            rows = self._price_rows(r["item_id"])
+            self.prices_by_item[r["item_id"]] = [p for p in rows if p["platform_name"] != r["platform_name"]]
+            items.add(r["item_id"])
+        for price in batch.get("prices") or []:
+            rows = [p for p in self._price_rows(price["item_id"]) if p["platform_name"] != price["platform_name"]]
+            rows.append(price)
+            self.prices_by_item[price["item_id"]] = rows
+            items.add(price["item_id"])
+
+        if platforms:
+            self._recompute_platforms(platforms)
+        for item_id in items:
+            self._recompute(item_id)
+        self.version += 1
+        return items
+
+    # --- internals -------------------------------------------------------
+
+    def _best_at(self, row: int):
+        prow = self.best_row[row]
+        if prow < 0:
+            return (NO_PRICE, None)
+        cols = self.columns
+        platform = cols.platforms[cols.price_platform[prow]]
+        base = float(cols.price_base[prow])
+        fee = float(cols.price_fee[prow])
+        discount = self.best_discount(platform, base)
+        eff = base - discount + fee
+        return (eff, {
+            "platform": platform,
+            "base_price": base,
+            "delivery_fee": fee,
+            "discount": discount,
+            "effective_price": eff
+        })
+
+    def _price_rows(self, item_id: str):
+        """Price rows for item_id as dicts: the edited copy, or the item's rows from the columns."""
+        if item_id in self.prices_by_item:
+            return self.prices_by_item[item_id]
+        row = self.catalog.row_of(item_id) if self.catalog is not None else None
+        if row is None:
+            return []
+        if self._rows_by_item is None:
+            # Price rows grouped by item (CSR), built the first time an item is edited
+            order = np.argsort(self.columns.price_item_row, kind="stable")
+            starts = np.searchsorted(self.columns.price_item_row[order], np.arange(self.columns.n_items + 1))
+            self._rows_by_item = (order, starts)
+        order, starts = self._rows_by_item
+        cols = self.columns
+        return [
+            {"item_id": item_id, "platform_name": cols.platforms[cols.price_platform[p]],
+             "base_price": float(cols.price_base[p]), "delivery_fee": float(cols.price_fee[p])}
+            for p in order[starts[row]:starts[row + 1]]
+        ]
+
+    def _put_coupon(self, coupon: dict):
+        self.coupons_by_platform.setdefault(coupon["platform"], []).append(coupon)
+
+    def _pop_coupon(self, code: str):
+        for platform, coupons in self.coupons_by_platform.items():
+            for i, c in enumerate(coupons):
+                if c["code"] == code:
+                    return coupons.pop(i)
+        return None
+
+    def _sort_coupons(self, platform: str):
+        coupons = self.coupons_by_platform.get(platform, [])
+        coupons.sort(key=lambda c: c["min_spend"])
+        self._coupon_thresholds[platform] = [c["min_spend"] for c in coupons]
+
+    def _recompute_platforms(self, platforms):
+        codes = [self.platform_code[p] for p in platforms if p in self.platform_code]
+        if codes:
+            cols = self.columns
+            items = cols.price_item_row[np.isin(cols.price_platform, codes)]
+            self._refresh_rows(np.unique(items[items >= 0]))
+        for item_id, rows in self.prices_by_item.items():
+            if any(p["platform_name"] in platforms for p in rows):
+                self._recompute(item_id)
+
+    def _refresh_rows(self, item_rows):
+        """Vectorized best price for item_rows (None = every item) straight from the price columns."""
+        cols = self.columns
+        if item_rows is None:
+            prows = np.flatnonzero(cols.price_item_row >= 0)
+            self.best_eff.fill(NO_PRICE)
+            self.best_row.fill(-1)
+        else:
+            prows = np.flatnonzero(np.isin(cols.price_item_row, item_rows))
+            self.best_eff[item_rows] = NO_PRICE
+            self.best_row[item_rows] = -1
+        if prows.size:
+            base = cols.price_base[prows]
+            platform = cols.price_platform[prows]
+            discount = np.zeros(prows.size, dtype=np.float64)
+            for name, coupons in self.coupons_by_platform.items():
+                code = self.platform_code.get(name)
+                if code is None:
+                    continue
+                on_platform = platform == code
+                for c in coupons:
+                    val = c["discount_value"]
+                    # Treat values < 1.0 as percentages
+                    cand = base * val if val < 1.0 else np.full(prows.size, val)
+                    hit = on_platform & (base >= c["min_spend"]) & (cand > discount)
+                    discount[hit] = cand[hit]
+            eff = base - discount + cols.price_fee[prows]
+            items = cols.price_item_row[prows]
+            # Group by item, cheapest first, earliest row on ties (the old scan's strict <)
+            order = np.lexsort((prows, eff, items))
+            items, eff, prows = items[order], eff[order], prows[order]
+            first = np.ones(items.size, dtype=bool)
+            first[1:] = items[1:] != items[:-1]
+            first &= eff < NO_PRICE
+            self.best_eff[items[first]] = eff[first]
+            self.best_row[items[first]] = prows[first]
+        # Edited items are priced from prices_by_item, not the columns
+        for item_id in self.prices_by_item:
+            row = self.catalog.row_of(item_id)
+            if row is not None and (item_rows is None or np.isin(row, item_rows)):
+                self.best_eff[row] = self.edited_best.get(item_id, (NO_PRICE, None))[0]
+                self.best_row[row] = -1
+
+    def _recompute(self, item_id: str):
+        best_eff_price = NO_PRICE
+        best_platform = None
+
+        for p in self.prices_by_item.get(item_id, []):
+            base = p["base_price"]
+            fee = p["delivery_fee"]
+            platform = p["platform_name"]
+
+            discount = self.best_discount(platform, base)
+            eff = base - discount + fee
+            if eff < best_eff_price:
+                best_eff_price = eff
+                best_platform = {
+                    "platform": platform,
+                    "base_price": base,
+                    "delivery_fee": fee,
+                    "discount": discount,
+                    "effective_price": eff
+                }
+
+        if best_platform is None:
+            self.edited_best.pop(item_id, None)
+        else:
+            self.edited_best[item_id] = (best_eff_price, best_platform)
+
+        row = self.catalog.row_of(item_id) if self.catalog is not None else None
+        if row is not None:
+            self.best_eff[row] = best_eff_price
+            self.best_row[row] = -1
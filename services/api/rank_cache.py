@@ -0,0 +1,64 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+RANK_CACHE_SIZE = int(os.getenv("RANK_CACHE_SIZE", "50000"))
+
+# Stands in for the user in keys of rankings that do not depend on who asked
+ANONYMOUS = "anonymous"
+
+
+class RankCache:
+    """
+    LRU cache of finished rankings (the top-k result dicts for /message).
+    Keys carry everything a ranking depends on: the parsed constraints, k, the price
+    version and either the user's weight version (which includes the weights' decay step,
+    see UserWeightCache) or ANONYMOUS when the user's weights do not touch any catalog tag,
+    so all such users share one entry per query.
+    Versions only ever move forward, so invalidation is exact and stale entries just
+    age out. Cached lists are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = RANK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.anonymous_hits = 0
+
+    @staticmethod
+    def key(constraints: dict, k: int, price_version: int, user_version) -> tuple:
+        return (tuple(sorted(constraints["tags"])), constraints["budget"], constraints["max_calories"],
+                constraints["min_protein"], k, price_version, user_version)
+
+    def get(self, key: Hashable) -> Optional[list]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if key[-1] == ANONYMOUS:
+                self.anonymous_hits += 1
+            return value
+
+    def put(self, key: Hashable, value: list):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "anonymous_hits": self.anonymous_hits,
+                    "entries": len(self._entries)}
@@ -0,0 +1,207 @@
+import copy
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from services.api.catalog import Catalog
+from services.api.features import FeatureTable
+from services.api.preferences import UserPreferences
+from services.api.pricing import NO_PRICE
+from services.api.sharding import SHARD_MIN_ITEMS
+
+# Upper bound on the (users x candidates) score matrix built per top_k_batch chunk
+BATCH_SCORE_CELLS = 4_000_000
+
+
+class ScoringEngine:
+    """
+    Columnar view of the menu catalog used by handle_message.
+    Effective price, protein and a tag membership matrix are held as NumPy arrays, and the
+    non-personal part of the score comes precomputed from a FeatureTable (services.api.features).
+    Required tags intersect per-tag row postings, the budget filter and score run as
+    single vectorized passes, and top-k is selected with argpartition instead of
+    sorting every surviving item.
+    """
+
+    def __init__(self, catalog=None, price_index=None, score_weights=None):
+        self.catalog = catalog if catalog is not None else Catalog()
+        cols = self.catalog.columns
+        n = cols.n_items
+
+        # Columns follow the catalog's tag vocabulary; postings are the catalog's per-tag rows
+        self.tag_index = {t: col for col, t in enumerate(cols.tag_vocab)}
+        self.postings = self.catalog.postings()
+
+        self.protein = cols.item_protein.astype(np.float64)
+        self.calories = cols.item_calories.astype(np.float64)
+        # 0/1 membership as uint8 (an eighth of float64); the dot product upcasts the candidate rows only
+        self.tag_matrix = np.zeros((n, len(self.tag_index)), dtype=np.uint8)
+        self.tag_matrix[np.repeat(np.arange(n), np.diff(cols.item_tag_offsets)), cols.item_tag_codes] = 1
+
+        # Weighted price/protein/rating/... features, folded into one base column per price snapshot
+        self.features = FeatureTable(self.catalog, score_weights)
+
+        self.price_index = None
+        self.eff_price = np.full(n, NO_PRICE, dtype=np.float64)
+        # Engine column per preference-vocabulary slot (-1: not a catalog tag), grown on demand
+        self._slot_columns = np.empty(0, dtype=np.int64)
+        # Optional ShardedScorer (services.api.sharding) for catalogs too large to scan in-process
+        self.sharded = None
+        if price_index is not None:
+            self.refresh_prices(price_index)
+
+    def __len__(self):
+        return len(self.eff_price)
+
+    def refresh_prices(self, price_index):
+        """
+        Point the effective-price column at price_index.best_eff (shared, not copied) and
+        recompute the feature table's base scores for it. Live indexes are never mutated, so
+        the two stay in step.
+        """
+        self.price_index = price_index
+        self.eff_price = price_index.best_eff
+        self.features = self.features.with_prices(price_index.best_eff)
+
+    def with_prices(self, price_index) -> "ScoringEngine":
+        """Shallow copy reading prices from price_index; the catalog columns stay shared."""
+        engine = copy.copy(self)
+        engine.refresh_prices(price_index)
+        return engine
+
+    def item(self, row: int):
+        return self.catalog.item_at(row)
+
+    def platform_info(self, row: int):
+        return self.price_index.platform_info(row) if self.price_index is not None else None
+
+    def weight_vector(self, user_weights):
+        """Weights aligned with tag_matrix columns, from UserPreferences or a {tag: weight} dict."""
+        vec = np.zeros(len(self.tag_index), dtype=np.float64)
+        if isinstance(user_weights, UserPreferences):
+            # One gather from the stored vector; slots that are not catalog tags are dropped
+            values = user_weights.values
+            cols = self._columns_for(user_weights.vocab, len(values))
+            keep = cols >= 0
+            vec[cols[keep]] = values[keep]
+            return vec
+        for tag, w in user_weights.items():
+            col = self.tag_index.get(tag)
+            if col is not None:
+                vec[col] = w
+        return vec
+
+    def _columns_for(self, vocab, size: int) -> np.ndarray:
+        cols = self._slot_columns
+        if len(cols) < size:
+            # The vocabulary only grows, so known slots keep their columns
+            extra = []
+            for tag in vocab.tags[len(cols):size]:
+                if tag is None:
+                    break
+                extra.append(self.tag_index.get(tag, -1))
+            cols = self._slot_columns = np.concatenate([cols, np.asarray(extra, dtype=np.int64)])
+            if len(cols) < size:
+                # Slots this process has not loaded yet carry no catalog tag for now (not cached)
+                cols = np.concatenate([cols, np.full(size - len(cols), -1, dtype=np.int64)])
+        return cols[:size]
+
+    def candidate_rows(self, required_tags=(), budget=None, max_calories=None, min_protein=None):
+        if required_tags:
+            # Intersect tag posting lists, shortest first, instead of testing every row
+            postings = sorted((self.postings.get(t) for t in set(required_tags)),
+                              key=lambda p: -1 if p is None else p.size)
+            if postings[0] is None:
+                # Nobody carries this tag, so nothing can satisfy the filter
+                return np.empty(0, dtype=np.int64)
+            rows = postings[0]
+            for p in postings[1:]:
+                rows = np.intersect1d(rows, p, assume_unique=True)
+        else:
+            rows = np.arange(len(self), dtype=np.int64)
+
+        prices = self.eff_price[rows]
+        keep = prices != NO_PRICE
+        if budget:
+            keep &= prices <= budget
+        if max_calories:
+            keep &= self.calories[rows] <= max_calories
+        if min_protein:
+            keep &= self.protein[rows] >= min_protein
+        return rows[keep]
+
+    def scores(self, user_weights, rows=None):
+        if rows is None:
+            rows = slice(None)
+        # score = sum(score weight * feature) + user_pref_weights(tags); the first term is precomputed
+        return self.features.base[rows] + self.tag_matrix[rows] @ self.weight_vector(user_weights)
+
+    def top_k(self, user_weights, required_tags=(), budget=None, k=3, max_calories=None, min_protein=None):
+        """Return [(row, score)] for the k best candidates, highest score first."""
+        if self.sharded is not None and self._wide_scan(required_tags):
+            cols = [self.tag_index.get(t) for t in set(required_tags)]
+            if None in cols:
+                return []
+            try:
+                return self.sharded.top_k(self, self.weight_vector(user_weights), cols, budget, k,
+                                          max_calories, min_protein)
+            except BrokenProcessPool:
+                # A scoring worker died (the pool restarts itself); score this query here
+                pass
+        rows = self.candidate_rows(required_tags, budget, max_calories, min_protein)
+        if rows.size == 0:
+            return []
+        return select_top_k(rows, self.scores(user_weights, rows), k)
+
+    def _wide_scan(self, required_tags) -> bool:
+        """True when the tag filter leaves enough rows that shards beat one posting intersection."""
+        if not required_tags:
+            return len(self) >= SHARD_MIN_ITEMS
+        postings = [self.postings.get(t) for t in set(required_tags)]
+        return all(p is not None for p in postings) and min(p.size for p in postings) >= SHARD_MIN_ITEMS
+
+    def top_k_batch(self, weights_list, required_tags=(), budget=None, k=3, max_calories=None, min_protein=None):
+        """
+        top_k for many users sharing one set of constraints: candidates are filtered once and
+        scored for all users as one (users x tags) @ (tags x rows) product, chunked over users
+        so the score matrix stays under BATCH_SCORE_CELLS.
+        """
+        rows = self.candidate_rows(required_tags, budget, max_calories, min_protein)
+        if rows.size == 0 or not weights_list:
+            return [[] for _ in weights_list]
+        base = self.features.base[rows]
+        tags_t = self.tag_matrix[rows].T.astype(np.float64)
+        per_chunk = max(1, BATCH_SCORE_CELLS // rows.size)
+        results = []
+        for start in range(0, len(weights_list), per_chunk):
+            chunk = weights_list[start:start + per_chunk]
+            # One row of scores per user, so the per-user work below runs on contiguous memory
+            weights = np.stack([self.weight_vector(w) for w in chunk])
+            scores = base + weights @ tags_t
+            if rows.size <= k:
+                results.extend(select_top_k(rows, user_scores, k) for user_scores in scores)
+                continue
+            # k-th best score per user in one partition, then only rows reaching it (ties included)
+            kth = np.partition(scores, rows.size - k, axis=1)[:, rows.size - k]
+            hit_users, hit_rows = np.nonzero(scores >= kth[:, None])
+            bounds = np.searchsorted(hit_users, np.arange(len(chunk) + 1))
+            for j in range(len(chunk)):
+                sel = hit_rows[bounds[j]:bounds[j + 1]]
+                results.append(select_top_k(rows[sel], scores[j, sel], k))
+        return results
+
+
+def select_top_k(rows, scores, k):
+    """
+    Pick the k highest scores with argpartition, breaking ties by catalog order
+    so results match a stable descending sort over the full list.
+    """
+    if rows.size == 0 or k <= 0:
+        return []
+    if rows.size > k:
+        winners = np.argpartition(-scores, k - 1)[:k]
+        # Keep everything tied with the k-th score so the tie-break below stays exact
+        keep = scores >= scores[winners].min()
+        rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))[:k]
+    return [(int(rows[i]), float(scores[i])) for i in order]
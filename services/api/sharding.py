@@ -0,0 +1,210 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+
+from services.api.pricing import NO_PRICE
+
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "0"))  # 0 disables sharded scoring
+SHARD_MIN_ITEMS = int(os.getenv("SHARD_MIN_ITEMS", "200000"))  # smaller catalogs score in-process
+# Pool rebuilds after a worker died before sharded scoring is given up for in-process scoring
+SHARD_POOL_RESTARTS = int(os.getenv("SHARD_POOL_RESTARTS", "3"))
+
+
+def _share(array: np.ndarray) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm
+
+
+class _PriceSegment:
+    __slots__ = ("version", "shm", "refs", "retired")
+
+    def __init__(self, version: int, shm: shared_memory.SharedMemory):
+        self.version = version
+        self.shm = shm
+        self.refs = 0
+        self.retired = False
+
+
+class ShardedScorer:
+    """
+    Runs ScoringEngine.top_k across a process pool. The static columns (protein, calories,
+    tag matrix) are copied once into shared memory; each worker maps them and scores a
+    contiguous row range, returning its local top-k, and the coordinator merges those with
+    the same tie-break as select_top_k, so results match in-process scoring exactly.
+    Effective prices (and the feature table's base scores built from them) change with every
+    price reload, so each price version gets its own segment, published on first use and
+    unlinked once no query still reads it.
+    A worker that dies breaks the whole pool: the query in flight raises BrokenProcessPool
+    (ScoringEngine.top_k then scores it in-process) and the pool is rebuilt, up to
+    SHARD_POOL_RESTARTS times; after that every query raises it and is scored in-process.
+    """
+
+    def __init__(self, engine, workers: int = SCORING_WORKERS):
+        self.workers = workers
+        self.n = len(engine)
+        self.n_tags = len(engine.tag_index)
+        bounds = np.linspace(0, self.n, workers + 1).astype(np.int64)
+        self.shards = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+        self._static = {
+            "protein": _share(engine.protein),
+            "calories": _share(engine.calories),
+            "tags": _share(engine.tag_matrix),
+        }
+        self._layout = {name: shm.name for name, shm in self._static.items()}
+        self._prices: Dict[int, _PriceSegment] = {}
+        self._current: Optional[_PriceSegment] = None
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self.pool = self._new_pool()
+
+    def top_k(self, engine, weights: np.ndarray, tag_cols, budget=None, k=3, max_calories=None, min_protein=None):
+        """[(row, score)] for the k best rows, scored on the pool against engine's prices."""
+        # Imported here: scoring imports this module for SHARD_MIN_ITEMS
+        from services.api.scoring import select_top_k
+
+        pool = self.pool
+        if pool is None:
+            raise BrokenProcessPool("sharded scoring is disabled")
+        segment = self._acquire(engine)
+        try:
+            futures = [
+                pool.submit(_score_shard, segment.shm.name, lo, hi, weights, tag_cols,
+                            budget, max_calories, min_protein, k)
+                for lo, hi in self.shards
+            ]
+            parts = [f.result() for f in futures]
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            raise
+        finally:
+            self._release(segment)
+        rows = np.concatenate([p[0] for p in parts])
+        scores = np.concatenate([p[1] for p in parts])
+        return select_top_k(rows, scores, k)
+
+    def close(self):
+        with self._lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            segments = list(self._prices.values())
+            self._prices.clear()
+            self._current = None
+        for shm in list(self._static.values()) + [s.shm for s in segments]:
+            shm.close()
+            shm.unlink()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the server process has threads (event writer, coach jobs) by now
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=get_context("spawn"),
+            initializer=_worker_init, initargs=(self._layout, self.n, self.n_tags),
+        )
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self.pool is not broken:
+                # Another query saw the same failure and already replaced it
+                return
+            if self.restarts < SHARD_POOL_RESTARTS:
+                self.restarts += 1
+                self.pool = self._new_pool()
+                print(f"Scoring pool broke; restarted it ({self.restarts}/{SHARD_POOL_RESTARTS}).")
+            else:
+                self.pool = None
+                print("Scoring pool broke too often; scoring in-process from now on.")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self, engine) -> _PriceSegment:
+        version = engine.price_index.version if engine.price_index is not None else 0
+        with self._lock:
+            segment = self._prices.get(version)
+            if segment is None:
+                segment = self._prices[version] = _PriceSegment(
+                    version, _share(np.stack([engine.eff_price, engine.features.base])))
+                if self._current is None or version > self._current.version:
+                    if self._current is not None:
+                        self._retire(self._current)
+                    self._current = segment
+                else:
+                    # A query still holding an older engine; drop its segment when done
+                    segment.retired = True
+            segment.refs += 1
+            return segment
+
+    def _release(self, segment: _PriceSegment):
+        with self._lock:
+            segment.refs -= 1
+            if segment.retired:
+                self._retire(segment)
+
+    def _retire(self, segment: _PriceSegment):
+        # Caller holds _lock. Unlinking only removes the name; workers' mappings stay valid.
+        segment.retired = True
+        if segment.refs == 0 and self._prices.get(segment.version) is segment:
+            del self._prices[segment.version]
+            segment.shm.close()
+            segment.shm.unlink()
+
+
+# --- worker side -------------------------------------------------------------
+# Spawned workers report to the coordinator's resource tracker, so attaching here does not
+# transfer ownership: segments are unlinked by ShardedScorer, or by the tracker if it dies.
+
+_static = {}
+_price_cache = {}
+
+
+def _worker_init(layout: dict, n: int, n_tags: int):
+    segments = {name: shared_memory.SharedMemory(name=shm_name) for name, shm_name in layout.items()}
+    _static["segments"] = segments
+    _static["protein"] = np.ndarray((n,), dtype=np.float64, buffer=segments["protein"].buf)
+    _static["calories"] = np.ndarray((n,), dtype=np.float64, buffer=segments["calories"].buf)
+    _static["tags"] = np.ndarray((n, n_tags), dtype=np.uint8, buffer=segments["tags"].buf)
+    _static["n"] = n
+
+
+def _price_view(name: str) -> np.ndarray:
+    """(2, n) view of a price segment: effective prices, then base scores."""
+    hit = _price_cache.get(name)
+    if hit is None:
+        # Keep only the latest price segment mapped; the coordinator unlinks superseded ones
+        while _price_cache:
+            _, (old_shm, old_view) = _price_cache.popitem()
+            del old_view  # the buffer cannot be closed while an array still exports it
+            old_shm.close()
+        shm = shared_memory.SharedMemory(name=name)
+        hit = _price_cache[name] = (shm, np.ndarray((2, _static["n"]), dtype=np.float64, buffer=shm.buf))
+    return hit[1]
+
+
+def _score_shard(prices_name, lo, hi, weights, tag_cols, budget, max_calories, min_protein, k):
+    from services.api.scoring import select_top_k
+
+    prices = _price_view(prices_name)
+    eff, base = prices[0, lo:hi], prices[1, lo:hi]
+    tags = _static["tags"][lo:hi]
+    # Same filters and formula as ScoringEngine.candidate_rows / scores, over this row range
+    keep = eff != NO_PRICE
+    for col in tag_cols:
+        keep &= tags[:, col] == 1
+    if budget:
+        keep &= eff <= budget
+    if max_calories:
+        keep &= _static["calories"][lo:hi] <= max_calories
+    if min_protein:
+        keep &= _static["protein"][lo:hi] >= min_protein
+    local = np.flatnonzero(keep)
+    if local.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    scores = base[local] + tags[local] @ weights
+    top = select_top_k(local + lo, scores, k)
+    return (np.array([r for r, _ in top], dtype=np.int64), np.array([s for _, s in top], dtype=np.float64))
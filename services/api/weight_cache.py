@@ -0,0 +1,142 @@
+import itertools
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from services.api.preferences import TagVocabulary, UserPreferences
+
+WEIGHT_CACHE_SIZE = int(os.getenv("WEIGHT_CACHE_SIZE", "10000"))
+WEIGHT_CACHE_TTL = float(os.getenv("WEIGHT_CACHE_TTL", "300"))  # seconds
+LOCK_STRIPES = 64
+
+
+class UserWeightCache:
+    """
+    Per-user preference vectors (UserPreferences) held in process as an LRU with TTL in front
+    of the user_vectors table. Misses load from SQLite; writes go to SQLite first and then
+    replace the cached vector (immutable, so readers never see a half-applied update).
+    Updates re-read the stored vector in one SQLite write transaction, so concurrent feedback
+    can't lose updates even across worker processes; lock(user_id) additionally queues them
+    within a process. Locks are striped to keep their number bounded.
+    Every stored vector gets a fresh version from a process-wide counter. Reads return the
+    vector decayed to the current decay step (UserPreferences.decayed) with (version, step)
+    as its version, so a version never names two different weight sets and can key derived
+    caches (see rank_cache).
+    """
+
+    def __init__(self, db, max_entries: int = WEIGHT_CACHE_SIZE, ttl: float = WEIGHT_CACHE_TTL):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.vocab = TagVocabulary(db)
+        self._entries = OrderedDict()  # user_id -> (UserPreferences, loaded_at, version)
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stripes = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def lock(self, user_id: str):
+        stripe = self._stripes[zlib.crc32(user_id.encode("utf-8")) % LOCK_STRIPES]
+        with stripe:
+            yield
+
+    def get(self, user_id: str) -> UserPreferences:
+        """Preferences for user_id, decayed to now (shared; immutable)."""
+        return self.get_versioned(user_id)[0]
+
+    def get_versioned(self, user_id: str):
+        """(weights decayed to now, version) for user_id; the version changes whenever the weights may have."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return self._aged(entry[0], entry[2], now)
+            self.misses += 1
+
+        return self._aged(*self._store(user_id, self._load(self.db.get_user_vector(user_id)), now), now)
+
+    def get_many(self, user_ids) -> dict:
+        """user_id -> preferences decayed to now for every id; all misses are loaded from SQLite in one query."""
+        now = time.time()
+        out, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in out:
+                    continue
+                entry = self._entries.get(user_id)
+                if entry is not None and now - entry[1] <= self.ttl:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    out[user_id] = self._aged(entry[0], entry[2], now)[0]
+                else:
+                    self.misses += 1
+                    out[user_id] = None
+                    missing.append(user_id)
+
+        if missing:
+            rows = self.db.get_many_user_vectors(missing)
+            for user_id in missing:
+                out[user_id] = self._aged(*self._store(user_id, self._load(rows.get(user_id)), now), now)[0]
+        return out
+
+    def update(self, user_id: str, deltas: dict) -> UserPreferences:
+        """
+        Write-through: decay, add deltas ({tag: delta}) and clip (UserPreferences.updated) the
+        stored vector, re-read inside the write transaction so updates from other processes
+        are never overwritten, then cache what was committed. Call under lock(user_id).
+        """
+        # New tags get their vocabulary slots first; add_tags would block on the write lock
+        self.vocab.slots(deltas)
+        committed = []
+
+        def apply(row):
+            prefs = self._load(row).updated(deltas, time.time())
+            committed.append(prefs)
+            return prefs.to_blob(), prefs.updated_at
+
+        self.db.update_user_vector(user_id, apply)
+        # Stamped after the commit: a load that read the row before it must lose to this entry
+        return self._store(user_id, committed[-1], time.time())[0]
+
+    def invalidate(self, user_id: str = None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    @staticmethod
+    def _aged(weights: UserPreferences, version: int, now: float):
+        # Cached entries hold the stored vector; each read ages it to the current decay step
+        steps = weights.decay_steps(now)
+        return weights.decayed(steps), (version, steps)
+
+    def _load(self, row) -> UserPreferences:
+        if row is None:
+            return UserPreferences.empty(self.vocab)
+        return UserPreferences.from_blob(self.vocab, *row)
+
+    def _store(self, user_id: str, weights: UserPreferences, loaded_at: float):
+        """Cache weights unless a newer entry exists; returns the (weights, version) now cached."""
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is not None and current[1] > loaded_at:
+                # A write landed while this load was reading SQLite; keep the newer vector
+                return current[0], current[2]
+            version = next(self._versions)
+            self._entries[user_id] = (weights, loaded_at, version)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return weights, version
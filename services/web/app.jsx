@@ -2,6 +2,9 @@ const { useState, useEffect } = React;
 
 const API_BASE = "http://localhost:8000";
 
+// Streamed clips are served by the API ("/audio/stream/..."); cached clips are static files
+const audioSrc = (url) => (url && url.startsWith("/") ? `${API_BASE}${url}` : url);
+
 function App() {
   const [userId] = useState("web_user_" + Math.floor(Math.random() * 1000000));
   const [query, setQuery] = useState("");
@@ -98,7 +101,7 @@ function App() {
              <div className="coach-section">
                <div className="coach-text">💬 "{results.coach_text}"</div>
                {results.coach_audio_url && (
-                 <audio controls autoPlay src={results.coach_audio_url} style={{width: '100%', height: '40px', marginTop: '10px'}}>
+                 <audio controls autoPlay src={audioSrc(results.coach_audio_url)} style={{width: '100%', height: '40px', marginTop: '10px'}}>
                    Your browser does not support the audio element.
                  </audio>
                )}
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+from services.api import main
+
+REPO_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.fixture
+def app_dirs(tmp_path, monkeypatch):
+    """Run the app on the demo catalog, with the files it writes under tmp_path."""
+    # Those default to paths relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "CATALOG_DIR", REPO_DATA)
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(main.delta_watcher, "directory", str(tmp_path / "deltas"))
+    monkeypatch.setattr(main.delta_watcher, "interval", 0)
+    # Coach text and audio fall back to the local template instead of calling upstreams
+    monkeypatch.delenv("AIRIA_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    return tmp_path
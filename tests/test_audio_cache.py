@@ -0,0 +1,101 @@
+import asyncio
+import types
+
+import pytest
+
+from services.api import metrics, modulate_wrapper
+from services.api.modulate_wrapper import AudioCache
+
+
+def write_clip(cache, key, data=b"mp3"):
+    temp = cache.temp_path(key)
+    with open(temp, "wb") as f:
+        f.write(data)
+    return cache.commit(key, temp)
+
+
+def test_contains_counts_nothing(tmp_path):
+    cache = AudioCache(str(tmp_path))
+    write_clip(cache, "a")
+    write_clip(cache, "b")
+    assert cache.contains("a")
+    assert not cache.contains("missing")
+    assert cache.stats()["hits"] == 0
+    # The LRU order is untouched too: "a" is still evicted first
+    cache.max_bytes = 6
+    write_clip(cache, "c")
+    assert not cache.contains("a")
+    assert cache.contains("b") and cache.contains("c")
+
+
+def test_cached_stream_request_counts_one_hit(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path))
+    monkeypatch.setattr(modulate_wrapper, "audio_cache", cache)
+    write_clip(cache, "a")
+
+    async def fetch():
+        assert modulate_wrapper.has_voice_stream("a")
+        return b"".join([chunk async for chunk in await modulate_wrapper.open_voice_stream("a")])
+
+    assert asyncio.run(fetch()) == b"mp3"
+    assert cache.stats()["hits"] == 1
+
+
+def test_waiters_on_a_failed_synthesis_get_an_error(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path))
+    monkeypatch.setattr(modulate_wrapper, "audio_cache", cache)
+
+    async def scenario():
+        # A leading stream request is synthesizing the clip when a second one arrives
+        cache.claim("a")
+        waiter = asyncio.ensure_future(modulate_wrapper.open_voice_stream("a"))
+        await asyncio.sleep(0)
+        cache.release("a", "")
+        with pytest.raises(modulate_wrapper.VoiceStreamError):
+            await waiter
+
+    asyncio.run(scenario())
+
+
+class FakeSpeech:
+    """Stands in for client.audio.speech.with_streaming_response."""
+
+    def create(self, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def iter_bytes(self):
+        for chunk in (b"mp", b"3"):
+            yield chunk
+
+
+def tts_stage_count():
+    prefix = 'foodpo_stage_seconds_count{endpoint="audio_stream",stage="tts"} '
+    lines = [line for line in metrics.render().splitlines() if line.startswith(prefix)]
+    return float(lines[0][len(prefix):]) if lines else 0.0
+
+
+def test_stream_synthesis_is_timed_as_a_tts_stage(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path))
+    monkeypatch.setattr(modulate_wrapper, "audio_cache", cache)
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    client = types.SimpleNamespace(audio=types.SimpleNamespace(
+        speech=types.SimpleNamespace(with_streaming_response=FakeSpeech())))
+    monkeypatch.setattr(modulate_wrapper, "get_async_client", lambda: client)
+    before = tts_stage_count()
+
+    async def fetch():
+        monkeypatch.setattr(modulate_wrapper, "_async_limit", asyncio.Semaphore(1))
+        url = modulate_wrapper.prepare_voice_stream("Hello", "gentle")
+        key = url.rsplit("/", 1)[1]
+        return b"".join([chunk async for chunk in await modulate_wrapper.open_voice_stream(key)]), key
+
+    body, key = asyncio.run(fetch())
+    assert body == b"mp3"
+    assert cache.contains(key)
+    assert tts_stage_count() == before + 1
@@ -0,0 +1,42 @@
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from services.api import main
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def test_events_of_an_old_database_are_imported_once(app_dirs):
+    (app_dirs / "services" / "api").mkdir(parents=True)
+    conn = sqlite3.connect(main.DB_PATH)
+    conn.execute('''
+        CREATE TABLE events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            action TEXT,
+            item_id TEXT,
+            details TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany("INSERT INTO events (user_id, action, item_id, details, timestamp) VALUES (?, ?, ?, ?, ?)", [
+        ("u1", "message", None, "something spicy", "2024-01-02 03:04:05"),
+        ("u1", "feedback", "m11", "Rating: 5", "2024-01-02 03:04:06"),
+        ("u2", "message", None, "salad", "2024-01-02 03:04:07"),
+    ])
+    conn.commit()
+    conn.close()
+
+    for _ in range(2):
+        with TestClient(main.app) as client:
+            body = client.get("/admin/events/u1", headers=ADMIN).json()
+        assert [(e["ts"], e["action"], e["item_id"], e["details"]) for e in body["events"]] == [
+            (1704164645.0, "message", None, "something spicy"),
+            (1704164646.0, "feedback", "m11", "Rating: 5"),
+        ]
+        assert body["totals"]["message"]["events"] == 1
+
+    conn = sqlite3.connect(main.DB_PATH)
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'events'").fetchone() is None
+    conn.close()
@@ -0,0 +1,80 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from services.api import main
+from services.api.catalog import Catalog
+from services.api.price_updates import merge_batches, normalize_batch
+from services.api.pricing import PriceIndex
+
+from tests.conftest import REPO_DATA
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+def price(item_id, platform, base, fee):
+    return {"item_id": item_id, "platform_name": platform, "base_price": base, "delivery_fee": fee}
+
+
+def test_price_batches_survive_a_restart_in_apply_order(app_dirs):
+    deltas = app_dirs / "deltas"
+    deltas.mkdir()
+    with TestClient(main.app) as client:
+        base = main.calculate_best_price("m11")[0]
+        # An ordinary delta file first, then an admin batch for the same price row
+        with open(deltas / "prices.json", "w") as f:
+            json.dump({"prices": [price("m11", "UberEats", 0.1, 0.1)]}, f)
+        assert main.delta_watcher.scan() == 1
+        assert main.calculate_best_price("m11")[0] == pytest.approx(0.2)
+        r = client.post("/admin/prices", json={"prices": [price("m11", "UberEats", 1.0, 0.5)]}, headers=ADMIN)
+        assert r.status_code == 200
+        applied = main.calculate_best_price("m11")
+        assert applied[0] == pytest.approx(1.5)
+
+    with TestClient(main.app):
+        assert main.calculate_best_price("m11") == applied
+        assert base != pytest.approx(applied[0])
+
+
+def test_long_history_is_compacted_without_changing_prices(app_dirs, monkeypatch):
+    monkeypatch.setattr(main.delta_watcher, "compact_at", 2)
+    batches = [
+        {"prices": [price("m11", "UberEats", 1.0, 0.5)]},
+        {"coupons": [{"code": "TEST1", "platform": "UberEats", "discount_value": 0.25, "min_spend": 0.0}]},
+        {"remove_prices": [{"item_id": "m13", "platform_name": "DoorDash"}]},
+        {"prices": [price("m11", "UberEats", 2.0, 0.5)], "remove_coupons": ["TEST1"]},
+    ]
+    with TestClient(main.app) as client:
+        for batch in batches:
+            assert client.post("/admin/prices", json=batch, headers=ADMIN).status_code == 200
+        applied = {item_id: main.calculate_best_price(item_id) for item_id in ("m11", "m13")}
+
+    with TestClient(main.app):
+        assert {item_id: main.calculate_best_price(item_id) for item_id in applied} == applied
+    history = [n for n in os.listdir(app_dirs / "deltas") if n.endswith(".applied")]
+    assert len(history) == 1 and history[0].endswith("~compacted.applied")
+
+
+def test_merged_batches_match_applying_them_in_order():
+    catalog = Catalog.load(REPO_DATA)
+    batches = [normalize_batch(b) for b in [
+        {"prices": [price("m11", "UberEats", 1.0, 0.5), price("m12", "DoorDash", 3.0, 1.0)]},
+        {"remove_prices": [{"item_id": "m11", "platform_name": "UberEats"}],
+         "coupons": [{"code": "A", "platform": "DoorDash", "discount_value": 2.0, "min_spend": 0.0}]},
+        # A coupon code moving platforms, and a row removed and re-added in one batch
+        {"coupons": [{"code": "A", "platform": "Grubhub", "discount_value": 1.0, "min_spend": 0.0}],
+         "remove_prices": [{"item_id": "m12", "platform_name": "DoorDash"}],
+         "prices": [price("m12", "DoorDash", 4.0, 1.0)]},
+        {"remove_coupons": ["A"], "prices": [price("m13", "Grubhub", 5.0, 0.0)]},
+    ]]
+    sequential = PriceIndex(catalog)
+    for batch in batches:
+        sequential.apply_batch(batch)
+    merged = PriceIndex(catalog)
+    merged.apply_batch(merge_batches(batches))
+    assert np.array_equal(sequential.best_eff, merged.best_eff)
+    for item_id in catalog.menu_items:
+        assert sequential.best_price(item_id) == merged.best_price(item_id)
@@ -0,0 +1,33 @@
+import json
+import shutil
+
+from fastapi.testclient import TestClient
+
+from services.api import main
+
+from tests.conftest import REPO_DATA
+
+MESSAGE = {"user_id": "u1", "message": "I want high protein lunch under 20 bucks", "staged": True}
+
+
+def test_rankings_of_a_previous_catalog_are_not_served(app_dirs, monkeypatch):
+    with TestClient(main.app) as client:
+        first = client.post("/message", json=MESSAGE)
+        assert first.headers["X-Rank-Cache"] == "miss"
+        assert client.post("/message", json=MESSAGE).headers["X-Rank-Cache"] == "hit"
+
+    # Same item ids, other prices: the new index's versions start over, as the old one's did
+    catalog_dir = app_dirs / "catalog"
+    shutil.copytree(REPO_DATA, catalog_dir)
+    with open(catalog_dir / "platform_prices.json") as f:
+        prices = json.load(f)
+    for p in prices:
+        p["base_price"] = round(p["base_price"] / 2, 2)
+    with open(catalog_dir / "platform_prices.json", "w") as f:
+        json.dump(prices, f)
+    monkeypatch.setattr(main, "CATALOG_DIR", str(catalog_dir))
+
+    with TestClient(main.app) as client:
+        second = client.post("/message", json=MESSAGE)
+        assert second.headers["X-Rank-Cache"] == "miss"
+        assert second.json()["top_results"] != first.json()["top_results"]
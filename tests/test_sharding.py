@@ -0,0 +1,42 @@
+import os
+
+from services.api import scoring, sharding
+from services.api.catalog import Catalog
+from services.api.pricing import PriceIndex
+from services.api.scoring import ScoringEngine
+from services.api.sharding import ShardedScorer
+
+REPO_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def exit_worker(*args):
+    # Stands in for _score_shard: the worker process dies mid-query, which breaks the pool
+    os._exit(1)
+
+
+def test_broken_pool_falls_back_to_in_process_scoring(monkeypatch):
+    monkeypatch.setattr(scoring, "SHARD_MIN_ITEMS", 0)
+    monkeypatch.setattr(sharding, "SHARD_POOL_RESTARTS", 1)
+    catalog = Catalog.load(REPO_DATA)
+    engine = ScoringEngine(catalog, PriceIndex(catalog))
+    expected = engine.top_k({}, k=3)
+    scorer = engine.sharded = ShardedScorer(engine, 2)
+    score_shard = sharding._score_shard
+    try:
+        assert engine.top_k({}, k=3) == expected
+
+        monkeypatch.setattr(sharding, "_score_shard", exit_worker)
+        assert engine.top_k({}, k=3) == expected
+        assert scorer.restarts == 1
+        # The rebuilt pool serves the next query
+        monkeypatch.setattr(sharding, "_score_shard", score_shard)
+        assert engine.top_k({}, k=3) == expected
+        assert scorer.pool is not None
+
+        monkeypatch.setattr(sharding, "_score_shard", exit_worker)
+        assert engine.top_k({}, k=3) == expected
+        assert scorer.pool is None
+        monkeypatch.setattr(sharding, "_score_shard", score_shard)
+        assert engine.top_k({}, k=3) == expected
+    finally:
+        scorer.close()
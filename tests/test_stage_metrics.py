@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from services.api import main
+
+
+def stage_counts(client, stage):
+    prefix = "foodpo_stage_seconds_count{"
+    return {line.split('endpoint="')[1].split('"')[0]: float(line.rsplit(" ", 1)[1])
+            for line in client.get("/metrics").text.splitlines()
+            if line.startswith(prefix) and f'stage="{stage}"' in line}
+
+
+def test_batch_coach_stages_are_recorded_under_the_batch_endpoint(app_dirs):
+    with TestClient(main.app) as client:
+        before = stage_counts(client, "coach_text")
+        r = client.post("/message/batch", json={"requests": [{"user_id": "u1", "message": "cheap vegan"}],
+                                                "include_coach": True})
+        assert r.status_code == 200
+        after = stage_counts(client, "coach_text")
+        assert after["message_batch"] == before.get("message_batch", 0) + 1
+        assert after.get("message", 0) == before.get("message", 0)
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+import types
+
+from services.api import weight_cache
+from services.api.persistence import Database
+from services.api.preferences import WEIGHT_DECAY_STEP, WEIGHT_HALF_LIFE_DAYS
+from services.api.weight_cache import UserWeightCache
+
+
+def make_cache(tmp_path, **kwargs):
+    db = Database(str(tmp_path / "database.db"))
+    return db, UserWeightCache(db, **kwargs)
+
+
+def test_update_on_cold_cache_is_visible(tmp_path):
+    db, cache = make_cache(tmp_path)
+    try:
+        with cache.lock("u1"):
+            cache.update("u1", {"veg": 1.0})
+        assert cache.get("u1").get("veg") == 1.0
+        assert cache.get_versioned("u1")[0].get("veg") == 1.0
+    finally:
+        db.close()
+
+
+def test_update_after_invalidation_is_visible_and_accumulates(tmp_path):
+    db, cache = make_cache(tmp_path)
+    try:
+        for expected in (1.0, 2.0, 3.0):
+            # Every update starts from a miss, as after a TTL expiry or a peer invalidation
+            cache.invalidate("u1")
+            with cache.lock("u1"):
+                cache.update("u1", {"veg": 1.0})
+            assert cache.get("u1").get("veg") == expected
+        fresh = UserWeightCache(db)
+        assert fresh.get("u1").get("veg") == 3.0
+    finally:
+        db.close()
+
+
+def test_concurrent_updates_from_separate_caches_are_not_lost(tmp_path):
+    # Two caches over one database stand in for two workers: no shared lock, stale copies
+    db, first = make_cache(tmp_path)
+    second = UserWeightCache(db)
+    try:
+        first.get("u1")
+        second.get("u1")
+
+        def feedback(cache, n):
+            for _ in range(n):
+                cache.update("u1", {"veg": 0.01})
+
+        threads = [threading.Thread(target=feedback, args=(c, 50)) for c in (first, second, first, second)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert abs(UserWeightCache(db).get("u1").get("veg") - 2.0) < 1e-3
+    finally:
+        db.close()
+
+
+def test_reads_decay_weights_of_users_without_feedback(tmp_path):
+    db, cache = make_cache(tmp_path)
+    try:
+        with cache.lock("u1"):
+            cache.update("u1", {"veg": 2.0})
+        fresh, version = cache.get_versioned("u1")
+        assert fresh.get("veg") == 2.0
+        # The user went quiet one half-life ago
+        month = WEIGHT_HALF_LIFE_DAYS * 86400
+        db.update_user_vector("u1", lambda row: (row[0], row[1] - month))
+        cache.invalidate("u1")
+        aged, aged_version = cache.get_versioned("u1")
+        assert abs(aged.get("veg") - 1.0) < 1e-2
+        assert aged_version != version
+        assert abs(cache.get_many(["u1"])["u1"].get("veg") - 1.0) < 1e-2
+        # Feedback continues from the decayed weights
+        with cache.lock("u1"):
+            cache.update("u1", {"veg": 0.5})
+        assert abs(cache.get("u1").get("veg") - 1.5) < 1e-2
+    finally:
+        db.close()
+
+
+def test_cached_weights_change_version_with_each_decay_step(tmp_path, monkeypatch):
+    db, cache = make_cache(tmp_path, ttl=10 * WEIGHT_DECAY_STEP)
+    try:
+        with cache.lock("u1"):
+            cache.update("u1", {"veg": 2.0})
+        clock = [time.time()]
+        monkeypatch.setattr(weight_cache, "time", types.SimpleNamespace(time=lambda: clock[0]))
+        misses = cache.stats()["misses"]
+        weights, version = cache.get_versioned("u1")
+        clock[0] += WEIGHT_DECAY_STEP / 2
+        assert cache.get_versioned("u1") == (weights, version)
+        clock[0] += WEIGHT_DECAY_STEP
+        aged, aged_version = cache.get_versioned("u1")
+        assert aged_version != version
+        assert aged.get("veg") < weights.get("veg")
+        assert cache.stats()["misses"] == misses
+    finally:
+        db.close()
+
+
+def test_old_tag_weights_are_migrated_once_and_their_table_dropped(tmp_path):
+    path = str(tmp_path / "database.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE user_weights (user_id TEXT, tag TEXT, weight REAL, PRIMARY KEY (user_id, tag))")
+    conn.executemany("INSERT INTO user_weights VALUES (?, ?, ?)",
+                     [("u1", "veg", 1.5), ("u1", "spicy", -0.5), ("u2", "veg", 2.0)])
+    conn.commit()
+    conn.close()
+
+    db, cache = make_cache(tmp_path)
+    try:
+        assert cache.get("u1").as_dict() == {"veg": 1.5, "spicy": -0.5}
+        assert cache.get("u2").as_dict() == {"veg": 2.0}
+        with cache.lock("u1"):
+            cache.update("u1", {"veg": 1.0})
+        with db.pool.connection() as conn:
+            assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'user_weights'").fetchone() is None
+    finally:
+        db.close()
+
+    db, cache = make_cache(tmp_path)
+    try:
+        assert cache.get("u1").get("veg") == 2.5
+    finally:
+        db.close()